@@ -12,38 +12,139 @@ Description:    This file defines the backend API for the fuzzy graph similarity
                 by Sophia Halasova at BUT FIT in 2025.
 """
 
-from flask import Flask, request, jsonify, render_template
-from backend.TWBackend import Graph, Vertex, twin_width
+import os
+import json
+import time
+from itertools import islice
+from flask import Flask, Response, request, jsonify, render_template, g
+from backend.TWBackend import Graph, twin_width_estimate, twin_width_search, twin_width_stream
+from backend.tw_heuristics import HEURISTIC_MODES
 from backend.isomorph import find_isomorphisms
-from backend.similarity import compute_similarity
+from backend.similarity import MappingScorer
+from backend.best_mapping import best_mapping
+from backend.jobs import JobManager, JobQueueFull, twin_width_job
+from backend.tw_search import SearchBudget
+from backend.tnorms import get_operators
+from backend.cache import ResultCache, cached_twin_width, cached_isomorphisms, cached_similarity
+from backend.batch_similarity import BATCH_MODES, batch_similarity
+from backend import metrics
+from backend.graph_io import GraphFormatError, graph_from_json, load_request
+from backend.sessions import SessionStore, SessionError
 from flask_cors import CORS
 
 app = Flask(__name__) # Initialize Flask app
 CORS(app) # Allow cross-origin requests
 
+JOB_WORKERS = 2 # Number of jobs computed at the same time
+JOB_QUEUE_SIZE = 8 # Number of jobs waiting for a free worker
+JOB_TIME_LIMIT = 60 # Default wall-clock budget of a job in seconds
+jobs = JobManager(workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE)
+
+NPZ_MIMETYPE = "application/x-npz" # Content type of the binary graph format
+
+BATCH_WORKERS = os.cpu_count() or 1 # Number of processes comparing the pairs of a batch
+
+SESSION_TTL = 1800 # Seconds after which an unused graph session is evicted
+sessions = SessionStore(ttl=SESSION_TTL)
+
+# Results shared across requests, GRAPH_SIM_CACHE may name an SQLite file shared by all workers
+cache = ResultCache(path=os.environ.get("GRAPH_SIM_CACHE"))
+
 def build_graph_from_json(data):
     """
     Converts JSON data into a Graph object.
     Returns None if the structure is invalid.
     """
-    if not isinstance(data, dict) or 'nodes' not in data or 'edges' not in data:
+    if isinstance(data, Graph):
+        metrics.note_graph(len(data.vertices))
+        return data # Graphs of a binary request are already built (see graph_io.py)
+
+    G = graph_from_json(data)
+    if G is not None:
+        metrics.note_graph(len(G.vertices))
+    return G
+
+def request_data():
+    """
+    Returns the body of the request as a dictionary, parsed from JSON or, with the 
+    application/x-npz content type, from the binary graph format (see graph_io.py).
+    Returns None if the body is invalid.
+    """
+    if 'request_data' not in g:
+        if request.mimetype == NPZ_MIMETYPE:
+            try:
+                g.request_data = load_request(request.get_data())
+            except GraphFormatError:
+                g.request_data = None
+        else:
+            g.request_data = request.get_json(silent=True)
+    return g.request_data
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    metrics.begin_request()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Records the request latency labeled by endpoint, t-norm and graph size.
+    With "debug" set in the request body, the counters of the request are added 
+    to its JSON response under 'debug'.
+    """
+    counters, size = metrics.end_request()
+    if request.endpoint in (None, 'static', 'get_metrics'):
+        return response
+    seconds = time.perf_counter() - g.request_start
+    data = request_data()
+    data = data if isinstance(data, dict) else {}
+    metrics.observe_request(request.endpoint, data.get("tnorm"), size, seconds)
+
+    if data.get("debug") and response.is_json and not response.is_streamed:
+        body = response.get_json()
+        if isinstance(body, dict):
+            body['debug'] = dict(counters, seconds=seconds, vertices=size)
+            response.set_data(json.dumps(body))
+    return response
+
+def ndjson_response(header, items, item_key, max_items=None):
+    """
+    Streams a result as newline-delimited JSON: a header record, one record per item as the
+    items are produced and a trailer record with the number of sent items. With max_items set,
+    at most that many items are sent and the trailer reports whether more were available.
+    """
+    def generate():
+        yield json.dumps(dict({'type': 'header'}, **header)) + '\n'
+        count = 0
+        for item in islice(items, max_items):
+            count += 1
+            yield json.dumps({'type': item_key, item_key: item}) + '\n'
+        truncated = max_items is not None and next(iter(items), None) is not None
+        yield json.dumps({'type': 'trailer', 'count': count, 'truncated': truncated}) + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def parse_max_items(data):
+    """
+    Returns the client's cap on the number of streamed items, None if there is none.
+    Raises ValueError or TypeError for an invalid cap.
+    """
+    max_items = data.get("max_items")
+    if max_items is None:
         return None
-    
-    G = Graph()
+    max_items = int(max_items)
+    if max_items < 0:
+        raise ValueError("max_items must not be negative")
+    return max_items
+
+def valid_tnorm(tnorm):
+    """
+    Returns whether the t-norm name is known (see tnorms.py).
+    """
     try:
-        # Add nodes (vertices) to the graph
-        for node in data["nodes"]:
-            vertex = Vertex(node["name"], float(node["membershipFunction"]))
-            G.add_vertex(vertex)
-
-        # Add edges
-        for edge in data["edges"]:
-            u, v, weight = edge["source"], edge["target"], (float(edge["weight"]), 0)
-            G.add_edge(u, v, weight)
-        
-        return G
-    except (KeyError, ValueError, TypeError):
-        return None # Return None if JSON structure is incorrect
+        get_operators(tnorm)
+    except ValueError:
+        return False
+    return True
 
 @app.route('/graph-sim', methods=['GET'])
 def graph_sim():
@@ -53,19 +154,95 @@ def graph_sim():
 def get_tw():
     """
     Computes the fuzzy Twin Width of a graph.
+    With "mode" set to 'greedy', 'beam' or 'random', a fast estimate is returned instead 
+    of the exact value, together with its lower and upper bound.
+    With "stream" set, the exact value is sent as a header record and the optimal sequences 
+    follow as newline-delimited JSON while they are found, "max_items" caps their number.
+    With "symmetry" set, the exact search skips contractions equivalent under a symmetry of the graph.
+    With "reduce" set, zero-error twins are contracted first and every connected component is
+    searched on its own, the applied reductions are returned in "reductions". Only one optimal
+    sequence is returned then, "all_sequences" is false.
+    With "compact" set, the optimal sequences are kept as a DAG and only their "count" and one
+    page selected by "offset" and "limit" (default 100) are returned, or with "sample" set,
+    that many sequences drawn at random ("seed" makes the draw reproducible).
     """
-    data = request.json  # awaiting json data
+    data = request_data()  # awaiting json data
     if not data or "tnorm" not in data:
         return jsonify({'error': "Invalid input", 'tw': "X"}), 400
     tnorm = data["tnorm"]
+    if not valid_tnorm(tnorm):
+        return jsonify({'error': "Invalid t-norm", 'tw': "X"}), 400
+    mode = data.get("mode", "exact")
+    if mode != "exact" and mode not in HEURISTIC_MODES:
+        return jsonify({'error': "Invalid mode", 'tw': "X"}), 400
     
     # Convert JSON to graph object
-    G = build_graph_from_json(data)
+    G = build_graph_from_json(data.get("graph", data))
     if not G:
         return jsonify({'error': "Invalid graph structure", 'tw': "X"}), 400
 
-    # Compute twin-width
-    tw_value, sequence = twin_width(G, tnorm) 
+    if data.get("stream") and mode == "exact":
+        try:
+            max_items = parse_max_items(data)
+        except (ValueError, TypeError):
+            return jsonify({'error': "Invalid input", 'tw': "X"}), 400
+        tw_value, sequences = twin_width_stream(G, tnorm)
+        header = {'tw': "X" if tw_value == float('inf') else tw_value}
+        return ndjson_response(header, sequences, 'sequence', max_items)
+
+    if mode != "exact":
+        try:
+            beam_width, restarts = int(data.get("beam_width", 8)), int(data.get("restarts", 16))
+            if beam_width < 1 or restarts < 0:
+                raise ValueError("beam_width must be positive and restarts must not be negative")
+            upper, lower, sequence = twin_width_estimate(G, tnorm, mode, beam_width, restarts, data.get("seed"))
+        except (ValueError, TypeError):
+            return jsonify({'error': "Invalid input", 'tw': "X"}), 400
+        if upper == float('inf'):
+            return jsonify({'tw': "X", 'lower_bound': "X", 'upper_bound': "X", 'sequence': [], 'exact': False})
+        return jsonify({
+            'tw': upper,
+            'lower_bound': lower,
+            'upper_bound': upper,
+            'sequence': [sequence],
+            'exact': lower == upper
+        })
+
+    if data.get("compact"):
+        try:
+            offset = int(data.get("offset", 0))
+            limit = int(data.get("limit", 100))
+            sample = int(data["sample"]) if data.get("sample") is not None else None
+            if offset < 0 or limit < 0 or (sample is not None and sample < 0):
+                raise ValueError("offset, limit and sample must not be negative")
+        except (ValueError, TypeError):
+            return jsonify({'error': "Invalid input", 'tw': "X"}), 400
+        search = twin_width_search(G, tnorm, memo=True)
+        sequences = search.sequences
+        page = sequences.sample(sample, data.get("seed")) if sample is not None else sequences.page(offset, limit)
+        return jsonify({
+            'tw': "X" if search.width == float('inf') else search.width,
+            'count': sequences.count,
+            'offset': offset,
+            'limit': limit,
+            'sequence': [search.trigraph.sequence_names(sequence) for sequence in page]
+        })
+
+    options = {'symmetry': True} if data.get("symmetry") else {}
+    if data.get("reduce"):
+        # The reductions name the vertices of this graph, so the result is not shared through the cache
+        # One sequence per component is searched, which the branch-and-bound search prunes best
+        search = twin_width_search(G, tnorm, prune=not options, reduce=True, **options)
+        tw_value, sequence = search.result()
+        return jsonify({
+            'tw': "X" if tw_value == float('inf') else tw_value,
+            'sequence': sequence,
+            'all_sequences': False,
+            'reductions': search.reductions
+        })
+
+    # Compute twin-width, or reuse the result computed for an isomorphic graph
+    tw_value, sequence = cached_twin_width(cache, G, tnorm, **options)
 
     # Handle invalid results
     if tw_value == float('inf'):
@@ -77,12 +254,72 @@ def get_tw():
     })
 
 
+@app.route('/jobs/tw', methods=['POST'])
+def submit_tw_job():
+    """
+    Submits a fuzzy Twin Width computation as a background job and returns its id.
+    Optional fields: 'time_limit' (seconds), 'node_limit' (expanded states)
+    and 'all_sequences' (defaults to true).
+    """
+    data = request_data()
+    if not data or "tnorm" not in data:
+        return jsonify({'error': "Invalid input"}), 400
+    if not valid_tnorm(data["tnorm"]):
+        return jsonify({'error': "Invalid t-norm"}), 400
+
+    G = build_graph_from_json(data.get("graph", data))
+    if not G:
+        return jsonify({'error': "Invalid graph structure"}), 400
+
+    try:
+        time_limit = float(data.get("time_limit", JOB_TIME_LIMIT))
+        node_limit = data.get("node_limit")
+        node_limit = int(node_limit) if node_limit is not None else None
+    except (ValueError, TypeError):
+        return jsonify({'error': "Invalid budget"}), 400
+    # NaN fails every comparison, so it is rejected together with negative and infinite limits
+    if not 0 < time_limit < float('inf') or (node_limit is not None and node_limit < 0):
+        return jsonify({'error': "Invalid budget"}), 400
+
+    budget = SearchBudget(seconds=time_limit, max_nodes=node_limit)
+    try:
+        job = jobs.submit('tw', twin_width_job(G, data["tnorm"], bool(data.get("all_sequences", True))), budget)
+    except JobQueueFull:
+        return jsonify({'error': "Too many jobs, try again later"}), 503
+
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Returns the status of a job and its result once it has finished.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """
+    Cancels a job, a running job keeps the best result found so far.
+    """
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/check-isomorphism', methods=['POST'])
 def check_isomorphism():
     """
     Checks if two graphs are isomorphic and returns all valid mappings.
+    With "compact" set, the mappings are not enumerated: the response holds their total 
+    "count", a "base" isomorphism, "generators" of the automorphism group of the second graph 
+    and one page of mappings selected by "offset" and "limit" (default 100).
+    With "stream" set, the "count" is sent as a header record and the mappings follow 
+    as newline-delimited JSON, "max_items" caps their number.
     """
-    data = request.json
+    data = request_data()
 
     if not data or "graph1" not in data or "graph2" not in data:
         return jsonify({'error': "Invalid input"}), 400
@@ -93,9 +330,40 @@ def check_isomorphism():
 
     if not G1 or not G2:
         return jsonify({'error': "Invalid graph structure"}), 400
+
+    if data.get("stream"):
+        try:
+            max_items = parse_max_items(data)
+        except (ValueError, TypeError):
+            return jsonify({'error': "Invalid input"}), 400
+        isomorphic, mappings = find_isomorphisms(G1, G2, compact=True)
+        header = {'isomorphic': isomorphic, 'count': mappings.count if isomorphic else 0}
+        return ndjson_response(header, iter(mappings or []), 'mapping', max_items)
+
+    if data.get("compact"):
+        try:
+            offset = int(data.get("offset", 0))
+            limit = int(data.get("limit", 100))
+            if offset < 0 or limit < 0:
+                raise ValueError("offset and limit must not be negative")
+        except (ValueError, TypeError):
+            return jsonify({'error': "Invalid input"}), 400
+
+        isomorphic, mappings = find_isomorphisms(G1, G2, compact=True)
+        if not isomorphic:
+            return jsonify({'isomorphic': False, 'count': 0, 'mappings': []})
+        return jsonify({
+            'isomorphic': True,
+            'count': mappings.count,
+            'base': mappings.base,
+            'generators': mappings.generators(),
+            'offset': offset,
+            'limit': limit,
+            'mappings': mappings.page(offset, limit)
+        })
     
     # Find isomorphisms
-    isomorphic, mappings = find_isomorphisms(G1, G2)
+    isomorphic, mappings = cached_isomorphisms(cache, G1, G2)
 
     return jsonify({
         'isomorphic': isomorphic,
@@ -106,8 +374,10 @@ def check_isomorphism():
 def get_similarity():
     """
     Computes the fuzzy similarity between two graphs.
+    With "best_mapping" set, the isomorphism of least dissimilarity is returned as well, 
+    with its dissimilarity as "score".
     """
-    data = request.json
+    data = request_data()
     if not data or "graph1" not in data or "graph2" not in data or "tnorm" not in data:
         return jsonify({'error': "Invalid input"}), 400
 
@@ -117,9 +387,204 @@ def get_similarity():
     if not G1 or not G2:
         return jsonify({'error': "Invalid graph structure"}), 400
 
+    if not valid_tnorm(data["tnorm"]):
+        return jsonify({'error': "Invalid t-norm"}), 400
+
+    if data.get("best_mapping"):
+        # The best mapping is searched once, for the response and for the similarity
+        best = best_mapping(G1, G2, MappingScorer(G1, G2))
+        similarity = cached_similarity(cache, G1, G2, data["tnorm"], best)
+        return jsonify({'similarity': similarity, 'mapping': best[0], 'score': best[1]})
+
     # Compute similarity
-    similarity = compute_similarity(G1, G2, data["tnorm"])
+    similarity = cached_similarity(cache, G1, G2, data["tnorm"])
     return jsonify({'similarity': similarity})
 
+@app.route('/batch-similarity', methods=['POST'])
+def get_batch_similarity():
+    """
+    Computes the fuzzy similarity for many pairs of graphs in one request.
+    "mode" selects the compared pairs:
+        'one-vs-many'   "query" against every graph in "graphs", a matrix with one row
+        'many-vs-many'  every graph in "graphs_a" against every graph in "graphs_b"
+        'matrix'        every two graphs in "graphs", a symmetric matrix
+    Undefined similarities are "X".
+    """
+    data = request_data()
+    if not data or "tnorm" not in data or data.get("mode") not in BATCH_MODES:
+        return jsonify({'error': "Invalid input"}), 400
+    if not valid_tnorm(data["tnorm"]):
+        return jsonify({'error': "Invalid t-norm"}), 400
+    mode = data["mode"]
+
+    if mode == 'one-vs-many':
+        fields = ("query", "graphs")
+        lists = ([data.get("query")], data.get("graphs"))
+    elif mode == 'many-vs-many':
+        fields = ("graphs_a", "graphs_b")
+        lists = (data.get("graphs_a"), data.get("graphs_b"))
+    else:
+        fields = ("graphs",)
+        lists = (data.get("graphs"),)
+
+    # Convert JSON to Graph objects, each graph only once
+    parsed = []
+    for field, graphs in zip(fields, lists):
+        if not isinstance(graphs, list):
+            return jsonify({'error': "Invalid input", 'field': field}), 400
+        parsed.append([])
+        for index, graph_data in enumerate(graphs):
+            G = build_graph_from_json(graph_data)
+            if not G:
+                return jsonify({'error': "Invalid graph structure", 'field': field, 'index': index}), 400
+            parsed[-1].append(G)
+
+    if mode == 'matrix':
+        matrix = batch_similarity(parsed[0], None, data["tnorm"], symmetric=True, workers=BATCH_WORKERS)
+    else:
+        matrix = batch_similarity(parsed[0], parsed[1], data["tnorm"], workers=BATCH_WORKERS)
+    return jsonify({'mode': mode, 'similarity': matrix})
+
+def session_graph_json(session):
+    """
+    Converts the graph of a session to the JSON structure of the requests.
+    """
+    vertices = session.graph.vertices
+    index = {name: i for i, name in enumerate(vertices)}
+    return {
+        'nodes': [{'name': name, 'membershipFunction': vertex.membershipFunction} for name, vertex in vertices.items()],
+        'edges': [{'source': name, 'target': neighbor, 'weight': weight[0]}
+                  for name, vertex in vertices.items() for neighbor, weight in vertex.neighbors
+                  if index[name] <= index[neighbor]], # Every edge once
+    }
+
+def session_state(session):
+    return {'session_id': session.id, 'version': session.version, 'structure_version': session.structure_version}
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    """
+    Creates a graph session from a graph, it is then edited with delta operations.
+    """
+    data = request_data()
+    G = build_graph_from_json(data.get("graph", data) if isinstance(data, dict) else None)
+    if not G:
+        return jsonify({'error': "Invalid graph structure"}), 400
+    return jsonify(session_state(sessions.create(G))), 201
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': "Unknown session"}), 404
+    with sessions.locked(session):
+        return jsonify(dict(session_state(session), graph=session_graph_json(session)))
+
+@app.route('/sessions/<session_id>', methods=['PATCH'])
+def edit_session(session_id):
+    """
+    Applies a list of delta operations ("ops") to the graph of a session, either all or none of them:
+        {"op": "add_vertex", "name", "membershipFunction"}    {"op": "remove_vertex", "name"}
+        {"op": "add_edge", "source", "target", "weight"}      {"op": "remove_edge", "source", "target"}
+        {"op": "set_weight", "source", "target", "weight"}    {"op": "set_membership", "name", "membershipFunction"}
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': "Unknown session"}), 404
+    data = request_data()
+    if not isinstance(data, dict) or not isinstance(data.get("ops"), list):
+        return jsonify({'error': "Invalid input"}), 400
+    with sessions.locked(session):
+        try:
+            session.apply(data["ops"])
+        except SessionError as error:
+            return jsonify({'error': str(error), 'index': error.index}), 400
+        return jsonify(session_state(session))
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    if not sessions.delete(session_id):
+        return jsonify({'error': "Unknown session"}), 404
+    return jsonify({'session_id': session_id, 'deleted': True})
+
+@app.route('/sessions/<session_id>/tw', methods=['POST'])
+def get_session_tw(session_id):
+    """
+    Computes the fuzzy Twin Width of a session's graph. 'reused' tells whether the last 
+    result ('result') or the bound of the last optimal sequence ('bound') was reused.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': "Unknown session", 'tw': "X"}), 404
+    data = request_data()
+    if not isinstance(data, dict) or "tnorm" not in data:
+        return jsonify({'error': "Invalid input", 'tw': "X"}), 400
+    if not valid_tnorm(data["tnorm"]):
+        return jsonify({'error': "Invalid t-norm", 'tw': "X"}), 400
+    with sessions.locked(session):
+        tw_value, sequence, reused = session.twin_width(data["tnorm"])
+    return jsonify({
+        'tw': "X" if tw_value == float('inf') else tw_value,
+        'sequence': sequence,
+        'reused': reused
+    })
+
+def session_pair(session_id, data):
+    """
+    Returns the session and the session named by "other" in the request, or an error response.
+    """
+    session = sessions.get(session_id)
+    other = sessions.get(data.get("other")) if isinstance(data, dict) and isinstance(data.get("other"), str) else None
+    if session is None or other is None:
+        return None, None, (jsonify({'error': "Unknown session"}), 404)
+    return session, other, None
+
+@app.route('/sessions/<session_id>/isomorphism', methods=['POST'])
+def check_session_isomorphism(session_id):
+    """
+    Checks if the graphs of two sessions are isomorphic, the mappings are reused while 
+    neither structure changed.
+    """
+    session, other, error = session_pair(session_id, request_data())
+    if error:
+        return error
+    with sessions.locked(session, other):
+        mappings, reused = sessions.isomorphisms(session, other)
+    return jsonify({'isomorphic': len(mappings) > 0, 'mappings': mappings, 'reused': reused})
+
+@app.route('/sessions/<session_id>/similarity', methods=['POST'])
+def get_session_similarity(session_id):
+    """
+    Computes the fuzzy similarity between the graphs of two sessions. After weight-only edits 
+    the isomorphisms are reused and only rescored.
+    """
+    data = request_data()
+    if not isinstance(data, dict) or "tnorm" not in data:
+        return jsonify({'error': "Invalid input"}), 400
+    if not valid_tnorm(data["tnorm"]):
+        return jsonify({'error': "Invalid t-norm"}), 400
+    session, other, error = session_pair(session_id, data)
+    if error:
+        return error
+    with sessions.locked(session, other):
+        similarity, reused = sessions.similarity(session, other, data["tnorm"])
+    return jsonify({'similarity': similarity, 'reused': reused})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Returns the instrumentation counters, request latency histograms and cache 
+    statistics in the Prometheus text format.
+    """
+    gauges = {f"cache_{name}": value for name, value in cache.info().items()}
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """
+    Returns the hit and miss counters of the result cache.
+    """
+    return jsonify(cache.info())
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001) # Start Flask server
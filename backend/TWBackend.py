@@ -9,58 +9,23 @@ Description:    This module implements the (fuzzy) twin-width algorithm in Pytho
 """
 
 
-from itertools import combinations
-from copy import deepcopy
-import re
-
-# Global constants, for basic computation, only the first three are used
+from backend.trigraph import Trigraph, merged_vertex_name
+from backend.tw_search import TwinWidthSearch, default_memo_size
+from backend.tw_parallel import parallel_twin_width
+from backend.tw_heuristics import approximate_twin_width
+from backend.tw_reductions import reduced_search
+from backend.tnorms import get_operators, drastic_tnorm, drastic_tconorm
+
+# Global constants
 infinity = float('inf')
-lowest_max_degree = float('inf')
-best_sequences = []
-
-lowest_max_degree2 = float('inf')
-best_sequences2 = []
-lowest_max_degree3 = float('inf')
-best_sequences3 = []
-
-# Functions for t-norms and t-conorms
-def drastic_tnorm(u, v):
-    if u == 1:
-        return v
-    elif v == 1:
-        return u
-    else:
-        return 0
-
-def drastic_tconorm(u, v):
-    if u == 0:
-        return v
-    elif v == 0:
-        return u
-    else:
-        return 1
 
 # Depending on the operation, the function will return the result of the operation
+# The t-norm and t-conorm formulas are defined once in tnorms.py
 def merge_operation(u_black, u_red, v_black, v_red, operation, tnorm):
+    operators = get_operators(tnorm)
     if operation == 'node_merge' or operation == 'black_edge_merge':
-        if tnorm == 'min':
-            return max(u_black, v_black)
-        elif tnorm == 'prod':
-            return u_black + v_black - u_black * v_black
-        elif tnorm == 'luk':
-            return min(u_black + v_black, 1)
-        elif tnorm == 'drast':
-            return drastic_tconorm(u_black, v_black)
-
-    else:
-        if tnorm == 'min':
-            return max(u_black, v_black) - min(u_black - u_red, v_black - v_red)
-        elif tnorm == 'prod':
-            return (u_black + v_black - u_black * v_black) - ((u_black - u_red) * (v_black - v_red))
-        elif tnorm == 'luk':
-            return min(u_black + v_black, 1) - max(0, u_black - u_red + v_black - v_red - 1)
-        elif tnorm == 'drast':
-            return drastic_tconorm(u_black, v_black) - drastic_tnorm(u_black - u_red, v_black - v_red)
+        return operators.tconorm(u_black, v_black)
+    return operators.red_merge(u_black, u_red, v_black, v_red)
 
 # Class for the vertex of the graph, which contains the name of the vertex, its membership function and its neighbors
 class Vertex:
@@ -86,8 +51,6 @@ class Vertex:
 class Graph:
     def __init__(self):
         self.vertices = {}
-        optimum_sequence = []
-        twin_width_value = 0
 
     # Function to add a vertex to the graph
     def add_vertex(self, vertex):
@@ -99,85 +62,39 @@ class Graph:
             self.vertices[u].add_neighbor(v, weight)
             self.vertices[v].add_neighbor(u, weight)
 
-    # Function to remove an edge from the graph
+    # Function to find a vertex by its name, None if there is no such vertex
     def find_vertex(self, vertex_name):
-        for vertex in self.vertices:
-            if vertex == vertex_name:
-                return self.vertices[vertex]
-        return None
+        return self.vertices.get(vertex_name)
+
+    # Function to build a graph from arrays in one pass, without the per-edge neighbor scans of add_edge
+    # names and memberships describe the vertices, the edges are given by the indices of their end vertices
+    # weights are the black weights, red weights are 0 unless given; a repeated edge keeps its last weight
+    @classmethod
+    def from_arrays(cls, names, memberships, sources, targets, weights, red_weights=None):
+        graph = cls()
+        for name, membership in zip(names, memberships):
+            graph.add_vertex(Vertex(name, membership))
+        names = list(names)
+
+        neighbors = {name: {} for name in graph.vertices}
+        if red_weights is None:
+            red_weights = [0] * len(weights)
+        for u, v, black, red in zip(sources, targets, weights, red_weights):
+            u, v = names[u], names[v]
+            neighbors[u][v] = (black, red)
+            neighbors[v][u] = (black, red)
+        for name, vertex in graph.vertices.items():
+            vertex.neighbors = list(neighbors[name].items())
+        return graph
 
     # Function to merge two vertices, constructing a new graph
+    # The merge itself is done on the array representation of the graph (see trigraph.py)
     def merge_vertices(self, u, v, tnorm):
-
-        # Creating a new graph to store the merged vertices
-        newGraph = Graph()
-
-        # Copying the vertices of the original graph to the new graph
-        new_vertices = self.vertices.copy()
-
-        # If the vertices to be merged are in the graph
         if u in self.vertices and v in self.vertices:
-
-            # We first compute the new sigma of the merged vertex according to the thesis
-            membership = merge_operation(self.vertices[u].membershipFunction, 0, self.vertices[v].membershipFunction, 0, 'node_merge', tnorm)
-            # The new vertex will be named as the concatenation of the names of the vertices
-            digits1 = re.sub(r"\D", "", u)
-            digits2 = re.sub(r"\D", "", v)
-            new_node_name = f'Node{digits1}{digits2}'
-            new_vertex = Vertex(new_node_name, membership)
-
-            # The neighbors of the new vertex will be the union of the neighbors of the two vertices
-            new_vertex.neighbors = self.vertices[u].neighbors + self.vertices[v].neighbors
-
-            # From the neighbors of the new vertex, we remove the vertices u and v
-            new_vertex.remove_neighbor(u)
-            new_vertex.remove_neighbor(v)
-
-            # For each neighbour of the union, we compute the new edge values
-            u_neighbors = self.vertices[u].neighbors
-            v_neighbors = self.vertices[v].neighbors
-            for neighbor in new_vertex.neighbors:
-
-                # Prevention of double edges
-                if [n[0] for n in new_vertex.neighbors].count(neighbor[0]) > 1:
-                    new_vertex.remove_neighbor(neighbor[0])
-
-                # Default values for the edge weights
-                u_weight = (0, 0)
-                v_weight = (0, 0)
-
-                # Find the weight of the edge between the new vertex and the given neighbor
-                if neighbor[0] in [n[0] for n in u_neighbors]:
-                    u_weight = u_neighbors[[n[0] for n in u_neighbors].index(neighbor[0])][1]
-                    new_vertex.remove_neighbor(neighbor[0])
-                if neighbor[0] in [n[0] for n in v_neighbors]:
-                    v_weight = v_neighbors[[n[0] for n in v_neighbors].index(neighbor[0])][1]
-                    new_vertex.remove_neighbor(neighbor[0])
-
-                # Compute the new edge weights, namely (\mu_T, and \mu_R) (the \mu_B is a subtraction of the two)
-                red_degree = merge_operation(u_weight[0], u_weight[1], v_weight[0], v_weight[1], 'red_edge_merge', tnorm)
-                edge_membership = merge_operation(u_weight[0], 0, v_weight[0], 0, 'black_edge_merge', tnorm)
-                # The new edge weight is a tuple of the form (total, red)
-                new_weight = (edge_membership, red_degree)
-                # Add the new edge to the new vertex
-                new_vertex.add_neighbor(neighbor[0], new_weight)
-
-                # If the neighbor is not u or v, we need to update the neighbor's edge weights
-                if neighbor[0] in new_vertices:
-                    if (u, u_weight) in new_vertices[neighbor[0]].neighbors:
-                        new_vertices[neighbor[0]].neighbors.remove((u, u_weight))
-                    if (v, v_weight) in new_vertices[neighbor[0]].neighbors:
-                        new_vertices[neighbor[0]].neighbors.remove((v, v_weight))
-                    new_vertices[neighbor[0]].add_neighbor(new_vertex.name, new_weight)
-
-            # Add the new vertex to the new graph and remove the merged vertices
-            new_vertices[new_vertex.name] = new_vertex
-            new_vertices.pop(u)
-            new_vertices.pop(v)
-
-            newGraph.vertices = new_vertices
-
-            return newGraph
+            trigraph = Trigraph.from_graph(self, tnorm)
+            names = list(self.vertices.keys())
+            trigraph.contract(names.index(u), names.index(v))
+            return trigraph.to_graph()
 
     # Function to find the maximum error degree of the graph
     def find_maximum_error_degree(self):
@@ -191,39 +108,45 @@ class Graph:
 
         return max_error_degree
 
-# Function which sets the variables needed for the computation and runs the recursive function
-def twin_width(graph, tnorm):
-    global lowest_max_degree, best_sequences
-    lowest_max_degree = float('inf')
-    best_sequences = []
-    merge_all_sequences(graph, 0, tnorm)
-    return lowest_max_degree, best_sequences
-
-# The actual recursive function which computes the twin-width of the graph
-# It merges all possible pairs of vertices and computes the maximum error degree of the new graph
-# For each sequence it computes the width, and if it is lower than the current minimum, it updates the minimum
-def merge_all_sequences(graph, max_degree, tnorm, sequence=[]):
-    global lowest_max_degree, best_sequences
-
-    if len(graph.vertices) == 1:
-        if max_degree < lowest_max_degree:
-            lowest_max_degree = max_degree
-            best_sequences = [sequence]
-        elif max_degree == lowest_max_degree:
-            best_sequences.append(sequence)
-        return
-
-    for u, v in combinations(graph.vertices.keys(), 2):
-        newG = deepcopy(graph).merge_vertices(u, v, tnorm)
-        maximum_degree = newG.find_maximum_error_degree()
-        new_sequence = sequence + [(u, v)]
-        merge_all_sequences(newG, max(max_degree, maximum_degree), tnorm, new_sequence)
-
-# Function to merge all possible pairs of vertices in the graph
-def merge_all_possible_pairs(graph):
-    vertices = list(graph.vertices.keys())
-    for u, v in combinations(vertices, 2):
-        newG = graph.merge_vertices(u, v)
+# Function which converts the graph to a trigraph and runs the search (see tw_search.py)
+# With memo=True the memoized search is used instead, which returns the same result, but solves
+# every reachable partition of the vertices only once, memo_size bounds the number of stored states
+# With prune=True the branch-and-bound search is used, seeded with the width of the greedy sequence
+# With all_sequences=False only one optimal sequence is returned, which allows much stronger pruning
+# With workers > 1 the branch-and-bound search runs on a pool of processes sharing the best bound (see tw_parallel.py)
+# With a budget (SearchBudget) the search stops when it runs out and returns the best result found so far
+def twin_width(graph, tnorm, memo=False, memo_size=default_memo_size, prune=False, all_sequences=True, workers=1,
+               budget=None, symmetry=False, reduce=False):
+    return twin_width_search(graph, tnorm, memo, memo_size, prune, all_sequences, workers, budget, symmetry,
+                             reduce).result()
+
+# Same as twin_width, but returns the finished TwinWidthSearch, whose sequences are pairs of vertex ids
+# With symmetry=True, only one pair per orbit under the automorphisms of the trigraph is expanded
+# With reduce=True, zero-error twins are contracted first and every connected component is searched on its own
+# (see tw_reductions.py), the applied reductions are listed in the `reductions` of the returned search
+# and only one optimal sequence is returned, whatever all_sequences is
+def twin_width_search(graph, tnorm, memo=False, memo_size=default_memo_size, prune=False, all_sequences=True,
+                      workers=1, budget=None, symmetry=False, reduce=False):
+    trigraph = Trigraph.from_graph(graph, tnorm)
+    method = 'memo' if memo else 'prune' if prune else 'symmetric' if symmetry else 'exhaustive'
+    if reduce:
+        return reduced_search(trigraph, method, budget, memo_size)
+    if workers > 1 and not memo and not symmetry and budget is None:
+        return parallel_twin_width(trigraph, all_sequences, workers)
+
+    return TwinWidthSearch(trigraph, all_sequences, budget=budget).run(method, memo_size)
+
+# Same as twin_width with memo=True, but returns the twin-width and a generator of the optimal sequences,
+# which are found one at a time while the generator is consumed, so they never have to fit in memory together
+def twin_width_stream(graph, tnorm, memo_size=default_memo_size):
+    search = TwinWidthSearch(Trigraph.from_graph(graph, tnorm))
+    tw_value = search.solve_width(memo_size)
+    return tw_value, (search.trigraph.sequence_names(sequence) for sequence in search.iter_sequences())
+
+# Function which estimates the twin-width with one of the heuristics (see tw_heuristics.py)
+# mode is 'greedy', 'beam' or 'random', returns (upper bound, lower bound, sequence achieving the upper bound)
+def twin_width_estimate(graph, tnorm, mode='greedy', beam_width=8, restarts=16, seed=None):
+    return approximate_twin_width(Trigraph.from_graph(graph, tnorm), mode, beam_width, restarts, seed)
 
 if __name__ == '__main__':
     # Example usage
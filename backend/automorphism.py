@@ -0,0 +1,274 @@
+"""
+File:           automorphism.py
+
+Description:    This module provides a compact representation of all isomorphisms between
+                two graphs: one base isomorphism and the automorphism group of the second
+                graph, stored as a stabilizer chain. The chain is computed with orbit
+                partition refinement and VF2 searches for single automorphisms, so the
+                number of isomorphisms is known without enumerating them and any of them
+                can be produced by its index, which allows paginated or lazy enumeration.
+"""
+
+from networkx.algorithms.isomorphism import GraphMatcher
+
+
+def refine_colors(adjacency, colors):
+    """
+    Refines a vertex coloring until every two vertices of the same color have the same
+    multiset of (edge color, neighbor color) pairs (color refinement, 1-dimensional Weisfeiler-Leman).
+
+    :param adjacency: List of (neighbor index, edge color) lists, one per vertex
+    :param colors: List of initial integer colors, one per vertex
+    :return: List of refined integer colors, vertices keep being distinguished if they were before
+    """
+    count = len(set(colors))
+    while True:
+        signatures = [(colors[v], tuple(sorted((edge_color, colors[u]) for u, edge_color in adjacency[v])))
+                      for v in range(len(colors))]
+        numbering = {signature: i for i, signature in enumerate(sorted(set(signatures)))}
+        colors = [numbering[signature] for signature in signatures]
+        if len(numbering) == count:
+            return colors
+        count = len(numbering)
+
+
+def compose(p, q):
+    """
+    Returns the permutation p after q, both given as tuples of images.
+    """
+    return tuple(p[i] for i in q)
+
+
+class AutomorphismGroup:
+    """
+    Automorphism group of a networkx graph as a stabilizer chain.
+
+    The chain is a list of levels, each holding a base vertex b_i and a transversal: one
+    automorphism fixing b_1, ..., b_(i-1) for every vertex of the orbit of b_i. Every
+    automorphism is a unique product u_1 u_2 ... u_L of transversal elements, so the group order
+    is the product of the orbit sizes and the elements can be numbered in mixed radix.
+
+    Vertices may carry a 'color' attribute and edges a 'color' attribute, automorphisms then
+    preserve them.
+    """
+
+    def __init__(self, graph):
+        """
+        :param graph: networkx.Graph, optionally with 'color' node and edge attributes
+        """
+        self.graph = graph
+        self.nodes = list(graph.nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.identity = tuple(range(len(self.nodes)))
+        self.adjacency = [[(self.index[u], self._edge_color(node, u)) for u in graph.neighbors(node)]
+                          for node in self.nodes]
+        node_colors = [self._node_color(node) for node in self.nodes]
+        numbering = {color: i for i, color in enumerate(sorted(set(node_colors), key=repr))}
+        self.colors = [numbering[color] for color in node_colors]
+
+        self.levels = []  # list of (base vertex index, list of transversal permutations)
+        self.generators = []  # automorphisms found by VF2, they generate the group
+        self._build_chain()
+
+    def _node_color(self, node):
+        return self.graph.nodes[node].get('color')
+
+    def _edge_color(self, u, v):
+        return repr(self.graph.edges[u, v].get('color'))
+
+    def _build_chain(self):
+        fixed = []
+        while True:
+            colors = self._individualized_colors(fixed)
+            cells = {}
+            for v, color in enumerate(colors):
+                cells.setdefault(color, []).append(v)
+            cell = min((cell for cell in cells.values() if len(cell) > 1), key=len, default=None)
+            if cell is None:
+                return  # The partition is discrete, only the identity fixes all base vertices
+
+            base = cell[0]
+            orbit = {base: self.identity}
+            generators = []
+            for target in cell[1:]:
+                if target in orbit:
+                    continue
+                automorphism = self._find_automorphism(fixed, base, target)
+                if automorphism is None:
+                    continue
+                generators.append(automorphism)
+                self.generators.append(automorphism)
+                # Close the orbit under the automorphisms found on this level
+                queue = list(orbit.items())
+                while queue:
+                    vertex, element = queue.pop()
+                    for generator in generators:
+                        image = generator[vertex]
+                        if image not in orbit:
+                            orbit[image] = compose(generator, element)
+                            queue.append((image, orbit[image]))
+
+            self.levels.append((base, [orbit[v] for v in sorted(orbit, key=lambda v: (v != base, v))]))
+            fixed.append(base)
+
+    def _individualized_colors(self, fixed):
+        """
+        Refines the coloring after giving each fixed vertex its own color.
+        """
+        colors = [(0, color) for color in self.colors]
+        for position, v in enumerate(fixed):
+            colors[v] = (position + 1, 0)
+        numbering = {color: i for i, color in enumerate(sorted(set(colors)))}
+        return refine_colors(self.adjacency, [numbering[color] for color in colors])
+
+    def _find_automorphism(self, fixed, base, target):
+        """
+        Searches for an automorphism fixing the vertices in `fixed` and mapping base to target.
+        """
+        n = len(fixed)
+        tags1 = {v: position for position, v in enumerate(fixed)}
+        tags2 = dict(tags1)
+        tags1[base] = n
+        tags2[target] = n
+
+        def node_match(data1, data2):
+            return data1['key'] == data2['key']
+
+        def edge_match(data1, data2):
+            return repr(data1.get('color')) == repr(data2.get('color'))
+
+        graphs = []
+        for tags in (tags1, tags2):
+            graph = self.graph.copy()
+            for v, node in enumerate(self.nodes):
+                graph.nodes[node]['key'] = (self.colors[v], tags.get(v, -1))
+            graphs.append(graph)
+
+        matcher = GraphMatcher(graphs[0], graphs[1], node_match=node_match, edge_match=edge_match)
+        mapping = next(matcher.isomorphisms_iter(), None)
+        if mapping is None:
+            return None
+        return tuple(self.index[mapping[node]] for node in self.nodes)
+
+    def order(self):
+        """
+        Returns the number of automorphisms.
+        """
+        order = 1
+        for _, transversal in self.levels:
+            order *= len(transversal)
+        return order
+
+    def element(self, number):
+        """
+        Returns the automorphism with the given number (0 is the identity) as a permutation tuple.
+        """
+        if not 0 <= number < self.order():
+            raise IndexError("automorphism number out of range")
+        permutation = self.identity
+        for _, transversal in self.levels:
+            number, digit = divmod(number, len(transversal))
+            permutation = compose(permutation, transversal[digit])
+        return permutation
+
+    def as_mapping(self, permutation):
+        """
+        Converts a permutation tuple to a dictionary of vertex names.
+        """
+        return {node: self.nodes[permutation[i]] for i, node in enumerate(self.nodes)}
+
+    def orbits(self):
+        """
+        Returns the orbits of the group on the vertices as a list of lists of vertex names.
+        """
+        parent = list(range(len(self.nodes)))
+
+        def find(v):
+            while parent[v] != v:
+                parent[v] = parent[parent[v]]
+                v = parent[v]
+            return v
+
+        for generator in self.generators:
+            for v, image in enumerate(generator):
+                parent[find(v)] = find(image)
+        orbits = {}
+        for v, node in enumerate(self.nodes):
+            orbits.setdefault(find(v), []).append(node)
+        return list(orbits.values())
+
+
+def pair_orbits(group, pairs):
+    """
+    Splits unordered pairs of vertices into orbits under the automorphism group.
+
+    :param group: AutomorphismGroup
+    :param pairs: List of pairs of vertex names, closed under the group (e.g. all pairs)
+    :return: A list of orbits, one per orbit in the order of their first pair in `pairs`.
+             Every orbit is a list of (pair, permutation tuple mapping the first pair to it),
+             the first entry being the representative with the identity.
+    """
+    index = group.index
+    position = {frozenset(pair): k for k, pair in enumerate(pairs)}
+    seen = {}
+    orbits = []
+    for pair in pairs:
+        key = frozenset(pair)
+        if key in seen:
+            continue
+        orbit = [(pair, group.identity)]
+        seen[key] = True
+        queue = [(pair, group.identity)]
+        while queue:
+            (u, v), element = queue.pop()
+            for generator in group.generators:
+                image = (group.nodes[generator[index[u]]], group.nodes[generator[index[v]]])
+                image_key = frozenset(image)
+                if image_key not in seen:
+                    seen[image_key] = True
+                    image_element = compose(generator, element)
+                    orbit.append((pairs[position[image_key]], image_element))
+                    queue.append((image, image_element))
+        orbits.append(orbit)
+    return orbits
+
+
+class IsomorphismSet:
+    """
+    All isomorphisms from G1 to G2, stored as one base isomorphism and the automorphism group of G2.
+    Every isomorphism is the base isomorphism followed by an automorphism of G2.
+    """
+
+    def __init__(self, base, group):
+        """
+        :param base: Dictionary mapping vertices of G1 to vertices of G2
+        :param group: AutomorphismGroup of G2
+        """
+        self.base = base
+        self.group = group
+        self.count = group.order()
+
+    def mapping(self, number):
+        """
+        Returns the isomorphism with the given number (0 is the base isomorphism).
+        """
+        permutation = self.group.element(number)
+        nodes, index = self.group.nodes, self.group.index
+        return {vertex: nodes[permutation[index[image]]] for vertex, image in self.base.items()}
+
+    def page(self, offset=0, limit=None):
+        """
+        Returns the isomorphisms with numbers offset, ..., offset + limit - 1.
+        """
+        end = self.count if limit is None else min(self.count, offset + limit)
+        return [self.mapping(number) for number in range(max(0, offset), end)]
+
+    def generators(self):
+        """
+        Returns a generating set of the automorphism group of G2 as dictionaries of vertex names.
+        """
+        return [self.group.as_mapping(generator) for generator in self.group.generators]
+
+    def __iter__(self):
+        for number in range(self.count):
+            yield self.mapping(number)
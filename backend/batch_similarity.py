@@ -0,0 +1,118 @@
+"""
+File:           batch_similarity.py
+
+Description:    This module computes the fuzzy similarity for many pairs of graphs at once:
+                one graph against many, every graph of one list against every graph of
+                another, or the full similarity matrix of a list of graphs. Every graph is
+                converted and profiled only once (networkx graph, degree sequence and
+                Weisfeiler-Leman hash), pairs whose invariants differ are known not to be
+                isomorphic without running VF2, and the remaining pairs are distributed
+                across a pool of processes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import networkx as nx
+from networkx.algorithms.isomorphism import GraphMatcher
+from backend.isomorph import convert_to_networkx
+from backend.similarity import MappingScorer, aggregate_similarity, bounded_similarity
+from backend import metrics
+
+BATCH_MODES = ('one-vs-many', 'many-vs-many', 'matrix')
+
+
+class GraphProfile:
+    """
+    A graph together with the data computed once for all pairs it takes part in.
+    """
+
+    def __init__(self, graph):
+        """
+        :param graph: Fuzzy graph (instance of Graph)
+        """
+        self.graph = graph
+        self.nx_graph = convert_to_networkx(graph)
+        self.degrees = sorted(degree for _, degree in self.nx_graph.degree())
+        self.wl_hash = nx.weisfeiler_lehman_graph_hash(self.nx_graph)
+
+    def may_be_isomorphic(self, other):
+        """
+        Cheap necessary condition of isomorphism, False means the graphs are certainly not isomorphic.
+        """
+        return self.degrees == other.degrees and self.wl_hash == other.wl_hash
+
+
+def pair_similarity(profile1, profile2, tnorm):
+    """
+    Computes the similarity of two profiled graphs, "X" if they are not isomorphic.
+    """
+    if not profile1.may_be_isomorphic(profile2):
+        return "X"
+    scorer = MappingScorer(profile1.graph, profile2.graph)
+    similarity = bounded_similarity(profile1.graph, profile2.graph, scorer, tnorm)
+    if similarity is not None:
+        return similarity
+    mappings = GraphMatcher(profile1.nx_graph, profile2.nx_graph).isomorphisms_iter()
+    return aggregate_similarity(mappings, scorer, tnorm)
+
+
+# Profiles of a worker process, set by `_init_worker`
+_worker_profiles = None
+_worker_tnorm = None
+
+
+def _init_worker(profiles, tnorm):
+    global _worker_profiles, _worker_tnorm
+    _worker_profiles = profiles
+    _worker_tnorm = tnorm
+
+
+def _pair_in_worker(pair):
+    i, j = pair
+    return pair_similarity(_worker_profiles[i], _worker_profiles[j], _worker_tnorm)
+
+
+def batch_similarity(graphs_a, graphs_b, tnorm, symmetric=False, workers=None, min_parallel_pairs=64):
+    """
+    Computes the similarity of every graph in graphs_a with every graph in graphs_b.
+
+    :param graphs_a: List of graphs, the rows of the matrix
+    :param graphs_b: List of graphs, the columns of the matrix (ignored if symmetric)
+    :param tnorm: T-norm operator to use for aggregation ('min', 'prod', 'luk', 'drast')
+    :param symmetric: Compare graphs_a with itself, computing each unordered pair once
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :param min_parallel_pairs: Below this number of pairs to compare, no process pool is started
+    :return: Dense matrix (list of lists) of similarities, "X" where the similarity is undefined
+    """
+    profiles = [GraphProfile(graph) for graph in graphs_a]
+    offset = len(profiles)
+    if not symmetric:
+        profiles += [GraphProfile(graph) for graph in graphs_b]
+    columns = offset if symmetric else len(profiles) - offset
+
+    matrix = [["X"] * columns for _ in range(offset)]
+    pairs = []
+    for i in range(offset):
+        for j in range(i if symmetric else 0, columns):
+            column = j if symmetric else offset + j
+            # Pairs rejected by the invariants keep "X" and never reach VF2
+            if profiles[i].may_be_isomorphic(profiles[column]):
+                pairs.append((i, column))
+
+    metrics.count('batch_pairs', offset * columns)
+    metrics.count('batch_pairs_compared', len(pairs))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(pairs) >= min_parallel_pairs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(profiles, tnorm)) as executor:
+            results = list(executor.map(_pair_in_worker, pairs, chunksize=max(1, len(pairs) // (4 * workers))))
+    else:
+        results = [pair_similarity(profiles[i], profiles[j], tnorm) for i, j in pairs]
+
+    for (i, column), similarity in zip(pairs, results):
+        j = column if symmetric else column - offset
+        matrix[i][j] = similarity
+        if symmetric:
+            matrix[j][i] = similarity
+    return matrix
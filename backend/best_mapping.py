@@ -0,0 +1,185 @@
+"""
+File:           best_mapping.py
+
+Description:    This module finds the isomorphism with the least weighted edge discrepancy
+                between two fuzzy graphs by branch and bound, without enumerating all
+                isomorphisms. With the minimum t-norm the similarity only depends on the
+                smallest dissimilarity r_k, so this one mapping determines it, and for the
+                other t-norms a mapping with r_k = 0 certifies a similarity of 1.
+
+                The vertices of G1 are mapped one at a time, each to an unused vertex of G2
+                of the same degree whose adjacency to the mapped vertices agrees (as in VF2).
+                A partial mapping is pruned when its accumulated sum of |w1 - w2|^n plus a
+                lower bound of the remaining edges cannot beat the best mapping found so far.
+                The bound matches the sorted incident weights of every unmapped vertex with
+                those of its cheapest candidate, which is the cheapest possible assignment of
+                its edges for a convex cost, and halves the sum as every edge between two
+                unmapped vertices is counted from both sides.
+"""
+
+import numpy as np
+from backend.isomorph import convert_to_networkx
+from backend import metrics
+
+infinity = float('inf')
+
+# Relative margin by which a branch has to be able to beat the best mapping, so branches
+# that could only tie with it up to rounding are pruned as well
+RELATIVE_MARGIN = 1e-12
+
+
+def weight_matrix(graph, names):
+    """
+    Returns the adjacency and the edge weight matrix of the given vertices of a graph.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    adjacency = np.zeros((len(names), len(names)), dtype=bool)
+    weights = np.zeros((len(names), len(names)))
+    for name in names:
+        for neighbor, weight in graph.vertices[name].neighbors:
+            adjacency[index[name], index[neighbor]] = True
+            weights[index[name], index[neighbor]] = weight[0]
+    return adjacency, weights
+
+
+def search_order(adjacency):
+    """
+    Orders the vertices so that every vertex has as many earlier neighbors as possible,
+    starting from a vertex of the highest degree, as the VF2 ordering does.
+    """
+    degrees = adjacency.sum(axis=1)
+    order = []
+    remaining = set(range(len(adjacency)))
+    links = np.zeros(len(adjacency), dtype=int)
+    while remaining:
+        v = max(remaining, key=lambda u: (links[u], degrees[u], -u))
+        order.append(v)
+        remaining.discard(v)
+        links += adjacency[v]
+    return order
+
+
+class BestMappingSearch:
+    """
+    State of one branch-and-bound search for the isomorphism of least discrepancy.
+    """
+
+    def __init__(self, G1, G2, exponent, only_zero=False):
+        """
+        :param G1: First fuzzy graph (instance of Graph)
+        :param G2: Second fuzzy graph (instance of Graph)
+        :param exponent: Exponent n of the discrepancy sum |w1 - w2|^n (the number of edges of G1)
+        :param only_zero: Only look for a mapping without any discrepancy
+        """
+        nx_g1, nx_g2 = convert_to_networkx(G1), convert_to_networkx(G2)
+        self.names1, self.names2 = list(nx_g1.nodes), list(nx_g2.nodes)
+        self.adjacency1, self.weights1 = weight_matrix(G1, self.names1)
+        self.adjacency2, self.weights2 = weight_matrix(G2, self.names2)
+        self.exponent = exponent
+        self.only_zero = only_zero
+        self.order = search_order(self.adjacency1)
+
+        self.best_cost = infinity
+        self.best = None  # mapping[i] = vertex of G2 of the i-th vertex of G1
+        self.nodes = 0
+        self.compatible = len(self.names1) == len(self.names2) and self.adjacency1.sum() == self.adjacency2.sum()
+        if self.compatible:
+            self.bounds = self.vertex_bounds()
+
+    def vertex_bounds(self):
+        """
+        Returns the matrix of the least discrepancy of the edges of every vertex of G1 when
+        it is mapped to a vertex of G2, infinite for vertices of different degrees or loops.
+        """
+        def incident(adjacency, weights):
+            return [np.sort(weights[v][adjacency[v] & (np.arange(len(adjacency)) != v)]) for v in range(len(adjacency))]
+
+        incident1 = incident(self.adjacency1, self.weights1)
+        incident2 = incident(self.adjacency2, self.weights2)
+        loops1, loops2 = np.diag(self.adjacency1), np.diag(self.adjacency2)
+        bounds = np.full((len(self.names1), len(self.names2)), infinity)
+        for x, row in enumerate(incident1):
+            for y, other in enumerate(incident2):
+                if len(row) == len(other) and loops1[x] == loops2[y]:
+                    bounds[x, y] = np.sum(np.abs(row - other) ** self.exponent)
+        return bounds
+
+    def run(self):
+        """
+        Runs the search and returns the best mapping as a dictionary of names, or None
+        if the graphs are not isomorphic (or no mapping without discrepancy exists with only_zero).
+        """
+        if not self.compatible:
+            return None
+        with metrics.timer('best_mapping'):
+            mapping = np.full(len(self.names1), -1)
+            used = np.zeros(len(self.names2), dtype=bool)
+            self.extend(0, mapping, used, 0.0)
+        metrics.count('best_mapping_states', self.nodes)
+        if self.best is None:
+            return None
+        return {self.names1[x]: self.names2[y] for x, y in enumerate(self.best)}
+
+    def promising(self, bound):
+        """
+        Returns whether a branch with the given lower bound of its cost can still beat the best mapping.
+        """
+        if self.only_zero:
+            return bound == 0
+        return bound < self.best_cost * (1 - RELATIVE_MARGIN)
+
+    def extend(self, depth, mapping, used, cost):
+        if depth == len(self.order):
+            self.best_cost = cost
+            self.best = mapping.copy()
+            return
+        self.nodes += 1
+
+        x = self.order[depth]
+        mapped = np.array(self.order[:depth], dtype=int)
+        images = mapping[mapped]
+        remaining = self.order[depth + 1:]
+        edges = self.adjacency1[x, mapped]
+
+        branches = []
+        for y in np.flatnonzero(~used & (self.bounds[x] < infinity)):
+            if not np.array_equal(self.adjacency2[y, images], edges):
+                continue
+            added = np.sum(np.abs(self.weights1[x, mapped[edges]] - self.weights2[y, images[edges]]) ** self.exponent)
+            if self.adjacency1[x, x]:
+                added += abs(self.weights1[x, x] - self.weights2[y, y]) ** self.exponent
+            branches.append((cost + added, int(y)))
+
+        # Cheapest branches first, so a good mapping bounds the rest early
+        for branch_cost, y in sorted(branches):
+            if not self.promising(branch_cost):
+                break
+            used[y] = True
+            if remaining:
+                free = self.bounds[np.ix_(remaining, np.flatnonzero(~used))]
+                bound = branch_cost + 0.5 * float(free.min(axis=1).sum()) if free.size else infinity
+            else:
+                bound = branch_cost
+            if self.promising(bound):
+                mapping[x] = y
+                self.extend(depth + 1, mapping, used, branch_cost)
+                mapping[x] = -1
+            used[y] = False
+            if self.best_cost == 0:
+                return
+
+
+def best_mapping(G1, G2, scorer, only_zero=False):
+    """
+    Finds the isomorphism between G1 and G2 with the smallest dissimilarity r_k.
+
+    :param G1: First fuzzy graph (instance of Graph)
+    :param G2: Second fuzzy graph (instance of Graph)
+    :param scorer: MappingScorer of G1 and G2, which gives the exponent and scores the result
+    :param only_zero: Only look for a mapping with r_k = 0
+    :return: A tuple (mapping, r_k), or (None, None) if there is no such isomorphism
+    """
+    mapping = BestMappingSearch(G1, G2, max(scorer.num_edges, 1), only_zero).run()
+    if mapping is None:
+        return None, None
+    return mapping, scorer(mapping)
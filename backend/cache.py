@@ -0,0 +1,323 @@
+"""
+File:           cache.py
+
+Description:    This module implements a result cache for the twin-width, isomorphism and
+                similarity computations, shared across requests. Graphs are keyed by a
+                weight-aware certificate computed with color refinement, so relabeled copies
+                of a graph share the same key. On a lookup the stored representative graph
+                is matched to the requested one with a weight-preserving VF2 isomorphism,
+                which confirms the hit and translates the cached sequences and mappings
+                back to the caller's vertex names.
+
+                The in-memory level is an LRU bounded by the number of entries and by their
+                total size, with the cheapest entries to recompute evicted first. An optional
+                SQLite file can be shared between several processes (e.g. gunicorn workers).
+                The isomorphism checks and the SQLite queries run outside the lock of the
+                memory level, so a slow match does not hold up the other requests.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import networkx as nx
+from networkx.algorithms.isomorphism import GraphMatcher
+from backend.automorphism import refine_colors
+from backend.TWBackend import Graph, Vertex, twin_width_search
+from backend.trigraph import name_sequence, translate_sequence
+from backend.isomorph import find_isomorphisms
+from backend.similarity import compute_similarity
+
+
+def graph_certificate(graph):
+    """
+    Returns a hash of the graph which is the same for all relabelings of the graph.
+    Vertex membership values and edge weights are part of the certificate.
+    Different graphs may share a certificate, so a match still has to be verified.
+    """
+    names = list(graph.vertices)
+    index = {name: i for i, name in enumerate(names)}
+    adjacency = [[(index[neighbor], repr(weight)) for neighbor, weight in graph.vertices[name].neighbors]
+                 for name in names]
+    memberships = [repr(graph.vertices[name].membershipFunction) for name in names]
+    numbering = {membership: i for i, membership in enumerate(sorted(set(memberships)))}
+    colors = refine_colors(adjacency, [numbering[membership] for membership in memberships])
+
+    edges = sorted((min(colors[i], colors[j]), max(colors[i], colors[j]), weight)
+                   for i in range(len(names)) for j, weight in adjacency[i] if i < j)
+    certificate = (len(names), sorted(colors), edges, sorted(numbering))
+    return hashlib.sha256(repr(certificate).encode()).hexdigest()
+
+
+def weighted_networkx(graph):
+    """
+    Converts a Graph object to a networkx.Graph keeping isolated vertices, memberships and weights.
+    """
+    G = nx.Graph()
+    for name, vertex in graph.vertices.items():
+        G.add_node(name, membership=vertex.membershipFunction)
+    for name, vertex in graph.vertices.items():
+        for neighbor, weight in vertex.neighbors:
+            G.add_edge(name, neighbor, weight=tuple(weight))
+    return G
+
+
+def match_graphs(graph, representative):
+    """
+    Returns a weight-preserving isomorphism from graph to representative, or None.
+    """
+    matcher = GraphMatcher(weighted_networkx(graph), weighted_networkx(representative),
+                           node_match=lambda a, b: a['membership'] == b['membership'],
+                           edge_match=lambda a, b: a['weight'] == b['weight'])
+    return next(matcher.isomorphisms_iter(), None)
+
+
+def graph_to_data(graph):
+    return {
+        'nodes': [[name, vertex.membershipFunction] for name, vertex in graph.vertices.items()],
+        'edges': [[name, neighbor, list(weight)] for name, vertex in graph.vertices.items()
+                  for neighbor, weight in vertex.neighbors],
+    }
+
+
+def graph_size(graph):
+    """
+    Returns the number of vertices and edges of the graph, counted in the size of its cache entries.
+    """
+    return len(graph.vertices) + sum(len(vertex.neighbors) for vertex in graph.vertices.values()) // 2
+
+
+def graph_from_data(data):
+    graph = Graph()
+    for name, membership in data['nodes']:
+        graph.add_vertex(Vertex(name, membership))
+    for name, neighbor, weight in data['edges']:
+        graph.vertices[name].neighbors.append((neighbor, tuple(weight)))
+    return graph
+
+
+class CacheEntry:
+    """
+    A cached result together with the representative graphs it was computed for.
+    """
+
+    def __init__(self, graphs, value, cost, size):
+        self.graphs = graphs
+        self.value = value
+        self.cost = cost  # seconds the computation took
+        self.size = max(1, size)  # number of stored items (sequence steps, mapping entries, graph vertices and edges)
+        self.priority = 0
+
+
+class ResultCache:
+    """
+    Two-level cache of computation results, see the module description.
+
+    Entries of the memory level are evicted by the GreedyDual-Size policy: an entry's priority is
+    the time it takes to recompute it per stored item, raised by the priority of the last evicted
+    entry whenever it is used, so both old and cheap-but-large entries are dropped first.
+    """
+
+    def __init__(self, max_entries=512, max_size=1000000, path=None, max_disk_entries=100000):
+        """
+        :param max_entries: Number of entries kept in memory
+        :param max_size: Total size of the entries kept in memory
+        :param path: Path of an SQLite file used as the shared second level, or None
+        :param max_disk_entries: Number of entries kept in the SQLite file
+        """
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()  # key -> list of entries sharing the key
+        self.total_size = 0
+        self.count = 0
+        self.inflation = 0
+        self.lock = threading.Lock()  # guards the memory level and the counters
+        self.db_lock = threading.Lock()  # serializes the use of the SQLite connection
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self.db:
+                self.db.execute('CREATE TABLE IF NOT EXISTS results ('
+                                'key TEXT, graphs TEXT, value TEXT, cost REAL, size INTEGER, created REAL)')
+                self.db.execute('CREATE INDEX IF NOT EXISTS results_key ON results (key)')
+                self.db.execute('CREATE INDEX IF NOT EXISTS results_created ON results (created)')
+            # Rows of the file as seen by this process, other processes may add more
+            self.disk_rows = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def lookup(self, key, graphs):
+        """
+        Looks up a result computed for graphs isomorphic to the given ones.
+
+        :return: A tuple (value, isomorphisms from the given graphs to the representatives), or None
+        """
+        with self.lock:
+            bucket = list(self.entries.get(key, []))
+        for entry in bucket:
+            isomorphisms = self._match(graphs, entry.graphs)
+            if isomorphisms is not None:
+                with self.lock:
+                    if key in self.entries:  # the entry may have been evicted during the match
+                        self.entries.move_to_end(key)
+                    entry.priority = self.inflation + entry.cost / entry.size
+                    self.stats['hits'] += 1
+                return entry.value, isomorphisms
+
+        for entry in self._disk_entries(key):
+            isomorphisms = self._match(graphs, entry.graphs)
+            if isomorphisms is not None:
+                with self.lock:
+                    self.stats['disk_hits'] += 1
+                    self._insert(key, entry)
+                return entry.value, isomorphisms
+
+        with self.lock:
+            self.stats['misses'] += 1
+        return None
+
+    def store(self, key, graphs, value, cost, size):
+        """
+        Stores the result computed for the given graphs, which become the representatives.
+        size is the number of items of the value, the vertices and edges of the representatives are added to it.
+        """
+        # The representatives are copied, so later changes of the caller's graphs do not affect them
+        size += sum(graph_size(graph) for graph in graphs)
+        entry = CacheEntry([graph_from_data(graph_to_data(graph)) for graph in graphs], value, cost, size)
+        with self.lock:
+            self.stats['stores'] += 1
+            self._insert(key, entry)
+        if self.db is not None:
+            row = (key, json.dumps([graph_to_data(graph) for graph in graphs]),
+                   json.dumps(value), cost, entry.size, time.time())
+            with self.db_lock, self.db:
+                self.db.execute('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)', row)
+                self.disk_rows += 1
+                if self.disk_rows > self.max_disk_entries:
+                    self._evict_disk()
+
+    def info(self):
+        """
+        Returns the hit and miss counters and the current occupancy.
+        """
+        with self.lock:
+            return dict(self.stats, entries=self.count, size=self.total_size)
+
+    def _match(self, graphs, representatives):
+        isomorphisms = []
+        for graph, representative in zip(graphs, representatives):
+            isomorphism = match_graphs(graph, representative)
+            if isomorphism is None:
+                return None
+            isomorphisms.append(isomorphism)
+        return isomorphisms
+
+    def _evict_disk(self):
+        # Only runs when the file holds more rows than allowed, then the oldest rows are deleted
+        # down to 90% of the limit, so the next stores do not have to evict again
+        self.disk_rows = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        if self.disk_rows <= self.max_disk_entries:
+            return
+        surplus = self.disk_rows - int(self.max_disk_entries * 0.9)
+        self.db.execute('DELETE FROM results WHERE rowid IN '
+                        '(SELECT rowid FROM results ORDER BY created LIMIT ?)', (surplus,))
+        self.disk_rows -= surplus
+
+    def _disk_entries(self, key):
+        if self.db is None:
+            return []
+        with self.db_lock:
+            rows = self.db.execute('SELECT graphs, value, cost, size FROM results WHERE key = ?', (key,)).fetchall()
+        return [CacheEntry([graph_from_data(data) for data in json.loads(graphs)], json.loads(value), cost, size)
+                for graphs, value, cost, size in rows]
+
+    def _insert(self, key, entry):
+        entry.priority = self.inflation + entry.cost / entry.size
+        self.entries.setdefault(key, []).append(entry)
+        self.entries.move_to_end(key)
+        self.total_size += entry.size
+        self.count += 1
+        while self.count > self.max_entries or (self.total_size > self.max_size and self.count > 1):
+            self._evict()
+
+    def _evict(self):
+        key, victim = min(((key, entry) for key, bucket in self.entries.items() for entry in bucket),
+                          key=lambda item: item[1].priority)
+        self.inflation = victim.priority
+        self.entries[key].remove(victim)
+        if not self.entries[key]:
+            del self.entries[key]
+        self.total_size -= victim.size
+        self.count -= 1
+        self.stats['evictions'] += 1
+
+
+def cached_twin_width(cache, graph, tnorm, **options):
+    """
+    twin_width with caching, the options are passed to `twin_width_search`.
+    Cached sequences are translated to the vertex names of the given graph.
+    """
+    key = f"tw|{tnorm}|{sorted(options.items())}|{graph_certificate(graph)}"
+    cached = cache.lookup(key, [graph])
+    if cached is not None:
+        value, (isomorphism,) = cached
+        inverse = {image: name for name, image in isomorphism.items()}
+        index = {name: i for i, name in enumerate(graph.vertices)}
+        ids = [index[inverse[name]] for name in value['names']]
+        sequences = [name_sequence(list(graph.vertices), translate_sequence(sequence, ids))
+                     for sequence in value['sequences']]
+        return (float('inf') if value['tw'] is None else value['tw']), sequences
+
+    start = time.perf_counter()
+    search = twin_width_search(graph, tnorm, **options)
+    tw_value, sequences = search.result()
+    value = {
+        'tw': None if tw_value == float('inf') else tw_value,
+        'names': list(graph.vertices),
+        'sequences': [[list(step) for step in sequence] for sequence in search.sequences],
+    }
+    cache.store(key, [graph], value, time.perf_counter() - start, sum(len(sequence) + 1 for sequence in sequences))
+    return tw_value, sequences
+
+
+def cached_isomorphisms(cache, G1, G2):
+    """
+    find_isomorphisms with caching, cached mappings are translated to the vertex names of G1 and G2.
+    """
+    key = f"iso|{graph_certificate(G1)}|{graph_certificate(G2)}"
+    cached = cache.lookup(key, [G1, G2])
+    if cached is not None:
+        mappings, (isomorphism1, isomorphism2) = cached
+        inverse2 = {image: name for name, image in isomorphism2.items()}
+        mappings = [{name: inverse2[mapping[isomorphism1[name]]] for name in G1.vertices if isomorphism1[name] in mapping}
+                    for mapping in mappings]
+        return len(mappings) > 0, mappings
+
+    start = time.perf_counter()
+    isomorphic, mappings = find_isomorphisms(G1, G2)
+    cache.store(key, [G1, G2], mappings, time.perf_counter() - start, sum(len(mapping) + 1 for mapping in mappings))
+    return isomorphic, mappings
+
+
+def cached_similarity(cache, G1, G2, tnorm, best=None):
+    """
+    compute_similarity with caching, best is passed to compute_similarity on a miss.
+    The similarity does not depend on the vertex names, except for 'luk', which folds the
+    isomorphisms in the VF2 order given by the labeled graphs, so its key holds the labeled graphs.
+    """
+    if tnorm == "luk":
+        labeled = json.dumps([graph_to_data(G1), graph_to_data(G2)])
+        key = f"sim|{tnorm}|{hashlib.sha256(labeled.encode()).hexdigest()}"
+    else:
+        key = f"sim|{tnorm}|{graph_certificate(G1)}|{graph_certificate(G2)}"
+    cached = cache.lookup(key, [G1, G2])
+    if cached is not None:
+        return cached[0]
+
+    start = time.perf_counter()
+    similarity = compute_similarity(G1, G2, tnorm, best=best)
+    cache.store(key, [G1, G2], similarity, time.perf_counter() - start, 1)
+    return similarity
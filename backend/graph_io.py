@@ -0,0 +1,165 @@
+"""
+File:           graph_io.py
+
+Description:    This module implements the conversion of request graphs into Graph objects:
+                the JSON node/edge structure and the compact binary request format accepted
+                by the endpoints next to JSON, a NumPy .npz archive (Content-Type
+                application/x-npz) holding the graphs as arrays. Both are turned into Graph
+                objects with the bulk `Graph.from_arrays` constructor.
+
+                A graph is stored as five arrays under a common prefix:
+                    <prefix>names       vertex names (strings)
+                    <prefix>membership  vertex membership values
+                    <prefix>sources     index of the first end vertex of every edge
+                    <prefix>targets     index of the second end vertex of every edge
+                    <prefix>weights     edge weights
+                The prefix is empty for a graph at the top level of the request (/get-tw),
+                "graph1." or "query." for a graph field and "graphs.0." for the items of a
+                list field. Any other array of the archive is a scalar field (e.g. "tnorm").
+"""
+
+import io
+import numpy as np
+from backend.TWBackend import Graph
+
+GRAPH_ARRAYS = ('names', 'membership', 'sources', 'targets', 'weights')
+
+
+class GraphFormatError(ValueError):
+    """
+    Raised when a binary request is not a valid archive of graph arrays.
+    """
+
+
+def graph_from_json(data):
+    """
+    Converts the JSON structure of a graph ({"nodes": [...], "edges": [...]}) into a Graph object.
+    Edges to unknown vertices are ignored. Returns None if the structure is invalid.
+    """
+    if not isinstance(data, dict) or 'nodes' not in data or 'edges' not in data:
+        return None
+
+    try:
+        # Collect the nodes (vertices) and edges, then build the graph in one pass
+        names = [node["name"] for node in data["nodes"]]
+        memberships = [float(node["membershipFunction"]) for node in data["nodes"]]
+        index = {name: i for i, name in enumerate(names)}
+
+        sources, targets, weights = [], [], []
+        for edge in data["edges"]:
+            u, v, weight = edge["source"], edge["target"], float(edge["weight"])
+            if u in index and v in index:
+                sources.append(index[u])
+                targets.append(index[v])
+                weights.append(weight)
+
+        return Graph.from_arrays(names, memberships, sources, targets, weights)
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def graph_from_arrays(names, membership, sources, targets, weights):
+    """
+    Builds a Graph from the arrays of the binary format, checking their shapes and indices.
+    """
+    names = [str(name) for name in np.asarray(names).ravel()]
+    membership = np.asarray(membership, dtype=float).ravel()
+    sources = np.asarray(sources).ravel()
+    targets = np.asarray(targets).ravel()
+    weights = np.asarray(weights, dtype=float).ravel()
+
+    if len(membership) != len(names) or not len(sources) == len(targets) == len(weights):
+        raise GraphFormatError("array lengths do not match")
+    if len(sources) and (not np.issubdtype(sources.dtype, np.integer) or not np.issubdtype(targets.dtype, np.integer)):
+        raise GraphFormatError("edge end vertices must be integer indices")
+    if len(sources) and (min(sources.min(), targets.min()) < 0 or max(sources.max(), targets.max()) >= len(names)):
+        raise GraphFormatError("edge end vertex index out of range")
+
+    return Graph.from_arrays(names, membership.tolist(), sources.tolist(), targets.tolist(), weights.tolist())
+
+
+def graph_to_arrays(graph, prefix=''):
+    """
+    Returns the arrays of the binary format describing the graph, keyed with the given prefix.
+    """
+    names = list(graph.vertices)
+    index = {name: i for i, name in enumerate(names)}
+    edges = [(index[name], index[neighbor], weight[0]) for name, vertex in graph.vertices.items()
+             for neighbor, weight in vertex.neighbors if index[name] <= index.get(neighbor, -1)]
+    return {
+        prefix + 'names': np.array(names, dtype=str),
+        prefix + 'membership': np.array([vertex.membershipFunction for vertex in graph.vertices.values()], dtype=float),
+        prefix + 'sources': np.array([u for u, _, _ in edges], dtype=np.int64),
+        prefix + 'targets': np.array([v for _, v, _ in edges], dtype=np.int64),
+        prefix + 'weights': np.array([w for _, _, w in edges], dtype=float),
+    }
+
+
+def dump_request(fields):
+    """
+    Encodes a request as a binary archive. Graph values are stored as arrays, lists of graphs
+    as numbered items and other values as scalar arrays. A graph under the key '' is stored
+    at the top level.
+
+    :param fields: Dictionary of field name -> Graph, list of Graphs or scalar value
+    :return: The archive as bytes
+    """
+    arrays = {}
+    for field, value in fields.items():
+        if isinstance(value, Graph):
+            arrays.update(graph_to_arrays(value, f"{field}." if field else ''))
+        elif isinstance(value, list):
+            for i, graph in enumerate(value):
+                arrays.update(graph_to_arrays(graph, f"{field}.{i}."))
+        else:
+            arrays[field] = np.array(value)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def load_request(body):
+    """
+    Decodes a binary archive into a dictionary shaped like the JSON request, with
+    Graph objects in place of the JSON graphs.
+
+    :raises GraphFormatError: If the archive or one of its graphs is invalid
+    """
+    try:
+        archive = np.load(io.BytesIO(body), allow_pickle=False)
+        arrays = {key: archive[key] for key in archive.files}
+    except Exception as error:
+        raise GraphFormatError(f"invalid archive: {error}") from None
+
+    graphs = {}  # graph path (tuple of keys) -> {array name: array}
+    data = {}
+    for key, array in arrays.items():
+        *path, name = key.split('.')
+        if name in GRAPH_ARRAYS:
+            graphs.setdefault(tuple(path), {})[name] = array
+        elif array.ndim == 0:
+            data[key] = array.item()
+        else:
+            data[key] = array.tolist()
+
+    for path, parts in graphs.items():
+        missing = [name for name in GRAPH_ARRAYS if name not in parts]
+        if missing:
+            raise GraphFormatError(f"graph {'.'.join(path) or 'at the top level'} misses {', '.join(missing)}")
+        graph = graph_from_arrays(*(parts[name] for name in GRAPH_ARRAYS))
+        if not path:
+            data['graph'] = graph
+        elif len(path) == 1:
+            data[path[0]] = graph
+        elif len(path) == 2 and path[1].isdigit():
+            data.setdefault(path[0], {})[int(path[1])] = graph
+        else:
+            raise GraphFormatError(f"invalid graph path {'.'.join(path)}")
+
+    # Numbered items become lists
+    for field, value in list(data.items()):
+        if isinstance(value, dict):
+            if sorted(value) != list(range(len(value))):
+                raise GraphFormatError(f"items of {field} are not numbered 0 to {len(value) - 1}")
+            data[field] = [value[i] for i in range(len(value))]
+    return data
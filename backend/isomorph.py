@@ -11,12 +11,10 @@ Description:    This module defines the function `find_isomorphisms`, which chec
                 by Sophia Halasova at BUT FIT in 2025.
 """
 
-from itertools import permutations
-from collections import defaultdict
-from backend.TWBackend import Graph, Vertex
-import numpy as np
 import networkx as nx
 from networkx.algorithms.isomorphism import GraphMatcher
+from backend.automorphism import AutomorphismGroup, IsomorphismSet
+from backend import metrics
 
 def convert_to_networkx(my_graph):
     """
@@ -28,25 +26,53 @@ def convert_to_networkx(my_graph):
             G.add_edge(vertex.name, neighbor_name)
     return G
 
-def find_isomorphisms(G1, G2):
+def iter_isomorphisms(G1, G2):
+    """
+    Lazily yields the isomorphisms between two graphs, in the same order as `find_isomorphisms`.
+
+    :param G1: First graph (Graph object)
+    :param G2: Second graph (Graph object)
+    :return: A generator of dictionaries mapping vertices from G1 to vertices in G2
+    """
+    matcher = GraphMatcher(convert_to_networkx(G1), convert_to_networkx(G2))
+    return matcher.isomorphisms_iter()
+
+def find_isomorphisms(G1, G2, compact=False):
     """
     Finds all isomorphisms between two graphs by considering their vertices and edges.
 
     This function checks if there exists a valid mapping between the vertices of two graphs such that
     the structure of the graphs (adjacency relations) is preserved.
 
+    With compact=True the mappings are not enumerated. Instead, one base isomorphism and the 
+    automorphism group of G2 are computed and returned as an IsomorphismSet, which knows the 
+    number of mappings and produces them lazily or page by page.
+
     :param G1: First graph (Graph object)
     :param G2: Second graph (Graph object)
+    :param compact: Return an IsomorphismSet instead of a list of mappings
     :return: A tuple containing:
              - A boolean indicating if any isomorphism exists
              - A list of mappings where each mapping is a dictionary that 
-               maps vertices from G1 to corresponding vertices in G2.
+               maps vertices from G1 to corresponding vertices in G2
+               (an IsomorphismSet, or None if there is no isomorphism, with compact=True).
     """
     nx_g1 = convert_to_networkx(G1)
     nx_g2 = convert_to_networkx(G2)
 
-    matcher = GraphMatcher(nx_g1, nx_g2)
-    all_mappings = list(matcher.isomorphisms_iter())
+    if compact:
+        with metrics.timer('isomorphism_search'):
+            base = next(GraphMatcher(nx_g1, nx_g2).isomorphisms_iter(), None)
+            if base is None:
+                return False, None
+            group = AutomorphismGroup(nx_g2)
+        metrics.count('automorphism_generators', len(group.generators))
+        return True, IsomorphismSet(base, group)
+
+    with metrics.timer('isomorphism_search'):
+        matcher = GraphMatcher(nx_g1, nx_g2)
+        all_mappings = list(matcher.isomorphisms_iter())
+    metrics.count('isomorphisms', len(all_mappings))
 
     return len(all_mappings) > 0, all_mappings
 
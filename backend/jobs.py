@@ -0,0 +1,169 @@
+"""
+File:           jobs.py
+
+Description:    This module implements a small asynchronous job subsystem for long running
+                computations. Jobs are executed by a bounded pool of worker threads, the
+                number of jobs waiting for a worker is limited, and every job carries a
+                `SearchBudget` which limits its wall-clock time or number of expanded
+                states and is used to cancel it. A job that runs out of its budget keeps
+                the best result found so far.
+
+                The workers are threads, so CPU-bound searches of concurrent jobs share the
+                global interpreter lock and do not run in parallel with each other or with
+                the requests. The pool keeps the application responsive and bounds the number
+                of running searches, it does not add throughput.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from backend.trigraph import Trigraph
+from backend.tw_search import TwinWidthSearch, SearchBudget
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when a job is submitted while all workers are busy and the queue is full.
+    """
+
+
+class Job:
+    """
+    A single submitted computation and its state.
+
+    The status is one of 'queued', 'running', 'done', 'cancelled' and 'failed'.
+    """
+
+    def __init__(self, kind, budget):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.budget = budget
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+
+    def to_dict(self):
+        """
+        Returns a JSON serializable description of the job.
+        """
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if self.result is not None:
+            data['result'] = self.result
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded pool of worker threads with a bounded queue.
+    The threads share the GIL, so at most one CPU-bound job makes progress at a time.
+    """
+
+    def __init__(self, workers=2, queue_size=8, max_finished=256):
+        """
+        :param workers: Number of jobs running at the same time
+        :param queue_size: Number of jobs which may wait for a free worker
+        :param max_finished: Number of finished jobs kept for polling, the oldest are dropped first
+        """
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind, function, budget=None):
+        """
+        Submits a job which calls function(budget) and stores its return value as the result.
+        The clock of the budget is started by the search of the job, not at submission,
+        so the time spent in the queue does not count.
+
+        :param kind: Name of the computation, reported back when polling
+        :param function: Callable taking the job's SearchBudget
+        :param budget: SearchBudget of the job, an unlimited one is used if omitted
+        :return: The submitted Job
+        :raises JobQueueFull: If no worker and no queue slot is free
+        """
+        if not self.slots.acquire(blocking=False):
+            raise JobQueueFull()
+
+        job = Job(kind, budget or SearchBudget())
+        with self.lock:
+            self.jobs[job.id] = job
+            self._forget_finished()
+        job.future = self.executor.submit(self._run, job, function)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued or running job. A running job stops at its next budget check
+        and keeps the best result found so far. Returns the job, or None if it does not exist.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.budget.cancel()
+        if job.future.cancel():
+            # The job never started, so it will not release its slot itself
+            job.status = 'cancelled'
+            job.finished = time.time()
+            self.slots.release()
+        return job
+
+    def _run(self, job, function):
+        try:
+            if job.budget.cancelled.is_set():
+                job.status = 'cancelled'
+                return
+            job.status = 'running'
+            job.started = time.time()
+            job.result = function(job.budget)
+            job.status = 'cancelled' if job.budget.cancelled.is_set() else 'done'
+        except Exception as error:
+            job.error = str(error)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            self.slots.release()
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+
+def twin_width_job(graph, tnorm, all_sequences=True):
+    """
+    Returns a job function computing the fuzzy twin-width of a graph with the
+    branch-and-bound search within the job's budget.
+
+    The result contains the twin-width ('X' if undefined), the sequences, whether the
+    value is proven optimal ('exact') and the number of expanded states.
+    """
+    def run(budget):
+        search = TwinWidthSearch(Trigraph.from_graph(graph, tnorm), all_sequences, budget=budget)
+        tw_value, sequences = search.run('prune').result()
+        return {
+            'tw': "X" if tw_value == float('inf') else tw_value,
+            'sequence': sequences,
+            'exact': search.complete,
+            'nodes': search.nodes,
+        }
+    return run
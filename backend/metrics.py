@@ -0,0 +1,187 @@
+"""
+File:           metrics.py
+
+Description:    This module collects instrumentation of the backend computations: counters
+                (e.g. expanded twin-width states, enumerated isomorphisms) and timers of the
+                search and scoring phases, and latency histograms of the HTTP requests. The
+                counters are added up over the whole process and, while a request is being
+                served, also per request, so they can be returned with its response. All
+                metrics are rendered in the Prometheus text format.
+
+                The computations report their counters once per call, not per expanded state,
+                and with instrumentation disabled (GRAPH_SIM_METRICS=0) every call returns
+                right away, so the overhead is negligible.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from backend.tnorms import OPERATORS
+
+enabled = os.environ.get("GRAPH_SIM_METRICS", "1") != "0"
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_lock = threading.Lock()
+_totals = {}  # counter name -> value summed over the process
+_histograms = {}  # label tuple -> [bucket counts, sum, count]
+_request = threading.local()  # counters of the request served by the current thread
+
+
+def count(name, value=1):
+    """
+    Adds value to the counter `name`, both for the process and the current request.
+    """
+    if not enabled:
+        return
+    with _lock:
+        _totals[name] = _totals.get(name, 0) + value
+    counters = getattr(_request, 'counters', None)
+    if counters is not None:
+        counters[name] = counters.get(name, 0) + value
+
+
+class _Timer:
+    """
+    Context manager adding the elapsed seconds to the counter `<name>_seconds`.
+    """
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        count(self.name + '_seconds', time.perf_counter() - self.start)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_no_timer = _NoTimer()
+
+
+def timer(name):
+    """
+    Returns a context manager timing its block into the counter `<name>_seconds`.
+    """
+    return _Timer(name) if enabled else _no_timer
+
+
+def begin_request():
+    """
+    Starts collecting the counters of a request in the current thread.
+    """
+    if enabled:
+        _request.counters = {}
+        _request.size = 0
+
+
+def end_request():
+    """
+    Stops collecting and returns the request's counters and the size of its largest graph.
+    """
+    counters = getattr(_request, 'counters', None)
+    size = getattr(_request, 'size', 0)
+    _request.counters = None
+    _request.size = 0
+    return counters or {}, size
+
+
+def note_graph(vertices):
+    """
+    Records the number of vertices of a graph of the current request (the size label).
+    """
+    if enabled and getattr(_request, 'counters', None) is not None:
+        _request.size = max(_request.size, vertices)
+
+
+def size_label(vertices):
+    """
+    Bucket of the graph size used as a label, the next power of two, to keep the number of series small.
+    """
+    bucket = 1
+    while bucket < vertices:
+        bucket *= 2
+    return str(bucket) if vertices > 0 else "0"
+
+
+def tnorm_label(tnorm):
+    """
+    Returns the t-norm label of a request: the t-norm name if it is known, "none" if the request
+    has none and "other" for anything else, so clients cannot create an unbounded number of series.
+    """
+    if tnorm is None:
+        return "none"
+    return tnorm if isinstance(tnorm, str) and tnorm in OPERATORS else "other"
+
+
+def observe_request(endpoint, tnorm, vertices, seconds):
+    """
+    Adds a request latency to the histogram labeled by endpoint, t-norm and graph size.
+    The t-norm is the raw value of the request, it is mapped by `tnorm_label`.
+    """
+    if not enabled:
+        return
+    labels = (endpoint, tnorm_label(tnorm), size_label(vertices))
+    with _lock:
+        histogram = _histograms.get(labels)
+        if histogram is None:
+            histogram = _histograms[labels] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        histogram[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(gauges=None):
+    """
+    Returns all metrics in the Prometheus text exposition format.
+
+    :param gauges: Optional dictionary of additional gauge values (e.g. cache statistics)
+    """
+    with _lock:
+        totals = dict(_totals)
+        histograms = {labels: (list(buckets), total, number) for labels, (buckets, total, number) in _histograms.items()}
+
+    lines = []
+    for name in sorted(totals):
+        metric = f"graph_sim_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {totals[name]}")
+
+    if histograms:
+        metric = "graph_sim_request_seconds"
+        lines.append(f"# HELP {metric} Latency of the HTTP requests.")
+        lines.append(f"# TYPE {metric} histogram")
+        for (endpoint, tnorm, size), (buckets, total, number) in sorted(histograms.items()):
+            labels = f'endpoint="{_escape(endpoint)}",tnorm="{_escape(tnorm)}",size="{size}"'
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                cumulative += bucket
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{labels}}} {total}")
+            lines.append(f"{metric}_count{{{labels}}} {number}")
+
+    for name, value in sorted((gauges or {}).items()):
+        metric = f"graph_sim_{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {value}")
+    return '\n'.join(lines) + '\n'
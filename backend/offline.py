@@ -0,0 +1,275 @@
+"""
+File:           offline.py
+
+Description:    Command-line entry point computing twin-widths, isomorphisms or similarities
+                for a whole dataset without the web application. The items are read one per
+                line from a JSONL file and computed on a pool of processes, every item with
+                its own time limit, and the results are written as JSONL in the order of the
+                input. Only a bounded window of items is in flight at any time, so the memory
+                does not grow with the size of the dataset.
+
+                Progress is checkpointed next to the output: the number of input lines whose
+                results are written and the length of the output at that point. A run that was
+                interrupted continues with --resume after the last checkpoint, results written
+                after it are discarded and computed again.
+
+                Input lines, in the node/edge structure of the endpoints:
+                    tw          {"id": ..., "graph": {"nodes": [...], "edges": [...]}}
+                                or the graph itself
+                    iso, sim    {"id": ..., "graph1": {...}, "graph2": {...}}
+                "id" is optional and copied to the result, "tnorm" overrides --tnorm.
+
+Usage:          python -m backend.offline tw graphs.jsonl results.jsonl --tnorm min --timeout 60
+                python -m backend.offline sim pairs.jsonl similarity.jsonl --workers 8
+                python -m backend.offline tw graphs.jsonl results.jsonl --resume
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from backend.TWBackend import twin_width_search
+from backend.tw_search import SearchBudget
+from backend.isomorph import find_isomorphisms
+from backend.similarity import compute_similarity
+from backend.graph_io import graph_from_json
+
+TASKS = ('tw', 'iso', 'sim')
+SEQUENCE_OUTPUTS = ('none', 'one', 'all')
+
+
+class ItemTimeout(Exception):
+    """
+    Raised in a worker process when an item exceeds its time limit.
+    """
+
+
+def _raise_timeout(signum, frame):
+    raise ItemTimeout()
+
+
+def _init_worker():
+    # The time limit of the isomorphism and similarity items is enforced with an alarm signal
+    # where the platform has one, the twin-width search stops by itself through its budget
+    if hasattr(signal, 'setitimer'):
+        signal.signal(signal.SIGALRM, _raise_timeout)
+    # Interrupts are handled by the main process, which checkpoints and stops the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _set_alarm(seconds):
+    if seconds and hasattr(signal, 'setitimer'):
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+
+
+def _clear_alarm():
+    if hasattr(signal, 'setitimer'):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def parse_graph(data, field):
+    graph = graph_from_json(data)
+    if graph is None:
+        raise ValueError(f"invalid graph structure in {field}")
+    return graph
+
+
+def compute_item(task, record, tnorm, timeout, sequences):
+    """
+    Computes the result fields of one item.
+
+    :return: A tuple (status 'ok' or 'timeout', dictionary of result fields)
+    """
+    if task == 'tw':
+        graph = parse_graph(record.get('graph', record), 'graph')
+        budget = SearchBudget(seconds=timeout) if timeout else None
+        search = twin_width_search(graph, tnorm, prune=True, all_sequences=sequences == 'all', budget=budget)
+        tw_value, named = search.result()
+        fields = {'tw': "X" if tw_value == float('inf') else tw_value, 'exact': search.complete}
+        if sequences != 'none':
+            fields['sequences'] = named if sequences == 'all' else named[:1]
+        return ('ok' if search.complete else 'timeout'), fields
+
+    G1, G2 = parse_graph(record['graph1'], 'graph1'), parse_graph(record['graph2'], 'graph2')
+    if task == 'iso':
+        isomorphic, mappings = find_isomorphisms(G1, G2, compact=True)
+        return 'ok', {'isomorphic': isomorphic, 'count': mappings.count if isomorphic else 0}
+    return 'ok', {'similarity': compute_similarity(G1, G2, tnorm)}
+
+
+def run_item(task, number, line, tnorm, timeout, sequences):
+    """
+    Computes the item of one input line in a worker process and returns its result record.
+    The alarm of the twin-width search is only a backstop, its budget stops it first.
+    """
+    result = {'line': number}
+    start = time.perf_counter()
+    try:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("the line is not a JSON object")
+        if 'id' in record:
+            result['id'] = record['id']
+        _set_alarm(timeout * 2 + 1 if task == 'tw' and timeout else timeout)
+        try:
+            status, fields = compute_item(task, record, record.get('tnorm', tnorm), timeout, sequences)
+        finally:
+            _clear_alarm()
+        result['status'] = status
+        result.update(fields)
+    except ItemTimeout:
+        result['status'] = 'timeout'
+    except Exception as error:
+        # An invalid or failing item is reported, the other items go on
+        result['status'] = 'error'
+        result['error'] = f"{type(error).__name__}: {error}"
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def load_checkpoint(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_checkpoint(path, state):
+    # Written to a temporary file and renamed, so a crash never leaves a partial checkpoint
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def run(task, input_path, output_path, tnorm='min', workers=None, timeout=60, sequences='one',
+        window=None, checkpoint_path=None, checkpoint_every=100, resume=False):
+    """
+    Computes the items of a JSONL file and writes their results to a JSONL file.
+
+    :param task: 'tw', 'iso' or 'sim'
+    :param input_path: JSONL file with one item per line, empty lines are skipped
+    :param output_path: JSONL file of the results, in the order of the input lines
+    :param tnorm: T-norm of the items without a "tnorm" field
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :param timeout: Seconds per item, or None for no limit
+    :param sequences: Optimal sequences written with a twin-width ('none', 'one' or 'all')
+    :param window: Number of items in flight or waiting to be written, defaults to 4 per worker
+    :param checkpoint_path: Checkpoint file, defaults to the output path with ".checkpoint" appended
+    :param checkpoint_every: Number of written results after which the checkpoint is updated
+    :param resume: Continue after the last checkpoint instead of starting over
+    :return: Dictionary with the number of results per status
+    :raises ValueError: If the checkpoint belongs to another run, or the output is shorter than it records
+    """
+    workers = workers or os.cpu_count() or 1
+    window = window or 4 * workers
+    checkpoint_path = checkpoint_path or output_path + '.checkpoint'
+    state = {'task': task, 'input': os.path.abspath(input_path), 'lines': 0, 'output_bytes': 0}
+
+    if resume and os.path.exists(checkpoint_path):
+        previous = load_checkpoint(checkpoint_path)
+        if previous['task'] != task or previous['input'] != state['input']:
+            raise ValueError(f"{checkpoint_path} belongs to a {previous['task']} run over {previous['input']}")
+        size = os.path.getsize(output_path) if os.path.exists(output_path) else None
+        if size is None or size < previous['output_bytes']:
+            raise ValueError(f"{output_path} is missing or shorter than its checkpoint, run without --resume")
+        state = previous
+        output = open(output_path, 'r+b')
+        output.truncate(state['output_bytes'])  # results written after the checkpoint are computed again
+        output.seek(state['output_bytes'])
+    else:
+        output = open(output_path, 'wb')
+        save_checkpoint(checkpoint_path, state)  # a checkpoint of an earlier run must not be resumed
+
+    statuses = {}
+    written_since_checkpoint = 0
+
+    def checkpoint():
+        output.flush()
+        os.fsync(output.fileno())
+        state['output_bytes'] = output.tell()
+        save_checkpoint(checkpoint_path, state)
+
+    with output, open(input_path, 'rb') as input_file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for _ in range(state['lines']):
+            next(input_file, None)
+
+        lines = enumerate(input_file, start=state['lines'])
+        pending = {}  # future -> input line number
+        done = {}  # input line number -> result record (None for a skipped line), until it is written
+        exhausted = False
+        try:
+            while True:
+                # Keep the window full, the results are buffered only until the earlier ones are written
+                while not exhausted and len(pending) + len(done) < window:
+                    item = next(lines, None)
+                    if item is None:
+                        exhausted = True
+                    elif not item[1].strip():
+                        done[item[0]] = None
+                    else:
+                        number, line = item
+                        pending[executor.submit(run_item, task, number, line.decode(), tnorm, timeout, sequences)] = number
+
+                if pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done[pending.pop(future)] = future.result()
+
+                while state['lines'] in done:
+                    result = done.pop(state['lines'])
+                    if result is not None:
+                        output.write((json.dumps(result) + '\n').encode())
+                        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+                        written_since_checkpoint += 1
+                    state['lines'] += 1
+
+                if written_since_checkpoint >= checkpoint_every:
+                    checkpoint()
+                    written_since_checkpoint = 0
+                if exhausted and not pending and not done:
+                    break
+        finally:
+            # Also after an interrupt, the results written in order so far are kept
+            for future in pending:
+                future.cancel()
+            checkpoint()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Computes twin-widths, isomorphisms or similarities of a JSONL dataset.')
+    parser.add_argument('task', choices=TASKS)
+    parser.add_argument('input', help='JSONL file with one graph (tw) or pair of graphs (iso, sim) per line')
+    parser.add_argument('output', help='JSONL file the results are written to')
+    parser.add_argument('--tnorm', default='min', choices=['min', 'prod', 'luk', 'drast'])
+    parser.add_argument('--workers', type=int, help='number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds per item, 0 for no limit')
+    parser.add_argument('--sequences', default='one', choices=SEQUENCE_OUTPUTS,
+                        help='optimal contraction sequences written with every twin-width')
+    parser.add_argument('--window', type=int, help='items in flight at once, defaults to 4 per worker')
+    parser.add_argument('--checkpoint', help='checkpoint file, defaults to OUTPUT.checkpoint')
+    parser.add_argument('--checkpoint-every', type=int, default=100, help='results written between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted run after its last checkpoint')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        statuses = run(args.task, args.input, args.output, args.tnorm, args.workers, args.timeout or None,
+                       args.sequences, args.window, args.checkpoint, args.checkpoint_every, args.resume)
+    except KeyboardInterrupt:
+        print("Interrupted, continue with --resume", file=sys.stderr)
+        sys.exit(130)
+    except ValueError as error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(2)
+    summary = ', '.join(f"{count} {status}" for status, count in sorted(statuses.items())) or "no items"
+    print(f"{summary} in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
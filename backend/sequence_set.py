@@ -0,0 +1,212 @@
+"""
+File:           sequence_set.py
+
+Description:    This module implements the compact representation of a set of contraction
+                sequences. The sequences are stored as a graph of contraction steps in which
+                sequences with a common prefix share its steps: a trie built by the search
+                from persistent linked prefixes, or a DAG of the search states, in which the
+                steps after a state are stored once however many orders of merges reach it.
+                Every node counts the sequences continuing it, so the number of sequences is
+                known without listing them, and they are produced lazily, by number, page by
+                page or as a random sample.
+"""
+
+import random
+
+
+class SequenceNode:
+    """
+    A prefix of contraction sequences: its last step, the nodes of the longer prefixes and
+    whether a sequence ends in it. In a DAG, the nodes reaching the same state by different
+    steps share the list of their children.
+
+    During the search a prefix is extended by `extend` without changing the node itself.
+    The new node only knows its parent and is linked into the set when a sequence ending
+    in it is recorded, so abandoned branches are freed with the search stack.
+    """
+
+    __slots__ = ('parent', 'i', 'j', 'children', 'terminal', 'generation', 'count')
+
+    def __init__(self, parent=None, i=None, j=None):
+        self.parent = parent
+        self.i = i
+        self.j = j
+        self.children = ()  # child nodes, a list once the first one is added
+        self.terminal = False
+        self.generation = -1  # generation of the set the node is linked into
+        self.count = 0  # number of sequences continuing the prefix
+
+    @property
+    def step(self):
+        return self.i, self.j
+
+    def extend(self, i, j):
+        """
+        Returns the prefix followed by the contraction of the pair i, j.
+        """
+        return SequenceNode(self, i, j)
+
+
+class SequenceSet:
+    """
+    Set of contraction sequences of (i, j) id pairs sharing their common prefixes.
+    A set built as a DAG of search states (see `TwinWidthSearch.optimal_sequences`)
+    is only read, sequences are added to sets built as a trie.
+    """
+
+    def __init__(self, root=None):
+        """
+        :param root: Root node of an existing graph of steps, or None for an empty set
+        """
+        self.root = root if root is not None else SequenceNode()
+        self.generation = 0
+        self.root.generation = 0
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        """
+        Builds a set from an iterable of sequences, consumed one at a time.
+        """
+        result = cls()
+        result.extend(sequences)
+        return result
+
+    # Building
+
+    def add(self, node):
+        """
+        Records the sequence ending in the given prefix node, which was extended from the root.
+        Its ancestors which are not linked into the set yet are linked in.
+        """
+        chain = []
+        while node.generation != self.generation:
+            chain.append(node)
+            node = node.parent
+        for child in reversed(chain):
+            child.generation = self.generation
+            child.children = ()
+            child.terminal = False
+            child.count = 0
+            self._link(child.parent, child)
+        self._terminate(chain[0] if chain else node)
+
+    def append(self, sequence):
+        """
+        Records a sequence given as a list of id pairs.
+        """
+        node = self.root
+        for step in sequence:
+            i, j = step
+            for child in node.children:
+                if child.i == i and child.j == j:
+                    node = child
+                    break
+            else:
+                child = SequenceNode(node, i, j)
+                child.generation = self.generation
+                self._link(node, child)
+                node = child
+        self._terminate(node)
+
+    @staticmethod
+    def _terminate(node):
+        # Ends a sequence in the node and counts it in the node and all its ancestors
+        if node.terminal:
+            return
+        node.terminal = True
+        while node is not None:
+            node.count += 1
+            node = node.parent
+
+    @staticmethod
+    def _link(parent, child):
+        if not parent.children:
+            parent.children = []
+        parent.children.append(child)
+
+    def extend(self, sequences):
+        for sequence in sequences:
+            self.append(sequence)
+
+    def clear(self):
+        """
+        Removes all sequences. Nodes linked before are linked in again when they are recorded.
+        """
+        self.generation += 1
+        self.root.generation = self.generation
+        self.root.children = ()
+        self.root.terminal = False
+        self.root.count = 0
+
+    # Reading
+
+    @property
+    def count(self):
+        """
+        The exact number of sequences, which may be too large for `len`.
+        """
+        return self.root.count
+
+    def sequence(self, number):
+        """
+        Returns the sequence with the given number in the order of the iteration.
+        """
+        if number < 0:
+            number += self.count
+        if not 0 <= number < self.count:
+            raise IndexError("sequence number out of range")
+
+        node, sequence = self.root, []
+        while True:
+            if node.terminal:
+                if number == 0:
+                    return sequence
+                number -= 1
+            for child in node.children:
+                if number < child.count:
+                    sequence.append(child.step)
+                    node = child
+                    break
+                number -= child.count
+
+    def page(self, offset=0, limit=None):
+        """
+        Returns the sequences with numbers offset, ..., offset + limit - 1.
+        """
+        end = self.count if limit is None else min(self.count, offset + limit)
+        return [self.sequence(number) for number in range(max(0, offset), end)]
+
+    def sample(self, size, seed=None):
+        """
+        Returns up to `size` different sequences drawn uniformly at random.
+        """
+        numbers = random.Random(seed).sample(range(self.count), min(size, self.count))
+        return [self.sequence(number) for number in numbers]
+
+    def __iter__(self):
+        return self._walk(self.root, [])
+
+    def _walk(self, node, prefix):
+        if node.terminal:
+            yield list(prefix)
+        for child in node.children:
+            prefix.append(child.step)
+            yield from self._walk(child, prefix)
+            prefix.pop()
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.root.terminal or bool(self.root.children)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.sequence(number) for number in range(*index.indices(self.count))]
+        return self.sequence(index)
+
+    def to_list(self):
+        """
+        Returns all sequences as a list of lists of id pairs (the output before this representation).
+        """
+        return list(self)
@@ -0,0 +1,414 @@
+"""
+File:           sessions.py
+
+Description:    This module implements server-side graph sessions for incremental editing. A
+                session holds a graph which is changed by small delta operations instead of
+                being uploaded again for every computation. The edge weight arrays used to
+                score isomorphisms are updated in place by every edit (and rolled back with
+                it), the structural data (networkx conversion, degrees, Weisfeiler-Leman
+                hash) is rebuilt from them after structural edits only, in the order of the
+                vertices, so the order of the isomorphisms, on which the 'luk' similarity
+                depends, does not depend on the history of the edits. Earlier results are
+                reused where an edit cannot affect them:
+                isomorphisms only depend on the structure, so they survive weight changes,
+                and the last optimal contraction sequence seeds the branch-and-bound bound
+                of the next twin-width search. Sessions expire after a time to live.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import networkx as nx
+from networkx.algorithms.isomorphism import GraphMatcher
+from backend.TWBackend import Vertex
+from backend.trigraph import Trigraph
+from backend.tw_search import TwinWidthSearch
+from backend.similarity import MappingScorer, aggregate_similarity
+from backend.tnorms import get_operators
+
+# Operation name -> required fields besides "op"
+OPERATIONS = {
+    'add_vertex': ('name', 'membershipFunction'),
+    'remove_vertex': ('name',),
+    'add_edge': ('source', 'target', 'weight'),
+    'remove_edge': ('source', 'target'),
+    'set_weight': ('source', 'target', 'weight'),
+    'set_membership': ('name', 'membershipFunction'),
+}
+STRUCTURAL_OPERATIONS = ('add_vertex', 'remove_vertex', 'add_edge', 'remove_edge')
+
+
+class SessionError(Exception):
+    """
+    Raised when a delta operation is invalid, `index` is its position in the request.
+    """
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+class GraphSession:
+    """
+    A graph edited by delta operations together with its derived data and reusable results.
+
+    `version` changes with every applied operation, `structure_version` only with operations
+    changing the vertices or edges, not their weights.
+
+    Every vertex has a slot, a row of the adjacency and the weight matrix, which it keeps
+    until it is removed. The slots of removed vertices are reused by added vertices.
+    """
+
+    def __init__(self, graph):
+        self.id = uuid.uuid4().hex
+        self.graph = graph
+        self.version = 0
+        self.structure_version = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.slots = {name: slot for slot, name in enumerate(graph.vertices)}  # vertex name -> slot
+        self.free_slots = []
+        size = max(1, len(self.slots))
+        self.adjacency = np.zeros((size, size), dtype=bool)
+        self.weights = np.zeros((size, size))  # black edge weights
+        for name, vertex in graph.vertices.items():
+            for neighbor, weight in vertex.neighbors:
+                self.adjacency[self.slots[name], self.slots[neighbor]] = True
+                self.weights[self.slots[name], self.slots[neighbor]] = weight[0]
+
+        self._structure = None  # (structure version, networkx graph, edge arrays)
+        self._wl_hash = None  # (structure version, hash)
+        self.tw_results = {}  # t-norm -> (version, vertex names, width, sequences of id pairs, sequences of names)
+
+    # Delta operations
+
+    def apply(self, operations):
+        """
+        Applies a list of delta operations. Either all of them are applied or, if one of them
+        is invalid, none.
+
+        :raises SessionError: If an operation is invalid
+        """
+        undos = []
+        for index, operation in enumerate(operations):
+            try:
+                undos.append(self._apply(operation))
+            except (KeyError, ValueError, TypeError) as error:
+                for undo in reversed(undos):
+                    undo()
+                raise SessionError(f"Invalid operation: {error}", index) from None
+
+        self.version += 1
+        if any(operation['op'] in STRUCTURAL_OPERATIONS for operation in operations):
+            self.structure_version += 1
+
+    def _apply(self, operation):
+        """
+        Applies one operation and returns a function which reverts it.
+        """
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise ValueError("unknown operation")
+        missing = [field for field in OPERATIONS[operation['op']] if field not in operation]
+        if missing:
+            raise KeyError(', '.join(missing))
+
+        op = operation['op']
+        vertices = self.graph.vertices
+        if op == 'add_vertex':
+            name = operation['name']
+            if name in vertices:
+                raise ValueError(f"vertex {name} already exists")
+            membership = float(operation['membershipFunction'])
+            self.graph.add_vertex(Vertex(name, membership))
+            self._add_slot(name)
+            return lambda: self._apply({'op': 'remove_vertex', 'name': name})
+
+        if op == 'set_membership':
+            vertex = self._vertex(operation['name'])
+            membership, previous = float(operation['membershipFunction']), vertex.membershipFunction
+            vertex.membershipFunction = membership
+            return lambda: setattr(vertex, 'membershipFunction', previous)
+
+        if op == 'remove_vertex':
+            vertex = self._vertex(operation['name'])
+            order = list(vertices)
+            for neighbor, _ in vertex.neighbors:
+                if neighbor != vertex.name:
+                    vertices[neighbor].remove_neighbor(vertex.name)
+            del vertices[vertex.name]
+            slot = self._remove_slot(vertex.name)
+            return lambda: self._restore_vertex(vertex, order, slot)
+
+        source, target = self._vertex(operation['source']).name, self._vertex(operation['target']).name
+        current = self._weight(source, target)
+        if op == 'add_edge':
+            if current is not None:
+                raise ValueError(f"edge {source}-{target} already exists")
+            self._set_edge(source, target, (float(operation['weight']), 0))
+            return lambda: self._apply({'op': 'remove_edge', 'source': source, 'target': target})
+
+        if current is None:
+            raise ValueError(f"edge {source}-{target} does not exist")
+        if op == 'remove_edge':
+            vertices[source].remove_neighbor(target)
+            vertices[target].remove_neighbor(source)
+            self._clear_edge(source, target)
+            return lambda: self._set_edge(source, target, current)
+
+        # set_weight
+        self._set_edge(source, target, (float(operation['weight']), current[1]))
+        return lambda: self._set_edge(source, target, current)
+
+    def _restore_vertex(self, vertex, order, slot):
+        """
+        Reverts remove_vertex, the vertex kept its neighbor list and gets back its position and slot.
+        """
+        vertices = self.graph.vertices
+        vertices[vertex.name] = vertex
+        self.free_slots.remove(slot)
+        self.slots[vertex.name] = slot
+        for neighbor, weight in vertex.neighbors:
+            vertices[neighbor].add_neighbor(vertex.name, weight)
+            self._set_edge_arrays(vertex.name, neighbor, weight)
+        self.graph.vertices = {name: vertices[name] for name in order}
+
+    def _set_edge(self, source, target, weight):
+        self.graph.add_edge(source, target, weight)
+        self._set_edge_arrays(source, target, weight)
+
+    def _set_edge_arrays(self, source, target, weight):
+        u, v = self.slots[source], self.slots[target]
+        self.adjacency[u, v] = self.adjacency[v, u] = True
+        self.weights[u, v] = self.weights[v, u] = weight[0]
+
+    def _clear_edge(self, source, target):
+        u, v = self.slots[source], self.slots[target]
+        self.adjacency[u, v] = self.adjacency[v, u] = False
+        self.weights[u, v] = self.weights[v, u] = 0
+
+    def _add_slot(self, name):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = len(self.slots)
+            if slot == len(self.weights):
+                # The matrices grow by doubling, so adding vertices one by one is amortized constant
+                size = 2 * len(self.weights)
+                adjacency, weights = np.zeros((size, size), dtype=bool), np.zeros((size, size))
+                adjacency[:slot, :slot] = self.adjacency
+                weights[:slot, :slot] = self.weights
+                self.adjacency, self.weights = adjacency, weights
+        self.slots[name] = slot
+
+    def _remove_slot(self, name):
+        slot = self.slots.pop(name)
+        self.adjacency[slot, :] = self.adjacency[:, slot] = False
+        self.weights[slot, :] = self.weights[:, slot] = 0
+        self.free_slots.append(slot)
+        return slot
+
+    def _vertex(self, name):
+        vertex = self.graph.find_vertex(name)
+        if vertex is None:
+            raise ValueError(f"vertex {name} does not exist")
+        return vertex
+
+    def _weight(self, source, target):
+        for neighbor, weight in self.graph.vertices[source].neighbors:
+            if neighbor == target:
+                return weight
+        return None
+
+    # Derived data
+
+    def _structure_data(self):
+        """
+        Returns the networkx graph and the edge arrays of the current structure, rebuilt only
+        after structural edits. Both follow the order of the vertices, not the order of the edits.
+        """
+        if self._structure is None or self._structure[0] != self.structure_version:
+            names = [name for name in self.graph.vertices]
+            order = np.array([self.slots[name] for name in names], dtype=np.intp)
+            adjacency = self.adjacency[np.ix_(order, order)]
+
+            # Vertices without edges are not part of the networkx conversion (see isomorph.py)
+            connected = np.flatnonzero(adjacency.any(axis=1))
+            nx_graph = nx.Graph()
+            nx_graph.add_nodes_from(names[k] for k in connected)
+            src, dst = np.nonzero(np.triu(adjacency))  # each unordered edge once, row by row
+            nx_graph.add_edges_from((names[u], names[v]) for u, v in zip(src, dst))
+
+            # Edge arrays of the scorer, indexing the list of the connected vertices
+            position = np.full(len(names), -1, dtype=np.intp)
+            position[connected] = np.arange(len(connected))
+            edges = ([names[k] for k in connected], position[src], position[dst], order[src], order[dst])
+            self._structure = (self.structure_version, nx_graph, edges)
+        return self._structure[1], self._structure[2]
+
+    @property
+    def nx_graph(self):
+        return self._structure_data()[0]
+
+    def scorer(self, other):
+        """
+        Returns a MappingScorer of isomorphisms from this session's graph to the other's, reading
+        the weights from the arrays of both sessions instead of converting the graphs.
+        """
+        names, src, dst, slot_src, slot_dst = self._structure_data()[1]
+        _, _, _, other_src, other_dst = other._structure_data()[1]
+        return MappingScorer.from_arrays(names, src, dst, self.weights[slot_src, slot_dst], other.slots,
+                                         other.weights, other.weights[other_src, other_dst])
+
+    def degrees(self):
+        return sorted(degree for _, degree in self.nx_graph.degree())
+
+    def wl_hash(self):
+        """
+        Returns the Weisfeiler-Leman hash of the structure, recomputed only after structural edits.
+        """
+        if self._wl_hash is None or self._wl_hash[0] != self.structure_version:
+            self._wl_hash = (self.structure_version, nx.weisfeiler_lehman_graph_hash(self.nx_graph))
+        return self._wl_hash[1]
+
+    def may_be_isomorphic(self, other):
+        return self.degrees() == other.degrees() and self.wl_hash() == other.wl_hash()
+
+    def twin_width(self, tnorm):
+        """
+        Computes the twin-width and all optimal sequences with the branch-and-bound search.
+        An unchanged graph reuses the last result. After an edit that kept the vertices,
+        the last optimal sequence is still a valid sequence and its width seeds the bound.
+
+        :return: A tuple (twin-width, sequences of vertex names, what was reused: 'result', 'bound' or None)
+        :raises ValueError: If the t-norm is unknown
+        """
+        get_operators(tnorm)
+        names = list(self.graph.vertices)
+        previous = self.tw_results.get(tnorm)
+        if previous is not None and previous[0] == self.version:
+            return previous[2], previous[4], 'result'
+
+        seed = None
+        if previous is not None and previous[1] == names and previous[3]:
+            seed = previous[3][0]
+        search = TwinWidthSearch(Trigraph.from_graph(self.graph, tnorm)).run('prune', seed=seed)
+        width, sequences = search.result()
+        self.tw_results[tnorm] = (self.version, names, width, search.sequences, sequences)
+        return width, sequences, 'bound' if seed is not None else None
+
+
+class SessionStore:
+    """
+    Sessions by id, evicted after `ttl` seconds without use, and the isomorphisms between pairs
+    of sessions, kept while the structure of both sessions is unchanged.
+    """
+
+    def __init__(self, ttl=1800, max_sessions=1000, max_pairs=256):
+        """
+        :param ttl: Seconds after the last use at which a session is evicted
+        :param max_sessions: Number of sessions, the least recently used are evicted beyond it
+        :param max_pairs: Number of cached isomorphism results between pairs of sessions
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_pairs = max_pairs
+        self.sessions = OrderedDict()
+        self.pairs = OrderedDict()  # (id1, structure version 1, id2, structure version 2) -> mappings
+        self.lock = threading.Lock()
+
+    def create(self, graph):
+        session = GraphSession(graph)
+        with self.lock:
+            self._evict_expired()
+            self.sessions[session.id] = session
+            while len(self.sessions) > self.max_sessions:
+                self._remove(next(iter(self.sessions)))
+        return session
+
+    def get(self, session_id):
+        """
+        Returns the session and marks it as used, or None if it does not exist or expired.
+        """
+        with self.lock:
+            self._evict_expired()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self.lock:
+            if session_id not in self.sessions:
+                return False
+            self._remove(session_id)
+            return True
+
+    def isomorphisms(self, session1, session2):
+        """
+        Returns the isomorphisms between the graphs of two sessions, reused while neither
+        structure changed.
+
+        :return: A tuple (list of mappings, whether they were reused)
+        """
+        key = (session1.id, session1.structure_version, session2.id, session2.structure_version)
+        with self.lock:
+            if key in self.pairs:
+                self.pairs.move_to_end(key)
+                return self.pairs[key], True
+
+        if session1.may_be_isomorphic(session2):
+            mappings = list(GraphMatcher(session1.nx_graph, session2.nx_graph).isomorphisms_iter())
+        else:
+            mappings = []
+        with self.lock:
+            self.pairs[key] = mappings
+            while len(self.pairs) > self.max_pairs:
+                self.pairs.popitem(last=False)
+        return mappings, False
+
+    def similarity(self, session1, session2, tnorm):
+        """
+        Computes the similarity of two sessions, the isomorphisms are reused while both
+        structures are unchanged, so weight edits only rescore them.
+
+        :return: A tuple (similarity or "X", whether the isomorphisms were reused)
+        """
+        mappings, reused = self.isomorphisms(session1, session2)
+        return aggregate_similarity(mappings, session1.scorer(session2), tnorm), reused
+
+    @contextmanager
+    def locked(self, *sessions):
+        """
+        Holds the locks of the given sessions, always taken in the same order to avoid deadlocks.
+        """
+        ordered = sorted({session.id: session for session in sessions}.values(), key=lambda session: session.id)
+        for session in ordered:
+            session.lock.acquire()
+        try:
+            yield
+        finally:
+            for session in reversed(ordered):
+                session.lock.release()
+
+    def info(self):
+        with self.lock:
+            return {'sessions': len(self.sessions), 'pairs': len(self.pairs)}
+
+    def _evict_expired(self):
+        # The sessions are ordered by their last use, so the expired ones are at the front
+        deadline = time.monotonic() - self.ttl
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_used >= deadline:
+                break
+            self._remove(session_id)
+
+    def _remove(self, session_id):
+        del self.sessions[session_id]
+        for key in [key for key in self.pairs if session_id in (key[0], key[2])]:
+            del self.pairs[key]
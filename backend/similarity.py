@@ -11,8 +11,10 @@ Description:    This module provides functions for computing the similarity betw
                 by Sophia Halasova at BUT FIT in 2025.
 """
 import numpy as np
-from backend.isomorph import find_isomorphisms
-from backend.TWBackend import Graph, Vertex
+from backend.isomorph import find_isomorphisms, iter_isomorphisms
+from backend import metrics
+from backend.tnorms import get_operators
+from backend.best_mapping import best_mapping
 
 def t_norm(u, v, tnorm):
     """
@@ -23,22 +25,102 @@ def t_norm(u, v, tnorm):
     :param tnorm: Type of t-norm to use ('min', 'prod', 'luk', 'drast')
     :return: The computed t-norm value
     """
-    match tnorm:
-        case "min": # Minimum t-norm
-            return min(u, v)
-        case "prod": # Product t-norm
-            return u*v
-        case "luk": # Łukasiewicz t-norm
-            return max(u + v - 1, 0)
-        case "drast": # Drastic t-norm
-            if u == 1:
-                return v
-            elif v == 1:
-                return u
-            else:
-                return 0
-
-def compute_similarity(G1, G2, tnorm):
+    return get_operators(tnorm).tnorm(u, v)
+
+class MappingScorer:
+    """
+    Scores isomorphisms between two fuzzy graphs by the differences of their edge weights.
+
+    The edges of G1 and the weight matrix of G2 are precomputed once as NumPy arrays, so scoring
+    a mapping is a single gather of the mapped G2 weights and a vectorized sum of |w1 - w2|^n.
+    """
+
+    def __init__(self, G1, G2):
+        """
+        :param G1: First fuzzy graph (instance of Graph)
+        :param G2: Second fuzzy graph (instance of Graph)
+        """
+        # Edges of G1, each unordered edge once, as indices into the list of their end vertices
+        self.names = []
+        index1 = {}
+        src, dst, weights = [], [], []
+        for vertex_name, vertex in G1.vertices.items():
+            for neighbor, weight in vertex.neighbors:
+                if neighbor in index1:
+                    continue  # The edge was added from the neighbor's side
+                if vertex_name not in index1:
+                    index1[vertex_name] = len(self.names)
+                    self.names.append(vertex_name)
+                src.append(index1[vertex_name])
+                dst.append(neighbor)
+                weights.append(weight[0])
+        for neighbor in dst:
+            if neighbor not in index1:
+                index1[neighbor] = len(self.names)
+                self.names.append(neighbor)
+        src = np.array(src, dtype=np.intp)
+        dst = np.array([index1[neighbor] for neighbor in dst], dtype=np.intp)
+
+        # Weight matrix of G2
+        index2 = {name: i for i, name in enumerate(G2.vertices)}
+        weights2 = np.zeros((len(index2), len(index2)))
+        edge_weights2 = []
+        for vertex_name, vertex in G2.vertices.items():
+            for neighbor, weight in vertex.neighbors:
+                weights2[index2[vertex_name], index2[neighbor]] = weight[0]
+                edge_weights2.append(weight[0])
+
+        self._set_arrays(src, dst, np.array(weights, dtype=float), index2, weights2, edge_weights2)
+
+    @classmethod
+    def from_arrays(cls, names, src, dst, weights1, index2, weights2, edge_weights2):
+        """
+        Builds a scorer from arrays maintained elsewhere (see sessions.py), without reading the graphs.
+
+        :param names: Names of the vertices of G1 with an edge, src and dst index into this list
+        :param src: Array of the first end vertices of the edges of G1, each unordered edge once
+        :param dst: Array of the second end vertices of the edges of G1
+        :param weights1: Array of the weights of the edges of G1
+        :param index2: Dictionary of the row of every vertex of G2 in weights2
+        :param weights2: Weight matrix of G2, only read
+        :param edge_weights2: Sequence of the edge weights of G2
+        """
+        scorer = cls.__new__(cls)
+        scorer.names = list(names)
+        scorer._set_arrays(src, dst, weights1, index2, weights2, edge_weights2)
+        return scorer
+
+    def _set_arrays(self, src, dst, weights1, index2, weights2, edge_weights2):
+        self.src = src
+        self.dst = dst
+        self.weights1 = weights1
+        self.num_edges = len(weights1)
+        self.index2 = index2
+        self.weights2 = weights2
+
+        # Upper bound of r_k over all mappings, |h_i - v_i| is at most the largest difference of any two weights
+        if self.num_edges and len(edge_weights2):
+            largest_difference = max(abs(self.weights1.max() - np.min(edge_weights2)),
+                                     abs(np.max(edge_weights2) - self.weights1.min()))
+            self.max_score = self.num_edges ** (1 / self.num_edges) * largest_difference
+        else:
+            self.max_score = 0.0
+
+    def __call__(self, mapping):
+        """
+        Computes r_k = (sum |h_i - v_i|^n)^(1/n) over the n edges of G1 for one isomorphism.
+
+        :param mapping: Dictionary mapping vertices of G1 to vertices of G2
+        :return: The dissimilarity r_k of the mapping
+        """
+        if self.num_edges == 0:
+            return 0.0
+        mapped = np.fromiter((self.index2[mapping[name]] for name in self.names), dtype=np.intp, count=len(self.names))
+        weights2 = self.weights2[mapped[self.src], mapped[self.dst]]
+        r_i = np.sum(np.abs(self.weights1 - weights2) ** self.num_edges)
+        return float(r_i ** (1 / self.num_edges))
+
+def compute_similarity(G1, G2, tnorm, compact=False, best=None):
     """
     Calculates the fuzzy similarity S(G1, G2) between two fuzzy graphs using isomorphism mappings 
     and a specified t-norm operator.
@@ -51,61 +133,103 @@ def compute_similarity(G1, G2, tnorm):
     3. The dissimilarity values are aggregated using the provided t-norm.
     4. The final similarity is defined as 1 minus the aggregated dissimilarity.
 
+    The isomorphisms are consumed lazily and folded into the aggregate one by one. The enumeration 
+    stops as soon as the aggregate reaches 0, which is absorbing for 'min', 'prod' and 'drast', 
+    and for 'luk' whenever no r_k can exceed 1.
+
+    With compact=True the isomorphisms are produced from the compact form (a base isomorphism and 
+    the automorphism group of G2, see automorphism.py) instead of the VF2 enumeration, in a different 
+    order. The 'luk' fold depends on the order of the isomorphisms once an r_k exceeds 1 (and on the 
+    rounding of the sums otherwise), so 'luk' is only computed in the VF2 order and is rejected with 
+    compact=True.
+
+    Where the isomorphism of least dissimilarity alone determines the result, it is found by the 
+    branch-and-bound search of best_mapping.py and the isomorphisms are not enumerated at all 
+    (see `bounded_similarity`).
+
     :param G1: First fuzzy graph (instance of Graph)
     :param G2: Second fuzzy graph (instance of Graph)
     :param tnorm: T-norm operator to use for aggregation ('min', 'prod', etc.)
+    :param compact: Iterate over the compact form of the isomorphisms
+    :param best: The result (mapping, r_k) of `best_mapping` for G1 and G2, if it was already computed
     :return: A float in [0, 1] representing the fuzzy similarity, or "X" if graphs are not isomorphic
+    :raises ValueError: If the t-norm is unknown, or for 'luk' with compact=True
     """
-    # Find all isomorphisms between G1 and G2
-    isomorphic, mappings = find_isomorphisms(G1, G2)
-    if not isomorphic:
-        return "X"  # If graphs are not isomorphic, return "X" to indicate that similarity cannot be computed
-
-    r_k_values = []  # Stores all computed r_k values for each isomorphism
-    num_edges = sum(len(vertex.neighbors) for vertex in G1.vertices.values()) // 2 # number of edges in G1
-     # Iterate through all found isomorphisms
-    for mapping in mappings:
-        r_i = 0  # Initialize the similarity measure for the current isomorphism
-        processed_edges = set() # Keep track of processed edges to avoid duplicates
+    if compact and tnorm == "luk":
+        raise ValueError("the 'luk' similarity depends on the order of the isomorphisms, "
+                         "it is only computed in the VF2 order")
+    scorer = MappingScorer(G1, G2)
+    similarity = bounded_similarity(G1, G2, scorer, tnorm, best)
+    if similarity is not None:
+        return similarity
+
+    if compact:
+        _, mappings = find_isomorphisms(G1, G2, compact=True)
+        mappings = mappings or []
+    else:
+        mappings = iter_isomorphisms(G1, G2)
+
+    return aggregate_similarity(mappings, scorer, tnorm)
+
+def bounded_similarity(G1, G2, scorer, tnorm, best=None):
+    """
+    Computes the similarity from the isomorphism of least dissimilarity, where it determines the result. 
+    With 'min' the aggregate is the smallest r_k (capped at 1). With the other t-norms the aggregate 
+    depends on every r_k, but a mapping with r_k = 0 makes it 0 whenever 0 is absorbing. Such a mapping 
+    exists exactly when the isomorphism of least dissimilarity has r_k = 0.
 
-        for vertex_name, vertex in G1.vertices.items():
-            # Get the mapped vertex in G2 according to the current isomorphism
-            mapped_vertex = G2.vertices[mapping[vertex_name]]
-            
+    :param G1: First fuzzy graph (instance of Graph)
+    :param G2: Second fuzzy graph (instance of Graph)
+    :param scorer: MappingScorer of G1 and G2
+    :param tnorm: T-norm operator to use for aggregation ('min', 'prod', etc.)
+    :param best: The result (mapping, r_k) of `best_mapping` for G1 and G2, it is searched if not given
+    :return: The similarity, "X" if the graphs are not isomorphic, or None if all isomorphisms have to be scored
+    :raises ValueError: If the t-norm is unknown
+    """
+    get_operators(tnorm)  # An unknown t-norm is an error, it must not take the shortcut of the other t-norms
+    if tnorm == "min":
+        mapping, score = best if best is not None else best_mapping(G1, G2, scorer)
+        return "X" if mapping is None else 1 - min(1, score)
+
+    if tnorm != "luk" or scorer.max_score <= 1:
+        if best is not None:
+            mapping, score = best
+            if mapping is None:
+                return "X"
+            return 1 - score if score == 0 else None
+        mapping, score = best_mapping(G1, G2, scorer, only_zero=True)
+        if mapping is not None:
+            return 1 - score
+    return None
+
+def aggregate_similarity(mappings, scorer, tnorm):
+    """
+    Folds the r_k values of the given isomorphisms into the similarity (steps 2-4 of compute_similarity).
+    With 'luk' the result depends on the order of the isomorphisms, which is the VF2 order everywhere.
 
-            # Iterate through all neighbors of the vertex in G1
-            for neighbor, weight in vertex.neighbors:
-                mapped_neighbor_name = mapping[neighbor]
-                
-                # Create an edge identifier (unordered) to ensure each edge is processed once
-                edge_id = tuple(sorted([vertex_name, neighbor]))  
-                if edge_id in processed_edges:
-                    continue  # Skip if this edge has already been processed
-
-                processed_edges.add(edge_id)
-
-                # Find the corresponding edge in G2 and get its weight
-                mapped_weight = None
-                for mapped_n, mapped_w in mapped_vertex.neighbors:
-                    if mapped_n == mapped_neighbor_name:
-                        mapped_weight = mapped_w
-                        break
-                
-                # ri += |hi - vi|^pow
-                if mapped_weight is not None:
-                    r_i += pow((abs(weight[0] - mapped_weight[0])), num_edges)
-                    
-
-        # Compute the n-th root of r_i
-        r_i = r_i ** (1/num_edges)
-
-        # Store the computed r_i for this isomorphism
-        r_k_values.append(r_i)
+    :param mappings: Iterable of isomorphisms from G1 to G2, consumed lazily
+    :param scorer: MappingScorer of G1 and G2
+    :param tnorm: T-norm operator to use for aggregation ('min', 'prod', etc.)
+    :return: A float in [0, 1] representing the fuzzy similarity, or "X" if there is no isomorphism
+    """
+    zero_absorbing = tnorm != "luk" or scorer.max_score <= 1
+    combine = get_operators(tnorm).tnorm # Resolve the t-norm once, not for every isomorphism
 
+    isomorphic = False
     r = 1 # Initialize r to 1, as it is the neutral element in t-norms
+    scored = 0
+
+    # Iterate through the isomorphisms as they are found and apply t-norm to their r_k values
+    with metrics.timer('similarity'):
+        for mapping in mappings:
+            isomorphic = True
+            scored += 1
+            r = combine(r, scorer(mapping))
+            if r == 0 and zero_absorbing:
+                break  # 0 is absorbing, no further isomorphism can change the result
+    metrics.count('scored_mappings', scored)
 
-    # Apply t-norm to all r_k values
-    for r_k in r_k_values:
-        r = t_norm(r, r_k, tnorm)
+    if not isomorphic:
+        return "X"  # If graphs are not isomorphic, return "X" to indicate that similarity cannot be computed
 
-    return 1 - r # The final similarity measure is 1 minus the computed value
\ No newline at end of file
+    return 1 - r # The final similarity measure is 1 minus the computed value
@@ -0,0 +1,107 @@
+"""
+File:           tnorms.py
+
+Description:    This module is the single registry of the fuzzy logic operators used by the
+                twin-width search and the similarity computation. A t-norm name ('min', 'prod',
+                'luk', 'drast') is resolved once into an `Operators` object, which provides the
+                t-norm, its dual t-conorm and the red edge merge formula both for scalars and
+                batched over NumPy arrays, so a whole neighbor row is merged in one call.
+                tests/test_tnorms.py checks all of them against the original formulas.
+"""
+
+import numpy as np
+
+
+# Scalar operators
+
+def drastic_tnorm(u, v):
+    if u == 1:
+        return v
+    elif v == 1:
+        return u
+    else:
+        return 0
+
+def drastic_tconorm(u, v):
+    if u == 0:
+        return v
+    elif v == 0:
+        return u
+    else:
+        return 1
+
+
+# Batched operators, applied elementwise to NumPy arrays
+
+def batch_drastic_tnorm(u, v):
+    return np.where(u == 1, v, np.where(v == 1, u, 0.0))
+
+def batch_drastic_tconorm(u, v):
+    return np.where(u == 0, v, np.where(v == 0, u, 1.0))
+
+
+class Operators:
+    """
+    T-norm, t-conorm and red edge merge of one fuzzy logic.
+
+    When two vertices are merged, the total (black) weight of an edge to a common neighbor is the
+    t-conorm of both weights and its pure black part is the t-norm of their pure black parts
+    (black - red), so the red weight is the difference of the two.
+    """
+
+    def __init__(self, name, tnorm, tconorm, batch_tnorm, batch_tconorm):
+        """
+        :param name: Name of the t-norm
+        :param tnorm: Scalar t-norm function of two values
+        :param tconorm: Scalar t-conorm function of two values
+        :param batch_tnorm: T-norm of two NumPy arrays
+        :param batch_tconorm: T-conorm of two NumPy arrays
+        """
+        self.name = name
+        self.tnorm = tnorm
+        self.tconorm = tconorm
+        self.batch_tnorm = batch_tnorm
+        self.batch_tconorm = batch_tconorm
+
+    def __reduce__(self):
+        # Pickled by name, the operator functions are not picklable
+        return get_operators, (self.name,)
+
+    def red_merge(self, u_black, u_red, v_black, v_red):
+        """
+        Returns the red weight of the edge created by merging the edges (u_black, u_red) and (v_black, v_red).
+        """
+        return self.tconorm(u_black, v_black) - self.tnorm(u_black - u_red, v_black - v_red)
+
+    def merge_rows(self, black_u, red_u, black_v, red_v):
+        """
+        Merges two whole rows of black and red edge weights.
+
+        :return: A tuple (black row, red row) of the merged vertex
+        """
+        black = self.batch_tconorm(black_u, black_v)
+        return black, black - self.batch_tnorm(black_u - red_u, black_v - red_v)
+
+
+# T-norm name -> Operators
+OPERATORS = {
+    'min': Operators('min', min, max, np.minimum, np.maximum),
+    'prod': Operators('prod', lambda u, v: u * v, lambda u, v: u + v - u * v,
+                      lambda u, v: u * v, lambda u, v: u + v - u * v),
+    'luk': Operators('luk', lambda u, v: max(u + v - 1, 0), lambda u, v: min(u + v, 1),
+                     lambda u, v: np.maximum(0, u + v - 1), lambda u, v: np.minimum(u + v, 1)),
+    'drast': Operators('drast', drastic_tnorm, drastic_tconorm, batch_drastic_tnorm, batch_drastic_tconorm),
+}
+
+
+def get_operators(tnorm):
+    """
+    Returns the Operators of the given t-norm name.
+
+    :raises ValueError: If the t-norm is unknown
+    """
+    try:
+        return OPERATORS[tnorm]
+    except (KeyError, TypeError):
+        raise ValueError(f"Unknown t-norm: {tnorm}") from None
+
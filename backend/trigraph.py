@@ -0,0 +1,196 @@
+"""
+File:           trigraph.py
+
+Description:    This module implements a compact array-backed representation of a fuzzy
+                trigraph used by the twin-width search. Vertices are identified by integer
+                ids and the total (black) and red edge weights are stored in dense NumPy
+                matrices, so a contraction is a vectorized combination of two rows and can
+                be undone in place, without copying the whole graph.
+
+                The object-oriented `Graph`/`Vertex` API of TWBackend.py is converted to
+                and from this representation.
+"""
+
+from bisect import insort
+import numpy as np
+from backend.tnorms import get_operators
+
+
+def merged_vertex_name(u, v):
+    """
+    Returns the name of the vertex created by merging the vertices u and v.
+    The names of both vertices are kept whole, so different merges never produce the same name.
+    """
+    return f'{u}+{v}'
+
+
+def name_sequence(names, sequence):
+    """
+    Translates a contraction sequence of id pairs into pairs of vertex names, as they would be
+    named at the time of each contraction, the id of a vertex is its position in `names`.
+    """
+    names = list(names)
+    named = []
+    for i, j in sequence:
+        named.append((names[i], names[j]))
+        names[i] = merged_vertex_name(names[i], names[j])
+    return named
+
+
+def translate_sequence(sequence, ids):
+    """
+    Translates a contraction sequence of id pairs through the vertex id mapping `ids`.
+    Every pair is ordered as the search orders it, with the merged vertex keeping the lower id.
+    """
+    ids = list(ids)
+    translated = []
+    for i, j in sequence:
+        low, high = sorted((ids[i], ids[j]))
+        translated.append((low, high))
+        ids[i] = low
+    return translated
+
+
+class Trigraph:
+    """
+    Fuzzy trigraph with integer vertex ids and dense black/red weight matrices.
+
+    The black matrix holds the total membership of an edge and the red matrix its red part,
+    the same pair of values `Vertex.neighbors` stores as (black, red). Contracting the vertices
+    i and j keeps the id i for the merged vertex and clears the row and column of j, so the
+    maximum red degree is always a single row-sum over the whole matrix.
+    """
+
+    def __init__(self, names, membership, black, red, tnorm):
+        """
+        :param names: List of vertex names, the position in the list is the vertex id
+        :param membership: Array of vertex membership values
+        :param black: Symmetric matrix of total edge weights
+        :param red: Symmetric matrix of red edge weights
+        :param tnorm: T-norm used for merging ('min', 'prod', 'luk', 'drast')
+        """
+        self.tnorm = tnorm
+        self.operators = get_operators(tnorm)
+        self.initial_names = list(names)
+        self.names = list(names)
+        self.membership = np.asarray(membership, dtype=float).copy()
+        self.black = np.asarray(black, dtype=float).copy()
+        self.red = np.asarray(red, dtype=float).copy()
+        self.vertices = list(range(len(self.names)))  # ids of the vertices which were not merged away
+        self.parts = [1 << i for i in range(len(self.names))]  # original vertices contained in each vertex
+
+    @classmethod
+    def from_graph(cls, graph, tnorm):
+        """
+        Builds a trigraph from a Graph object.
+        """
+        names = list(graph.vertices.keys())
+        index = {name: i for i, name in enumerate(names)}
+        n = len(names)
+        black = np.zeros((n, n))
+        red = np.zeros((n, n))
+        membership = np.zeros(n)
+        for i, name in enumerate(names):
+            vertex = graph.vertices[name]
+            membership[i] = vertex.membershipFunction
+            for neighbor, weight in vertex.neighbors:
+                if neighbor in index:
+                    black[i, index[neighbor]] = weight[0]
+                    red[i, index[neighbor]] = weight[1]
+        return cls(names, membership, black, red, tnorm)
+
+    def to_graph(self):
+        """
+        Converts the current state of the trigraph back to a Graph object.
+        """
+        from backend.TWBackend import Graph, Vertex
+
+        graph = Graph()
+        for i in self.vertices:
+            graph.add_vertex(Vertex(self.names[i], float(self.membership[i])))
+        for i in self.vertices:
+            for j in self.vertices:
+                if j != i and (self.black[i, j] != 0 or self.red[i, j] != 0):
+                    graph.vertices[self.names[i]].neighbors.append(
+                        (self.names[j], (float(self.black[i, j]), float(self.red[i, j]))))
+        return graph
+
+    def order(self):
+        """
+        Returns the number of vertices which were not merged away.
+        """
+        return len(self.vertices)
+
+    def state_key(self):
+        """
+        Returns a hashable key of the current partition of the original vertices.
+        The contracted trigraph depends only on this partition, not on the order of the merges.
+        """
+        return tuple(self.parts[i] for i in self.vertices)
+
+    def contract(self, i, j):
+        """
+        Merges the vertex j into the vertex i and returns the record needed by `undo`.
+        """
+        black, red = self.black, self.red
+        record = (i, j, black[i].copy(), red[i].copy(), black[j].copy(), red[j].copy(),
+                  self.membership[i], self.names[i], self.parts[i])
+
+        # Total weight is the t-conorm of both rows, the pure black part is the t-norm of their black parts
+        new_black, new_red = self.operators.merge_rows(black[i], red[i], black[j], red[j])
+        new_black[[i, j]] = 0
+        new_red[[i, j]] = 0
+
+        black[i, :] = new_black
+        black[:, i] = new_black
+        red[i, :] = new_red
+        red[:, i] = new_red
+        black[j, :] = 0
+        black[:, j] = 0
+        red[j, :] = 0
+        red[:, j] = 0
+
+        self.membership[i] = self.operators.tconorm(float(self.membership[i]), float(self.membership[j]))
+        self.names[i] = merged_vertex_name(self.names[i], self.names[j])
+        self.parts[i] |= self.parts[j]
+        self.vertices.remove(j)
+        return record
+
+    def undo(self, record):
+        """
+        Reverts the contraction described by the record returned from `contract`.
+        """
+        i, j, black_i, red_i, black_j, red_j, membership_i, name_i, part_i = record
+        self.black[i, :] = black_i
+        self.black[:, i] = black_i
+        self.red[i, :] = red_i
+        self.red[:, i] = red_i
+        self.black[j, :] = black_j
+        self.black[:, j] = black_j
+        self.red[j, :] = red_j
+        self.red[:, j] = red_j
+        self.membership[i] = membership_i
+        self.names[i] = name_i
+        self.parts[i] = part_i
+        insort(self.vertices, j)
+
+    def red_degrees(self):
+        """
+        Returns the red degree of every vertex id (merged away vertices have 0).
+        """
+        return self.red.sum(axis=1)
+
+    def max_red_degree(self):
+        """
+        Returns the maximum red (error) degree of the trigraph.
+        """
+        if not self.vertices:
+            return 0
+        return float(self.red_degrees().max())
+
+    def sequence_names(self, sequence):
+        """
+        Translates a contraction sequence of id pairs into pairs of vertex names,
+        as they would be named at the time of each contraction.
+        """
+        return name_sequence(self.initial_names, sequence)
@@ -0,0 +1,156 @@
+"""
+File:           tw_heuristics.py
+
+Description:    This module implements fast heuristics for the (fuzzy) twin-width, used when
+                an answer is needed in milliseconds instead of the exact search: the greedy
+                minimum red degree contraction, a beam search and randomized greedy restarts.
+                Every heuristic returns an upper bound together with the sequence achieving
+                it, and a cheap lower bound is derived from the first contraction level.
+"""
+
+import random
+from itertools import combinations
+from backend import metrics
+
+infinity = float('inf')
+
+HEURISTIC_MODES = ('greedy', 'beam', 'random')
+
+
+def ordered_merges(trigraph):
+    """
+    Returns all possible merges of the trigraph as tuples (maximum red degree, i, j), sorted by
+    the maximum red degree they create, so the most promising merges come first.
+    """
+    merges = []
+    for i, j in list(combinations(trigraph.vertices, 2)):
+        undo = trigraph.contract(i, j)
+        merges.append((trigraph.max_red_degree(), i, j))
+        trigraph.undo(undo)
+    merges.sort(key=lambda merge: merge[0])
+    return merges
+
+
+def greedy_sequence(trigraph, rng=None, choices=1):
+    """
+    Greedy contraction sequence, in every step the pair creating the lowest maximum red degree
+    is merged. With a random generator, one of the `choices` best pairs is picked at random.
+    The trigraph is restored afterwards.
+
+    :return: A tuple (width, sequence of id pairs), the width is an upper bound of the twin-width
+    """
+    if trigraph.order() == 0:
+        return infinity, []
+
+    width = 0
+    sequence = []
+    undos = []
+    while trigraph.order() > 1:
+        merges = ordered_merges(trigraph)
+        degree, i, j = merges[0] if rng is None else rng.choice(merges[:choices])
+        undos.append(trigraph.contract(i, j))
+        width = max(width, degree)
+        sequence.append((i, j))
+    for undo in reversed(undos):
+        trigraph.undo(undo)
+    return width, sequence
+
+
+def sequence_width(trigraph, sequence):
+    """
+    Returns the width of the given contraction sequence of id pairs, the maximum red degree
+    over all its steps. The trigraph is restored afterwards.
+    """
+    width = 0
+    undos = []
+    for i, j in sequence:
+        undos.append(trigraph.contract(i, j))
+        width = max(width, trigraph.max_red_degree())
+    for undo in reversed(undos):
+        trigraph.undo(undo)
+    return width
+
+
+def random_restarts(trigraph, restarts=16, choices=3, seed=None):
+    """
+    Runs the deterministic greedy sequence and `restarts` randomized ones, keeping the best.
+
+    :return: A tuple (width, sequence of id pairs)
+    """
+    best = greedy_sequence(trigraph)
+    rng = random.Random(seed)
+    for _ in range(restarts):
+        width, sequence = greedy_sequence(trigraph, rng, choices)
+        if width < best[0]:
+            best = (width, sequence)
+    return best
+
+
+def beam_search(trigraph, beam_width=8):
+    """
+    Beam search over the contraction sequences. On every level only the `beam_width` best states
+    are kept, ranked by their width so far and then by the red degree of the current state.
+    States reached by different orders of the same merges are kept only once.
+
+    :return: A tuple (width, sequence of id pairs)
+    """
+    if trigraph.order() == 0:
+        return infinity, []
+
+    beam = [(0, 0, [])]
+    for _ in range(trigraph.order() - 1):
+        candidates = {}
+        for width, _, sequence in beam:
+            undos = [trigraph.contract(i, j) for i, j in sequence]
+            for i, j in list(combinations(trigraph.vertices, 2)):
+                undo = trigraph.contract(i, j)
+                key = trigraph.state_key()
+                degrees = trigraph.red_degrees()
+                candidate = (max(width, float(degrees.max())), float(degrees.sum()), sequence + [(i, j)])
+                if key not in candidates or candidate[:2] < candidates[key][:2]:
+                    candidates[key] = candidate
+                trigraph.undo(undo)
+            for undo in reversed(undos):
+                trigraph.undo(undo)
+        beam = sorted(candidates.values(), key=lambda candidate: candidate[:2])[:beam_width]
+    width, _, sequence = beam[0]
+    return width, sequence
+
+
+def lower_bound(trigraph):
+    """
+    Cheap lower bound of the twin-width: every contraction sequence starts with one of the
+    possible merges, so its width is at least the lowest maximum red degree a first merge creates.
+    """
+    if trigraph.order() <= 1:
+        return 0 if trigraph.order() == 1 else infinity
+    return ordered_merges(trigraph)[0][0]
+
+
+def approximate_twin_width(trigraph, mode='greedy', beam_width=8, restarts=16, seed=None):
+    """
+    Computes an upper and a lower bound of the twin-width with one of the heuristics.
+
+    :param trigraph: Trigraph to contract
+    :param mode: 'greedy', 'beam' or 'random'
+    :param beam_width: Number of states kept on each level of the beam search
+    :param restarts: Number of randomized greedy runs
+    :param seed: Seed of the randomized greedy runs
+    :return: A tuple (upper bound, lower bound, sequence of vertex names achieving the upper bound)
+    :raises ValueError: If the mode is unknown, beam_width is not positive or restarts is negative
+    """
+    if beam_width < 1:
+        raise ValueError(f"Invalid beam width: {beam_width}")
+    if restarts < 0:
+        raise ValueError(f"Invalid number of restarts: {restarts}")
+    with metrics.timer('tw_estimate'):
+        if mode == 'beam':
+            width, sequence = beam_search(trigraph, beam_width)
+        elif mode == 'random':
+            width, sequence = random_restarts(trigraph, restarts, seed=seed)
+        elif mode == 'greedy':
+            width, sequence = greedy_sequence(trigraph)
+        else:
+            raise ValueError(f"Unknown heuristic: {mode}")
+        lower = lower_bound(trigraph)
+    return width, min(width, lower), trigraph.sequence_names(sequence)
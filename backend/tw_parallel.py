@@ -0,0 +1,143 @@
+"""
+File:           tw_parallel.py
+
+Description:    This module runs the branch-and-bound twin-width search on a pool of
+                processes. The search tree is split at its first one or two contraction
+                levels into work units, every worker searches its units from the contracted
+                prefix and all workers prune with a best bound shared through a
+                `multiprocessing.Value`. The results of the units are merged into the same
+                (tw, sequences) output as the single-process search.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from backend.tw_search import TwinWidthSearch, infinity
+from backend.sequence_set import SequenceSet
+
+
+class SharedBound:
+    """
+    Best width found so far, shared between processes.
+    """
+
+    def __init__(self, width=infinity, value=None):
+        self.value = value if value is not None else multiprocessing.Value('d', width)
+
+    def get(self):
+        return self.value.value
+
+    def offer(self, width):
+        """
+        Lowers the bound if the given width is better.
+        """
+        with self.value.get_lock():
+            if width < self.value.value:
+                self.value.value = width
+
+
+# State of a worker process, set by `_init_worker`
+_worker_trigraph = None
+_worker_bound = None
+_worker_all_sequences = True
+
+
+def _init_worker(trigraph, bound_value, all_sequences):
+    global _worker_trigraph, _worker_bound, _worker_all_sequences
+    _worker_trigraph = trigraph
+    _worker_bound = SharedBound(value=bound_value)
+    _worker_all_sequences = all_sequences
+
+
+def _search_unit(prefix):
+    """
+    Searches the subtree below the given prefix of contractions.
+    Returns the best width found in the subtree, the sequences reaching it and the number of expanded states.
+    """
+    trigraph = _worker_trigraph
+    search = TwinWidthSearch(trigraph, _worker_all_sequences, _worker_bound)
+
+    undos = []
+    max_degree = 0
+    node = search.sequences.root
+    for i, j in prefix:
+        undos.append(trigraph.contract(i, j))
+        max_degree = max(max_degree, trigraph.max_red_degree())
+        node = node.extend(i, j)
+
+    bound = search.bound()
+    if max_degree < bound or (max_degree == bound and _worker_all_sequences):
+        search.merge_pruned_sequences(max_degree, node)
+
+    for undo in reversed(undos):
+        trigraph.undo(undo)
+    return search.width, search.sequences, search.nodes
+
+
+def split_work(search, depth, bound):
+    """
+    Returns the prefixes of the first `depth` contraction levels which can still reach the bound,
+    ordered so that the most promising prefixes come first.
+
+    :param search: TwinWidthSearch over the trigraph to split
+    :param depth: Number of contraction levels covered by a prefix (1 or 2)
+    :param bound: Width a prefix must not exceed to be kept
+    """
+    trigraph = search.trigraph
+    units = []
+
+    def expand(prefix, max_degree):
+        if len(prefix) == depth or trigraph.order() == 1:
+            units.append((max_degree, prefix))
+            return
+        for degree, i, j in search.ordered_merges():
+            new_max_degree = max(max_degree, degree)
+            if new_max_degree > bound:
+                break
+            undo = trigraph.contract(i, j)
+            expand(prefix + ((i, j),), new_max_degree)
+            trigraph.undo(undo)
+
+    expand((), 0)
+    units.sort(key=lambda unit: unit[0])
+    return [prefix for _, prefix in units]
+
+
+def parallel_twin_width(trigraph, all_sequences=True, workers=None, depth=1):
+    """
+    Computes the twin-width of a trigraph with the branch-and-bound search on a process pool.
+
+    :param trigraph: Trigraph to search
+    :param all_sequences: Collect all optimal sequences, or only one optimal sequence
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :param depth: Number of contraction levels the search tree is split at (1 or 2)
+    :return: TwinWidthSearch holding the merged width and sequences
+    """
+    search = TwinWidthSearch(trigraph, all_sequences)
+    if trigraph.order() <= 2:
+        return search.run('prune')
+
+    workers = workers or os.cpu_count() or 1
+    greedy_width, greedy_sequence = search.greedy()
+    bound = SharedBound(greedy_width)
+    units = split_work(search, depth, greedy_width)
+
+    # In the single sequence mode the workers only report strictly better sequences,
+    # so the greedy one is kept in case it is already optimal
+    if not all_sequences:
+        search.width, search.sequences = greedy_width, SequenceSet.from_sequences([greedy_sequence])
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(trigraph, bound.value, all_sequences)) as executor:
+        for width, sequences, nodes in executor.map(_search_unit, units):
+            search.nodes += nodes
+            if not sequences:
+                continue
+            if width < search.width:
+                search.width = width
+                search.sequences = sequences if all_sequences else SequenceSet.from_sequences(sequences[:1])
+            elif width == search.width and all_sequences:
+                search.sequences.extend(sequences)
+    search.complete = True
+    search.report()
+    return search
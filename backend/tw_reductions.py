@@ -0,0 +1,148 @@
+"""
+File:           tw_reductions.py
+
+Description:    This module implements exact reduction rules applied before the twin-width
+                search. Two vertices whose contraction creates no red weight are zero-error
+                twins: the contraction leaves the rest of the trigraph as it was without one
+                of them, so they are contracted up front. The remaining trigraph is split
+                into its connected components, each one is searched on its own, and the
+                width is the maximum over the components, as merging the single vertices
+                left of the components creates no red edges.
+
+                Fuzzy red weights only grow when a part gains a vertex (the t-conorm of a
+                part's weights grows and the t-norm shrinks), so removing a vertex never
+                increases the width and neither rule changes the twin-width. The reduced
+                search returns one optimal sequence: the twin contractions first, then the
+                components one after another. The optimal sequences which interleave the
+                components or merge across them are not of this form, so the reduction is
+                not used to list all optimal sequences.
+"""
+
+import numpy as np
+from backend.trigraph import Trigraph
+from backend.tw_search import TwinWidthSearch, default_memo_size
+from backend.sequence_set import SequenceSet
+
+
+def contract_twins(trigraph):
+    """
+    Contracts zero-error twins in place until none is left.
+
+    :return: A tuple (list of contracted id pairs, their undo records, maximum red degree after any of the contractions)
+    """
+    operators = trigraph.operators
+    pairs = []
+    records = []
+    width = 0
+    found = True
+    while found:
+        found = False
+        vertices = trigraph.vertices
+        for a, i in enumerate(vertices):
+            for j in vertices[a + 1:]:
+                _, red = operators.merge_rows(trigraph.black[i], trigraph.red[i], trigraph.black[j], trigraph.red[j])
+                red[[i, j]] = 0
+                if np.any(red[vertices] != 0):
+                    continue
+                records.append(trigraph.contract(i, j))
+                pairs.append((i, j))
+                width = max(width, trigraph.max_red_degree())
+                found = True
+                break
+            if found:
+                break
+    return pairs, records, width
+
+
+def components(trigraph):
+    """
+    Returns the connected components of the trigraph (edges with a black or red weight)
+    as sorted lists of vertex ids, ordered by their lowest id.
+    """
+    adjacency = (trigraph.black != 0) | (trigraph.red != 0)
+    unvisited = set(trigraph.vertices)
+    result = []
+    for start in trigraph.vertices:
+        if start not in unvisited:
+            continue
+        unvisited.discard(start)
+        component = [start]
+        stack = [start]
+        while stack:
+            v = stack.pop()
+            for u in np.flatnonzero(adjacency[v]):
+                u = int(u)
+                if u in unvisited:
+                    unvisited.discard(u)
+                    component.append(u)
+                    stack.append(u)
+        result.append(sorted(component))
+    return result
+
+
+def sub_trigraph(trigraph, ids):
+    """
+    Returns the trigraph induced by the given sorted vertex ids, the local id k is ids[k].
+    """
+    index = np.array(ids)
+    return Trigraph([trigraph.names[i] for i in ids], trigraph.membership[index],
+                    trigraph.black[np.ix_(index, index)], trigraph.red[np.ix_(index, index)], trigraph.tnorm)
+
+
+def part_names(trigraph, i):
+    """
+    Returns the names of the original vertices merged into the vertex i.
+    """
+    return [name for k, name in enumerate(trigraph.initial_names) if trigraph.parts[i] >> k & 1]
+
+
+def reduced_search(trigraph, method='exhaustive', budget=None, memo_size=default_memo_size):
+    """
+    Computes the twin-width and one optimal sequence of a trigraph with the reduction rules,
+    searching every component with the given method of TwinWidthSearch. One budget limits
+    the whole computation: its clock starts once and the components share its state count.
+
+    :return: TwinWidthSearch over the whole trigraph (with all_sequences False) holding the width,
+             one sequence of id pairs, the total number of expanded states and the list of applied
+             reductions in `reductions`
+    """
+    search = TwinWidthSearch(trigraph, all_sequences=False, budget=budget)
+    search.complete = True
+    if trigraph.order() == 0:
+        return search
+    if budget is not None:
+        budget.start()
+
+    twins, records, width = contract_twins(trigraph)
+    if twins:
+        search.reductions.append({'rule': 'twins', 'pairs': trigraph.sequence_names(twins)})
+
+    parts = components(trigraph)
+    if len(parts) > 1:
+        search.reductions.append({'rule': 'components',
+                                  'components': [[name for i in ids for name in part_names(trigraph, i)]
+                                                 for ids in parts]})
+
+    # An optimal sequence of every component, in global ids
+    sequence = list(twins)
+    for ids in parts:
+        if len(ids) == 1:
+            continue
+        component = TwinWidthSearch(sub_trigraph(trigraph, ids), all_sequences=False, budget=budget)
+        component.nodes = search.nodes  # the budget counts the states of all components together
+        component.run(method, memo_size)
+        search.nodes = component.nodes
+        search.complete = search.complete and component.complete
+        width = max(width, component.width)
+        sequence.extend((ids[i], ids[j]) for i, j in component.sequences[0])
+
+    # Every component ends in its lowest id, merging these vertices creates no red edges
+    survivors = [ids[0] for ids in parts]
+    sequence.extend((survivors[0], survivor) for survivor in survivors[1:])
+
+    search.width = width
+    search.sequences = SequenceSet.from_sequences([sequence])
+
+    for record in reversed(records):
+        trigraph.undo(record)
+    return search
@@ -0,0 +1,469 @@
+"""
+File:           tw_search.py
+
+Description:    This module implements the exact (fuzzy) twin-width search over the
+                array-backed `Trigraph`. Every branch of the search contracts a pair of
+                vertices in place and undoes the contraction when backtracking, so no graph
+                is copied. The search state is kept in a `TwinWidthSearch` object, which
+                provides the exhaustive, the memoized and the branch-and-bound variant,
+                so several searches can run concurrently in one process. A search can be
+                limited by a `SearchBudget` and then returns the best result found so far.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from itertools import combinations, islice
+import networkx as nx
+from backend.tw_heuristics import ordered_merges, greedy_sequence, sequence_width
+from backend.automorphism import AutomorphismGroup, pair_orbits
+from backend.trigraph import translate_sequence
+from backend.sequence_set import SequenceNode, SequenceSet
+from backend import metrics
+
+infinity = float('inf')
+
+# Default number of states kept in the transposition table of the memoized search
+default_memo_size = 100000
+
+
+class TranspositionTable:
+    """
+    Bounded table of already solved states of the memoized search.
+
+    The key of a state is the partition of the original vertices into the merged vertices,
+    which determines the contracted trigraph regardless of the order of the merges. The value
+    is the lowest width with which the state can be contracted into a single vertex. The least
+    recently used states are dropped when the table is full.
+    """
+
+    def __init__(self, max_size=default_memo_size):
+        self.max_size = max_size
+        self.states = OrderedDict()
+
+    def get(self, key):
+        if key not in self.states:
+            return None
+        self.states.move_to_end(key)
+        return self.states[key]
+
+    def put(self, key, width):
+        self.states[key] = width
+        self.states.move_to_end(key)
+        if len(self.states) > self.max_size:
+            self.states.popitem(last=False)
+
+
+class SearchInterrupted(Exception):
+    """
+    Raised inside the search when its budget is exhausted or it was cancelled.
+    """
+
+
+class SearchBudget:
+    """
+    Limits of a search: wall-clock time, number of expanded states and cancellation.
+    The clock starts with the first call of `start`, or with the first check if `start` was
+    not called, so a budget shared by several searches (see tw_reductions.py) limits them together.
+    """
+
+    def __init__(self, seconds=None, max_nodes=None):
+        """
+        :param seconds: Wall-clock limit in seconds, or None for no limit
+        :param max_nodes: Limit of expanded states (contractions), or None for no limit
+        """
+        self.seconds = seconds
+        self.max_nodes = max_nodes
+        self.deadline = None
+        self.cancelled = threading.Event()
+
+    def start(self):
+        if self.seconds is not None and self.deadline is None:
+            self.deadline = time.monotonic() + self.seconds
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def exhausted(self, nodes):
+        """
+        Checks the limits after the given number of expanded states.
+        """
+        if self.cancelled.is_set():
+            return True
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            return True
+        if self.seconds is not None and nodes % 64 == 0:
+            if self.deadline is None:
+                self.start()
+            return time.monotonic() > self.deadline
+        return False
+
+
+class TwinWidthSearch:
+    """
+    State of one twin-width search over a trigraph.
+
+    Sequences are (i, j) vertex id pairs, which are translated to vertex names only in `result`.
+    The optimal sequences are kept in a SequenceSet sharing their common prefixes. The searches
+    extend persistent linked prefixes instead of copying a list at every level, and the memoized
+    search stores them as a DAG of states, so their number is known without listing them.
+    """
+
+    def __init__(self, trigraph, all_sequences=True, shared_bound=None, budget=None):
+        """
+        :param trigraph: Trigraph to search, it is contracted in place and restored afterwards
+        :param all_sequences: Collect all optimal sequences, or stop at the first optimal one
+        :param shared_bound: Optional bound shared with other searches (see tw_parallel.py),
+                             used by the branch-and-bound search for pruning
+        :param budget: Optional SearchBudget limiting the search
+        """
+        self.trigraph = trigraph
+        self.all_sequences = all_sequences
+        self.shared_bound = shared_bound
+        self.budget = budget
+        self.width = infinity
+        self.sequences = SequenceSet()
+        self.table = None
+        self.nodes = 0  # number of expanded states
+        self.complete = False  # whether the result is proven optimal
+        self.path = []  # undo records of the contractions of the current branch
+        self.reductions = []  # reduction rules applied before the search (see tw_reductions.py)
+
+    def run(self, method='exhaustive', memo_size=default_memo_size, seed=None):
+        """
+        Runs the search with the given method ('exhaustive', 'memo', 'prune' or 'symmetric').
+        If the budget runs out, the trigraph is restored and the best result found so far
+        is kept, the greedy sequence is used when it is better or nothing was found yet.
+        The branch-and-bound search starts from the seed sequence of id pairs, if given
+        and better than the greedy one (e.g. the optimal sequence of a slightly different graph).
+        """
+        if self.budget is not None:
+            self.budget.start()
+        with metrics.timer('tw_search'):
+            try:
+                if method == 'memo':
+                    self.memoized(memo_size)
+                elif method == 'prune':
+                    self.pruned(seed)
+                elif method == 'symmetric':
+                    self.symmetric()
+                else:
+                    self.exhaustive()
+                self.complete = True
+            except SearchInterrupted:
+                while self.path:
+                    self.backtrack()
+                width, sequence = self.greedy()
+                if not self.sequences or width < self.width:
+                    self.width, self.sequences = width, SequenceSet.from_sequences([sequence])
+                metrics.count('tw_interrupted')
+        self.report()
+        return self
+
+    def report(self):
+        """
+        Adds the statistics of the finished search to the instrumentation counters.
+        """
+        metrics.count('tw_searches')
+        metrics.count('tw_states', self.nodes)
+        metrics.count('tw_sequences', self.sequences.count)
+        if self.table is not None:
+            metrics.count('tw_memo_states', len(self.table.states))
+
+    def contract(self, i, j):
+        """
+        Expands a state of the search by contracting the pair i, j, checking the budget first.
+        """
+        self.nodes += 1
+        if self.budget is not None and self.budget.exhausted(self.nodes):
+            raise SearchInterrupted()
+        self.path.append(self.trigraph.contract(i, j))
+
+    def backtrack(self):
+        """
+        Undoes the last contraction of the current branch.
+        """
+        self.trigraph.undo(self.path.pop())
+
+    def result(self):
+        """
+        Returns the twin-width and the optimal sequences in terms of vertex names.
+        """
+        return self.width, [self.trigraph.sequence_names(sequence) for sequence in self.sequences]
+
+    def pairs(self):
+        """
+        Returns all pairs of vertices which can be merged in the current state.
+        """
+        return list(combinations(self.trigraph.vertices, 2))
+
+    def record(self, width, sequence):
+        """
+        Records a complete contraction sequence of the given width, given as its last prefix node.
+        """
+        if width < self.width:
+            self.width = width
+            self.sequences.clear()
+            self.sequences.add(sequence)
+        elif width == self.width and (self.all_sequences or not self.sequences):
+            self.sequences.add(sequence)
+
+    # Exhaustive search
+
+    def exhaustive(self):
+        """
+        Walks every contraction sequence, the original behavior of the twin-width computation.
+        """
+        self.merge_all_sequences(0, self.sequences.root)
+
+    def merge_all_sequences(self, max_degree, sequence):
+        trigraph = self.trigraph
+        if trigraph.order() <= 1:
+            if trigraph.order() == 1:
+                self.record(max_degree, sequence)
+            return
+
+        for i, j in self.pairs():
+            self.contract(i, j)
+            self.merge_all_sequences(max(max_degree, trigraph.max_red_degree()), sequence.extend(i, j))
+            self.backtrack()
+
+    # Memoized search
+
+    def memoized(self, memo_size=default_memo_size):
+        """
+        Computes the width with a transposition table, then collects the sequences which
+        reach it, descending only into the states that can still be finished within the width.
+        """
+        if self.trigraph.order() == 0:
+            return
+        self.solve_width(memo_size)
+        if self.all_sequences:
+            self.sequences = self.optimal_sequences()
+            return
+        sequences = self.iter_sequences()
+        self.sequences.extend(islice(sequences, 1))
+        sequences.close()
+
+    def solve_width(self, memo_size=default_memo_size):
+        """
+        Computes only the twin-width with a fresh transposition table, the sequences
+        reaching it can then be produced by `iter_sequences`.
+        """
+        self.table = TranspositionTable(memo_size)
+        self.width = self.remaining_width() if self.trigraph.order() > 0 else infinity
+        return self.width
+
+    def remaining_width(self):
+        """
+        Returns the lowest width with which the current state can be merged into a single vertex.
+        """
+        trigraph = self.trigraph
+        if trigraph.order() == 1:
+            return 0
+
+        key = trigraph.state_key()
+        width = self.table.get(key)
+        if width is not None:
+            return width
+
+        width = infinity
+        for i, j in self.pairs():
+            self.contract(i, j)
+            degree = trigraph.max_red_degree()
+            if degree < width:
+                width = min(width, max(degree, self.remaining_width()))
+            self.backtrack()
+
+        self.table.put(key, width)
+        return width
+
+    def optimal_sequences(self):
+        """
+        Returns the sequences reaching the width computed by `solve_width` as a DAG of the states
+        which can still be finished within the width. A state reached by several orders of merges
+        is visited and stored once, so the work and the memory grow with the number of these
+        states and not with the number of sequences.
+        """
+        trigraph = self.trigraph
+        children = {}  # state key -> list of the nodes of the steps leaving the state
+
+        def visit(node):
+            # The node of the step reaching the current state shares the children of the state
+            key = trigraph.state_key()
+            node.terminal = trigraph.order() == 1
+            if key not in children:
+                children[key] = []
+                for i, j in self.pairs():
+                    self.contract(i, j)
+                    if trigraph.max_red_degree() <= self.width and self.remaining_width() <= self.width:
+                        children[key].append(visit(SequenceNode(i=i, j=j)))
+                    self.backtrack()
+            node.children = children[key]
+            node.count = node.terminal + sum(child.count for child in node.children)
+            return node
+
+        return SequenceSet(visit(SequenceNode()))
+
+    def iter_sequences(self):
+        """
+        Lazily yields the sequences of id pairs reaching the width computed by `solve_width`,
+        in the order of the exhaustive search. Only the current branch is kept in memory, and
+        the trigraph is restored when the generator is exhausted or closed early.
+        """
+        if self.width == infinity:
+            return
+        try:
+            yield from self.collect_sequences([])
+        finally:
+            while self.path:
+                self.backtrack()
+
+    def collect_sequences(self, sequence):
+        trigraph = self.trigraph
+        if trigraph.order() == 1:
+            yield sequence
+            return
+
+        for i, j in self.pairs():
+            self.contract(i, j)
+            if trigraph.max_red_degree() <= self.width and self.remaining_width() <= self.width:
+                yield from self.collect_sequences(sequence + [(i, j)])
+            self.backtrack()
+
+    # Branch-and-bound search
+
+    def ordered_merges(self):
+        """
+        Returns all possible merges as tuples (maximum red degree, i, j), sorted by
+        the maximum red degree they create, so the most promising merges come first.
+        """
+        return ordered_merges(self.trigraph)
+
+    def greedy(self):
+        """
+        Returns the width and the sequence of the greedy contraction (see tw_heuristics.py).
+        """
+        return greedy_sequence(self.trigraph)
+
+    def pruned(self, seed=None):
+        """
+        Branch-and-bound search seeded with the width of the greedy sequence, or of the given
+        seed sequence if it is better. Every branch whose running maximum red degree can no
+        longer reach the best width is cut.
+        """
+        if self.trigraph.order() == 0:
+            return
+        self.width, sequence = self.greedy()
+        if seed is not None:
+            seed_width = sequence_width(self.trigraph, seed)
+            if seed_width < self.width:
+                self.width, sequence = seed_width, list(seed)
+        # When collecting all optimal sequences, the greedy one is found again by the search
+        self.sequences.clear()
+        if not self.all_sequences:
+            self.sequences.append(sequence)
+        self.merge_pruned_sequences(0, self.sequences.root)
+
+    def bound(self):
+        """
+        Returns the best width known to this search or to any search sharing its bound.
+        """
+        if self.shared_bound is None:
+            return self.width
+        return min(self.width, self.shared_bound.get())
+
+    def merge_pruned_sequences(self, max_degree, sequence):
+        trigraph = self.trigraph
+        if trigraph.order() == 1:
+            if max_degree < self.width:
+                self.width = max_degree
+                self.sequences.clear()
+                self.sequences.add(sequence)
+            elif max_degree == self.width and self.all_sequences:
+                self.sequences.add(sequence)
+            if self.shared_bound is not None:
+                self.shared_bound.offer(max_degree)
+            return
+
+        for degree, i, j in self.ordered_merges():
+            new_max_degree = max(max_degree, degree)
+            bound = self.bound()
+            # The merges are sorted, so none of the remaining ones can be better either
+            if new_max_degree > bound or (new_max_degree == bound and not self.all_sequences):
+                break
+            self.contract(i, j)
+            self.merge_pruned_sequences(new_max_degree, sequence.extend(i, j))
+            self.backtrack()
+
+    # Search with symmetry breaking
+
+    def symmetric(self):
+        """
+        Exhaustive search which expands only one pair per orbit of vertex pairs under the
+        automorphisms of the current trigraph (preserving memberships and black/red weights).
+        Contracting two pairs of the same orbit leads to isomorphic subtrees, so the optimal
+        sequences of the other pairs are the images of the representative's sequences under
+        the automorphisms, which are applied only when all sequences are collected.
+        Branches whose running maximum red degree already exceeds the best width are cut.
+        """
+        if self.trigraph.order() == 0:
+            return
+        width, suffixes = self.symmetric_suffixes(0)
+        self.width = width
+        self.sequences = SequenceSet.from_sequences(suffixes if self.all_sequences else suffixes[:1])
+
+    def pair_orbits(self):
+        """
+        Returns the orbits of the mergeable pairs under the automorphisms of the current trigraph,
+        as returned by `automorphism.pair_orbits` with vertex ids as names.
+        """
+        trigraph = self.trigraph
+        graph = nx.Graph()
+        for i in trigraph.vertices:
+            graph.add_node(i, color=float(trigraph.membership[i]))
+        for i, j in self.pairs():
+            if trigraph.black[i, j] != 0 or trigraph.red[i, j] != 0:
+                graph.add_edge(i, j, color=(float(trigraph.black[i, j]), float(trigraph.red[i, j])))
+        return pair_orbits(AutomorphismGroup(graph), self.pairs())
+
+    def symmetric_suffixes(self, max_degree):
+        """
+        Returns the lowest width with which the current state, reached with the running maximum
+        red degree max_degree, can be merged into a single vertex, and the suffixes reaching it.
+        """
+        trigraph = self.trigraph
+        if trigraph.order() == 1:
+            self.width = min(self.width, max_degree)
+            return max_degree, [[]]
+
+        best, suffixes = infinity, []
+        for orbit in self.pair_orbits():
+            (i, j), _ = orbit[0]
+            self.contract(i, j)
+            new_max_degree = max(max_degree, trigraph.max_red_degree())
+            # Ties are kept, the branch may hold further optimal sequences
+            if new_max_degree <= self.width:
+                width, child_suffixes = self.symmetric_suffixes(new_max_degree)
+            else:
+                width, child_suffixes = infinity, []
+            self.backtrack()
+            if width > best or not child_suffixes:
+                continue
+
+            representative = [[(i, j)] + suffix for suffix in child_suffixes]
+            if self.all_sequences:
+                images = []
+                for _, permutation in orbit:
+                    ids = list(range(len(trigraph.names)))
+                    for k, vertex in enumerate(trigraph.vertices):
+                        ids[vertex] = trigraph.vertices[permutation[k]]
+                    images.extend(translate_sequence(suffix, ids) for suffix in representative)
+                representative = images
+            elif suffixes and width == best:
+                continue
+            if width < best:
+                best, suffixes = width, representative
+            else:
+                suffixes.extend(representative)
+        return best, suffixes
@@ -0,0 +1,110 @@
+"""
+File:           generators.py
+
+Description:    Seeded generators of fuzzy graph families used by the benchmarks: paths,
+                cycles, stars, complete graphs, random G(n, p) graphs, random trees and
+                relabeled isomorphic copies. Vertices are named Node1, ..., Noden, the
+                membership values and edge weights are drawn from (0, 1], and the same
+                arguments always produce the same graph.
+"""
+
+import random
+from backend.TWBackend import Graph, Vertex
+
+
+def fuzzy_graph(nodes, edges, rng):
+    """
+    Builds a fuzzy graph on the vertices 1, ..., nodes with the given edges (pairs of vertex
+    numbers) and random membership values and edge weights.
+    """
+    graph = Graph()
+    for i in range(1, nodes + 1):
+        graph.add_vertex(Vertex(f'Node{i}', round(rng.uniform(0.1, 1), 2)))
+    for i, j in edges:
+        graph.add_edge(f'Node{i}', f'Node{j}', (round(rng.uniform(0.1, 1), 2), 0))
+    return graph
+
+
+def path_graph(nodes, seed=0):
+    return fuzzy_graph(nodes, [(i, i + 1) for i in range(1, nodes)], random.Random(seed))
+
+
+def cycle_graph(nodes, seed=0):
+    edges = [(i, i + 1) for i in range(1, nodes)]
+    if nodes > 2:
+        edges.append((1, nodes))
+    return fuzzy_graph(nodes, edges, random.Random(seed))
+
+
+def star_graph(nodes, seed=0):
+    return fuzzy_graph(nodes, [(1, i) for i in range(2, nodes + 1)], random.Random(seed))
+
+
+def complete_graph(nodes, seed=0):
+    return fuzzy_graph(nodes, [(i, j) for i in range(1, nodes + 1) for j in range(i + 1, nodes + 1)],
+                       random.Random(seed))
+
+
+def random_graph(nodes, density=0.5, seed=0):
+    """
+    Returns a random G(n, p) fuzzy graph with p = density.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(1, nodes + 1):
+        graph.add_vertex(Vertex(f'Node{i}', round(rng.uniform(0.1, 1), 2)))
+    for i in range(1, nodes + 1):
+        for j in range(i + 1, nodes + 1):
+            if rng.random() < density:
+                graph.add_edge(f'Node{i}', f'Node{j}', (round(rng.uniform(0.1, 1), 2), 0))
+    return graph
+
+
+def random_tree(nodes, seed=0):
+    """
+    Returns a random fuzzy tree, every vertex is attached to a random earlier vertex.
+    """
+    rng = random.Random(seed)
+    edges = [(rng.randint(1, i - 1), i) for i in range(2, nodes + 1)]
+    return fuzzy_graph(nodes, edges, rng)
+
+
+def relabeled_copy(graph, seed=0):
+    """
+    Returns a copy of the graph with the vertex names randomly permuted, keeping the membership
+    values and edge weights, so it is isomorphic to the graph with equal weights.
+    """
+    rng = random.Random(seed)
+    names = list(graph.vertices)
+    shuffled = names[:]
+    rng.shuffle(shuffled)
+    rename = dict(zip(names, shuffled))
+
+    copy = Graph()
+    for name in shuffled:
+        copy.add_vertex(Vertex(name, 0))
+    for name, vertex in graph.vertices.items():
+        copy.vertices[rename[name]].membershipFunction = vertex.membershipFunction
+    for name, vertex in graph.vertices.items():
+        for neighbor, weight in vertex.neighbors:
+            copy.vertices[rename[name]].neighbors.append((rename[neighbor], weight))
+    return copy
+
+
+def isomorphic_pair(family, nodes, seed=0):
+    """
+    Returns a graph of the given family and a relabeled copy of it.
+    """
+    graph = FAMILIES[family](nodes, seed)
+    return graph, relabeled_copy(graph, seed + 1)
+
+
+# Family name -> function(nodes, seed) returning a fuzzy graph
+FAMILIES = {
+    'path': path_graph,
+    'cycle': cycle_graph,
+    'star': star_graph,
+    'complete': complete_graph,
+    'gnp': lambda nodes, seed=0: random_graph(nodes, 0.5, seed),
+    'tree': random_tree,
+}
@@ -0,0 +1,47 @@
+"""
+File:           parallel_speedup.py
+
+Description:    Benchmark of the parallel twin-width search. It times the search of a seeded
+                random fuzzy graph for an increasing number of worker processes and prints
+                the speedup against a single worker.
+
+Usage:          python -m benchmarks.parallel_speedup --nodes 10 --workers 1 2 4 8 16
+"""
+
+import argparse
+import os
+import time
+from benchmarks.generators import random_graph
+from backend.trigraph import Trigraph
+from backend.tw_parallel import parallel_twin_width
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Speedup of the parallel twin-width search.')
+    parser.add_argument('--nodes', type=int, default=10)
+    parser.add_argument('--density', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tnorm', default='prod', choices=['min', 'prod', 'luk', 'drast'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--depth', type=int, default=1, choices=[1, 2])
+    parser.add_argument('--one', action='store_true', help='search for one optimal sequence only')
+    args = parser.parse_args()
+
+    graph = random_graph(args.nodes, args.density, args.seed)
+    print(f"nodes={args.nodes} density={args.density} tnorm={args.tnorm} "
+          f"depth={args.depth} cpus={os.cpu_count()}")
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8} {'tw':>8} {'sequences':>10}")
+
+    baseline = None
+    for workers in args.workers:
+        trigraph = Trigraph.from_graph(graph, args.tnorm)
+        start = time.perf_counter()
+        search = parallel_twin_width(trigraph, not args.one, workers, args.depth)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>10.3f} {baseline / elapsed:>8.2f} "
+              f"{search.width:>8.4g} {len(search.sequences):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+File:           suite.py
+
+Description:    Benchmark suite of the backend engines. For every graph family, size and
+                t-norm it measures the twin-width search, the isomorphism search and the
+                similarity computation, both as direct calls and through the HTTP endpoints
+                of app.py with the Flask test client (including the JSON parsing), and the
+                parsing of a request graph from JSON and from the binary format. Every case
+                records the wall-clock time, the peak memory allocated by Python and the
+                number of expanded search states or found mappings. The results are written
+                as JSON and can be compared with a stored baseline to flag regressions.
+
+Usage:          python -m benchmarks.suite --sizes 4 5 6 --output results.json
+                python -m benchmarks.suite --baseline results.json --threshold 1.25
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import networkx as nx
+import numpy as np
+from benchmarks.generators import FAMILIES, isomorphic_pair
+from backend.TWBackend import twin_width_search
+from backend.isomorph import find_isomorphisms
+from backend.similarity import compute_similarity
+from backend.cache import ResultCache
+from backend.graph_io import dump_request, load_request
+
+TNORMS = ('min', 'prod', 'luk', 'drast')
+ENGINES = ('tw', 'iso', 'sim', 'http-tw', 'http-iso', 'http-sim', 'parse-json', 'parse-npz')
+# Engines whose cases do not depend on the t-norm
+TNORM_FREE = ('iso', 'http-iso', 'parse-json', 'parse-npz')
+
+
+def graph_to_json(graph):
+    """
+    Converts a Graph object to the JSON structure accepted by the endpoints.
+    """
+    return {
+        'nodes': [{'name': name, 'membershipFunction': vertex.membershipFunction}
+                  for name, vertex in graph.vertices.items()],
+        'edges': [{'source': name, 'target': neighbor, 'weight': weight[0]}
+                  for name, vertex in graph.vertices.items() for neighbor, weight in vertex.neighbors
+                  if name < neighbor],
+    }
+
+
+def measure(function, repeat):
+    """
+    Calls function `repeat` times and once more under tracemalloc.
+
+    :return: A tuple (median seconds, minimum seconds, peak KiB, return value of the last call)
+    """
+    times = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        times.append(time.perf_counter() - start)
+
+    # Peak memory is measured separately, tracemalloc slows the allocations down
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), min(times), peak / 1024, value
+
+
+class HttpClient:
+    """
+    Calls the endpoints of app.py through the Flask test client with a fresh result cache
+    for every request, so every request is computed and not served from the cache.
+    """
+
+    def __init__(self):
+        import app as application
+        self.application = application
+        self.client = application.app.test_client()
+
+    def post(self, route, body):
+        self.application.cache = ResultCache()
+        response = self.client.post(route, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{route} returned {response.status_code}")
+        return response.get_json()
+
+
+def run_case(engine, G1, G2, tnorm, tw_method, repeat, http):
+    """
+    Measures one engine on one case and returns the measurement as a dictionary.
+    `nodes` is the number of expanded states of the twin-width search, or the number of mappings.
+    """
+    counts = {}
+
+    if engine == 'tw':
+        options = {'memo': tw_method == 'memo', 'prune': tw_method == 'prune'}
+
+        def function():
+            search = twin_width_search(G1, tnorm, **options)
+            counts['nodes'] = search.nodes
+            return search.width
+    elif engine == 'iso':
+        def function():
+            _, mappings = find_isomorphisms(G1, G2)
+            counts['nodes'] = len(mappings)
+            return len(mappings)
+    elif engine == 'sim':
+        def function():
+            return compute_similarity(G1, G2, tnorm)
+    elif engine == 'http-tw':
+        body = dict(graph_to_json(G1), tnorm=tnorm)
+
+        def function():
+            return http.post('/get-tw', body)['tw']
+    elif engine == 'http-iso':
+        body = {'graph1': graph_to_json(G1), 'graph2': graph_to_json(G2)}
+
+        def function():
+            mappings = http.post('/check-isomorphism', body)['mappings']
+            counts['nodes'] = len(mappings)
+            return len(mappings)
+    elif engine == 'http-sim':
+        body = {'graph1': graph_to_json(G1), 'graph2': graph_to_json(G2), 'tnorm': tnorm}
+
+        def function():
+            return http.post('/get-similarity', body)['similarity']
+    elif engine == 'parse-json':
+        from app import build_graph_from_json
+        body = json.dumps(graph_to_json(G1))
+
+        def function():
+            return len(build_graph_from_json(json.loads(body)).vertices)
+    elif engine == 'parse-npz':
+        body = dump_request({'graph': G1})
+
+        def function():
+            return len(load_request(body)['graph'].vertices)
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+
+    median, fastest, peak, value = measure(function, repeat)
+    return {
+        'seconds': median,
+        'min_seconds': fastest,
+        'peak_kib': round(peak, 1),
+        'nodes': counts.get('nodes'),
+        'value': "X" if value == float('inf') else value,
+    }
+
+
+def run_suite(families, sizes, tnorms, engines, tw_method='prune', repeat=3, seed=0):
+    """
+    Runs the benchmark sweep and returns the results keyed by case id
+    ('engine/family/n=size/tnorm', without the t-norm for the engines in TNORM_FREE).
+    """
+    http = HttpClient() if any(engine.startswith('http') for engine in engines) else None
+    results = {}
+    for family in families:
+        for size in sizes:
+            G1, G2 = isomorphic_pair(family, size, seed)
+            for engine in engines:
+                for tnorm in ([None] if engine in TNORM_FREE else tnorms):
+                    case = f"{engine}/{family}/n={size}" + (f"/{tnorm}" if tnorm else "")
+                    results[case] = run_case(engine, G1, G2, tnorm, tw_method, repeat, http)
+                    print(f"{case:<32} {results[case]['seconds'] * 1000:>10.2f} ms "
+                          f"{results[case]['peak_kib']:>10.1f} KiB {results[case]['nodes'] or '':>8}",
+                          file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold=1.25, min_seconds=0.001):
+    """
+    Compares results with a baseline and returns the regressions as (case, baseline seconds,
+    seconds) tuples: cases slower than threshold times the baseline and by at least min_seconds.
+    Changed values (twin-width, similarity, number of mappings) are reported as well.
+    """
+    regressions = []
+    changed = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        before = baseline[case]
+        if result['seconds'] > before['seconds'] * threshold and result['seconds'] - before['seconds'] >= min_seconds:
+            regressions.append((case, before['seconds'], result['seconds']))
+        if result['value'] != before['value']:
+            changed.append((case, before['value'], result['value']))
+    return regressions, changed
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'networkx': nx.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the twin-width, isomorphism and similarity engines.')
+    parser.add_argument('--families', nargs='+', default=list(FAMILIES), choices=list(FAMILIES))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[4, 5, 6])
+    parser.add_argument('--tnorms', nargs='+', default=list(TNORMS), choices=list(TNORMS))
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--tw-method', default='prune', choices=['exhaustive', 'memo', 'prune'],
+                        help='twin-width search of the direct calls, the endpoint always uses its default')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results with this JSON file')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='a case is a regression when it is this many times slower than the baseline')
+    args = parser.parse_args()
+
+    results = run_suite(args.families, args.sizes, args.tnorms, args.engines, args.tw_method, args.repeat, args.seed)
+    report = {'environment': environment(), 'arguments': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        regressions, changed = compare(results, baseline, args.threshold)
+        for case, before, after in regressions:
+            print(f"REGRESSION {case}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({after / before:.2f}x)")
+        for case, before, after in changed:
+            print(f"CHANGED {case}: {before} -> {after}")
+        if regressions or changed:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
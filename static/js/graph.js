@@ -259,33 +259,60 @@ function graphToJson(graph) {
 
 
 /**
- * Fetches the twin-width value of a given graph from a remote server.
- * @param {Object} graph - The Cytoscape graph instance.
- * @param {string} eleId - The ID of the HTML input element to display the result.
+ * Requests the twin-width of a graph from a remote server.
+ * @param {Object} graphData - JSON representation of the graph with the selected t-norm.
+ * @param {string} mode - "exact" or a fast estimate ("greedy", "beam", "random").
+ * @returns {Promise<Object>} - The parsed response.
  */
-function getTwinWidth(graph, eleId) {
-    const graphData = graphToJson(graph);
-    graphData.tnorm = document.getElementById("tNorm").value;
-
-    // Send the graph data to the server to get the twin-width value
+function requestTwinWidth(graphData, mode) {
     return fetch('https://graph-sim.onrender.com/get-tw', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(graphData)
+        body: JSON.stringify({ ...graphData, mode: mode })
     })
     .then(response => {
         if (!response.ok) {
             throw new Error(`HTTP error! Status: ${response.status}`); // Handle error response
         }
         return response.json(); // Parse the response as JSON
+    });
+}
+
+/**
+ * Shows a twin-width value in the result input, rounded if numeric.
+ * @param {string} eleId - The ID of the HTML input element to display the result.
+ * @param {*} tw - The twin-width value returned by the server.
+ */
+function showTwinWidth(eleId, tw) {
+    document.getElementById(eleId).value = (tw !== null && tw !== undefined && tw != "X") 
+        ? Math.round(tw * 10000) / 10000  // Round to 4 decimals
+        : "X"; // Display "X" if no valid twin-width
+}
+
+/**
+ * Fetches the twin-width value of a given graph from a remote server.
+ * A quick greedy estimate is shown first and replaced by the exact value once it is computed.
+ * @param {Object} graph - The Cytoscape graph instance.
+ * @param {string} eleId - The ID of the HTML input element to display the result.
+ */
+function getTwinWidth(graph, eleId) {
+    const graphData = graphToJson(graph);
+    graphData.tnorm = document.getElementById("tNorm").value;
+
+    // Show the estimate first, unless the exact value has already arrived
+    let exactShown = false;
+    requestTwinWidth(graphData, "greedy")
+    .then(data => {
+        if (!exactShown) showTwinWidth(eleId, data.tw);
     })
+    .catch(error => console.error("Error while estimating Twin Width:", error));
+
+    // Send the graph data to the server to get the exact twin-width value
+    return requestTwinWidth(graphData, "exact")
     .then(data => {
         console.log("Twin-width:", data.tw);
-
-        // Round the twin-width value if numeric and update the result input
-        document.getElementById(eleId).value = (data.tw !== null && data.tw !== undefined && data.tw != "X") 
-            ? Math.round(data.tw * 10000) / 10000  // Round to 2 decimals
-            : "X"; // Display "X" if no valid twin-width
+        exactShown = true;
+        showTwinWidth(eleId, data.tw);
     })
     .catch(error => {
         showErrorMessage(error.message);
@@ -0,0 +1,126 @@
+"""
+File:           test_automorphism.py
+
+Description:    Compares the compact form of the isomorphisms (a base isomorphism and the
+                automorphism group of G2 as a stabilizer chain) with the VF2 enumeration on
+                symmetric and random graphs: the same set of mappings, pages which split it
+                without repetition, and vertex and pair orbits equal to the brute-force
+                orbits under all automorphisms. The compact similarity must equal the VF2 one.
+"""
+
+import random
+from itertools import combinations
+import pytest
+from backend.TWBackend import Graph, Vertex
+from backend.automorphism import pair_orbits
+from backend.isomorph import find_isomorphisms
+from backend.similarity import compute_similarity
+
+
+def cycle(n):
+    return [(i, (i + 1) % n) for i in range(n)]
+
+def star(n):
+    return [(0, i) for i in range(1, n)]
+
+def complete(n):
+    return list(combinations(range(n), 2))
+
+def matching(n):
+    return [(2 * i, 2 * i + 1) for i in range(n)]
+
+def random_edges(n, seed):
+    rng = random.Random(seed)
+    edges = [(i, rng.randrange(i)) for i in range(1, n)]  # a spanning tree, so there is no isolated vertex
+    return edges + [(i, j) for i, j in combinations(range(n), 2) if rng.random() < 0.3 and (j, i) not in edges]
+
+
+EDGE_LISTS = [cycle(6), star(5), complete(4), matching(3), cycle(3) + [(3, 4), (4, 5), (5, 3)],
+              [(0, 1), (1, 2), (2, 3), (3, 0), (0, 2)]] + [random_edges(6, seed) for seed in range(6)]
+
+
+def make_graph(edges, seed, relabel=False):
+    """
+    Returns a fuzzy graph with the given edges and random weights, relabel=True shuffles the
+    vertex names and the order in which vertices and edges are added.
+    """
+    rng = random.Random(seed)
+    vertices = sorted({v for edge in edges for v in edge})
+    names = {v: f'Node{v}' for v in vertices}
+    if relabel:
+        shuffled = list(names.values())
+        rng.shuffle(shuffled)
+        names = dict(zip(vertices, shuffled))
+        edges = list(edges)
+        rng.shuffle(edges)
+        rng.shuffle(vertices)
+    graph = Graph()
+    for v in vertices:
+        graph.add_vertex(Vertex(names[v], rng.choice([0.25, 0.5, 0.75])))
+    for u, v in edges:
+        graph.add_edge(names[u], names[v], (rng.choice([0.25, 0.5, 0.75, 1]), 0))
+    return graph
+
+
+def as_set(mappings):
+    return {frozenset(mapping.items()) for mapping in mappings}
+
+
+@pytest.mark.parametrize('edges', EDGE_LISTS)
+def test_compact_isomorphisms_match_vf2(edges):
+    G1, G2 = make_graph(edges, 1), make_graph(edges, 2, relabel=True)
+    isomorphic, mappings = find_isomorphisms(G1, G2)
+    compact_isomorphic, isomorphisms = find_isomorphisms(G1, G2, compact=True)
+
+    assert isomorphic and compact_isomorphic
+    assert isomorphisms.count == len(mappings)
+    assert as_set(isomorphisms) == as_set(mappings)
+    assert isomorphisms.mapping(0) == isomorphisms.base
+
+    pages = [isomorphisms.page(offset, 5) for offset in range(0, isomorphisms.count + 5, 5)]
+    listed = [mapping for page in pages for mapping in page]
+    assert len(listed) == isomorphisms.count and as_set(listed) == as_set(mappings)
+    assert isomorphisms.page(isomorphisms.count, 5) == []
+
+
+@pytest.mark.parametrize('edges', EDGE_LISTS)
+def test_orbits_match_brute_force(edges):
+    G = make_graph(edges, 3)
+    _, automorphisms = find_isomorphisms(G, G)
+    group = find_isomorphisms(G, G, compact=True)[1].group
+    assert group.order() == len(automorphisms)
+    assert as_set(group.as_mapping(group.element(number)) for number in range(group.order())) == as_set(automorphisms)
+
+    orbits = {frozenset(automorphism[v] for automorphism in automorphisms) for v in group.nodes}
+    assert {frozenset(orbit) for orbit in group.orbits()} == orbits
+
+    pairs = list(combinations(group.nodes, 2))
+    split = pair_orbits(group, pairs)
+    expected = {frozenset(frozenset((automorphism[u], automorphism[v])) for automorphism in automorphisms)
+                for u, v in pairs}
+    assert {frozenset(frozenset(pair) for pair, _ in orbit) for orbit in split} == expected
+    assert sorted(pair for orbit in split for pair, _ in orbit) == sorted(pairs)
+    for orbit in split:
+        (u, v), _ = orbit[0]
+        for pair, permutation in orbit:
+            image = {group.nodes[permutation[group.index[u]]], group.nodes[permutation[group.index[v]]]}
+            assert image == set(pair)
+
+
+def test_non_isomorphic_graphs():
+    G1, G2 = make_graph(cycle(6), 1), make_graph(cycle(3) + [(3, 4), (4, 5), (5, 3)], 1)
+    assert find_isomorphisms(G1, G2, compact=True) == (False, None)
+    assert compute_similarity(G1, G2, 'prod', compact=True) == "X"
+
+
+@pytest.mark.parametrize('tnorm', ['min', 'prod', 'drast'])
+@pytest.mark.parametrize('edges', EDGE_LISTS)
+def test_compact_similarity_matches_vf2(tnorm, edges):
+    G1, G2 = make_graph(edges, 4), make_graph(edges, 5, relabel=True)
+    assert compute_similarity(G1, G2, tnorm, compact=True) == pytest.approx(compute_similarity(G1, G2, tnorm))
+
+
+def test_compact_luk_is_rejected():
+    G = make_graph(cycle(4), 1)
+    with pytest.raises(ValueError):
+        compute_similarity(G, G, 'luk', compact=True)
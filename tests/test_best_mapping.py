@@ -0,0 +1,145 @@
+"""
+File:           test_best_mapping.py
+
+Description:    Compares the branch-and-bound search for the isomorphism of least dissimilarity
+                with brute force over all VF2 isomorphisms, scored with the r_k formula of the
+                original implementation, on symmetric and random graph pairs. The similarity,
+                which takes the shortcut through this search where it can, must equal the
+                original fold over every isomorphism for every t-norm.
+"""
+
+import random
+from itertools import combinations
+import pytest
+from backend.TWBackend import Graph, Vertex
+from backend.best_mapping import best_mapping
+from backend.isomorph import find_isomorphisms
+from backend.similarity import MappingScorer, compute_similarity, t_norm
+
+TNORMS = ('min', 'prod', 'luk', 'drast')
+
+
+# Reference, the r_k formula and the fold of the original implementation
+
+def reference_r_k(G1, G2, mapping):
+    num_edges = sum(len(vertex.neighbors) for vertex in G1.vertices.values()) // 2
+    r_i = 0
+    processed_edges = set()
+    for vertex_name, vertex in G1.vertices.items():
+        mapped_vertex = G2.vertices[mapping[vertex_name]]
+        for neighbor, weight in vertex.neighbors:
+            edge_id = tuple(sorted([vertex_name, neighbor]))
+            if edge_id in processed_edges:
+                continue
+            processed_edges.add(edge_id)
+            for mapped_n, mapped_w in mapped_vertex.neighbors:
+                if mapped_n == mapping[neighbor]:
+                    r_i += pow(abs(weight[0] - mapped_w[0]), num_edges)
+                    break
+    return r_i ** (1 / num_edges)
+
+
+def reference_similarity(G1, G2, tnorm):
+    isomorphic, mappings = find_isomorphisms(G1, G2)
+    if not isomorphic:
+        return "X"
+    r = 1
+    for mapping in mappings:
+        r = t_norm(r, reference_r_k(G1, G2, mapping), tnorm)
+    return 1 - r
+
+
+def cycle(n):
+    return [(i, (i + 1) % n) for i in range(n)]
+
+def random_edges(n, seed):
+    rng = random.Random(seed)
+    edges = [(rng.randrange(i), i) for i in range(1, n)]  # a spanning tree, so there is no isolated vertex
+    return edges + [(i, j) for i, j in combinations(range(n), 2) if (i, j) not in edges and rng.random() < 0.4]
+
+
+EDGE_LISTS = [cycle(5), cycle(6), list(combinations(range(4), 2)), [(0, i) for i in range(1, 6)],
+              [(0, 1), (1, 2), (2, 3), (3, 0), (0, 2)]] + [random_edges(6, seed) for seed in range(6)]
+
+
+def make_graph(edges, seed, relabel=False, weights=(0.25, 0.5, 0.75, 1)):
+    """
+    Returns a fuzzy graph with the given edges and random weights, relabel=True shuffles the
+    vertex names and the order in which vertices and edges are added.
+    """
+    rng = random.Random(seed)
+    vertices = sorted({v for edge in edges for v in edge})
+    names = {v: f'Node{v}' for v in vertices}
+    if relabel:
+        shuffled = list(names.values())
+        rng.shuffle(shuffled)
+        names = dict(zip(vertices, shuffled))
+        edges = list(edges)
+        rng.shuffle(edges)
+        rng.shuffle(vertices)
+    graph = Graph()
+    for v in vertices:
+        graph.add_vertex(Vertex(names[v], 0.5))
+    for u, v in edges:
+        graph.add_edge(names[u], names[v], (rng.choice(weights), 0))
+    return graph
+
+
+def copy_relabeled(graph, seed):
+    """
+    Returns a copy of the graph with the same weights under shuffled vertex names.
+    """
+    rng = random.Random(seed)
+    names = list(graph.vertices)
+    shuffled = names[:]
+    rng.shuffle(shuffled)
+    rename = dict(zip(names, shuffled))
+    copy = Graph()
+    for name in reversed(names):
+        copy.add_vertex(Vertex(rename[name], graph.vertices[name].membershipFunction))
+    for name, vertex in graph.vertices.items():
+        for neighbor, weight in vertex.neighbors:
+            copy.add_edge(rename[name], rename[neighbor], weight)
+    return copy
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('edges', EDGE_LISTS)
+def test_best_mapping_matches_brute_force(edges, seed):
+    G1, G2 = make_graph(edges, seed), make_graph(edges, seed + 50, relabel=True)
+    _, mappings = find_isomorphisms(G1, G2)
+    scores = [reference_r_k(G1, G2, mapping) for mapping in mappings]
+
+    mapping, r_k = best_mapping(G1, G2, MappingScorer(G1, G2))
+    assert mapping in mappings
+    assert r_k == pytest.approx(min(scores), abs=1e-12)
+    assert r_k == pytest.approx(reference_r_k(G1, G2, mapping), abs=1e-12)
+
+    zero, zero_r_k = best_mapping(G1, G2, MappingScorer(G1, G2), only_zero=True)
+    if min(scores) == 0:
+        assert zero in mappings and zero_r_k == 0
+    else:
+        assert (zero, zero_r_k) == (None, None)
+
+
+@pytest.mark.parametrize('edges', EDGE_LISTS)
+def test_zero_mapping_of_a_relabeled_copy(edges):
+    G1 = make_graph(edges, 9)
+    G2 = copy_relabeled(G1, 3)
+    mapping, r_k = best_mapping(G1, G2, MappingScorer(G1, G2), only_zero=True)
+    assert r_k == 0 and reference_r_k(G1, G2, mapping) == 0
+
+
+def test_non_isomorphic_graphs():
+    G1, G2 = make_graph(cycle(6), 1), make_graph([(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3)], 1)
+    assert best_mapping(G1, G2, MappingScorer(G1, G2)) == (None, None)
+    assert best_mapping(G1, G2, MappingScorer(G1, G2), only_zero=True) == (None, None)
+
+
+@pytest.mark.parametrize('tnorm', TNORMS)
+@pytest.mark.parametrize('edges', EDGE_LISTS)
+def test_similarity_matches_the_original_fold(tnorm, edges):
+    G1 = make_graph(edges, 5)
+    for G2 in (make_graph(edges, 6, relabel=True), copy_relabeled(G1, 4),
+               make_graph(edges, 7, relabel=True, weights=(0.1, 0.9))):
+        assert compute_similarity(G1, G2, tnorm) == pytest.approx(reference_similarity(G1, G2, tnorm), abs=1e-12)
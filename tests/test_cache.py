@@ -0,0 +1,160 @@
+"""
+File:           test_cache.py
+
+Description:    Checks the result cache with relabeled copies of a graph: a hit must
+                translate the cached contraction sequences and isomorphisms to the names of
+                the requested graphs and give the results of an uncached computation, graphs
+                with different weights must not share an entry, and the SQLite level and the
+                size bound of the memory level must work.
+"""
+
+import random
+from itertools import combinations
+import pytest
+from backend.TWBackend import Graph, Vertex, twin_width_search
+from backend.cache import ResultCache, cached_isomorphisms, cached_similarity, cached_twin_width, graph_certificate
+from backend.isomorph import find_isomorphisms
+from backend.similarity import compute_similarity
+
+
+def random_graph(nodes, seed):
+    """
+    Returns a random connected fuzzy graph as (memberships, {(i, j): weight}).
+    """
+    rng = random.Random(seed)
+    memberships = [rng.choice([0.25, 0.5, 0.75]) for _ in range(nodes)]
+    edges = {(rng.randrange(i), i): rng.choice([0.25, 0.5, 1]) for i in range(1, nodes)}
+    for i, j in combinations(range(nodes), 2):
+        if (i, j) not in edges and rng.random() < 0.4:
+            edges[i, j] = rng.choice([0.25, 0.5, 1])
+    return memberships, edges
+
+
+def build(graph, names, order):
+    """
+    Builds the Graph with the given vertex names, adding the vertices in the given order.
+    """
+    memberships, edges = graph
+    G = Graph()
+    for i in order:
+        G.add_vertex(Vertex(names[i], memberships[i]))
+    for (i, j), weight in sorted(edges.items(), key=lambda item: (order.index(item[0][0]), order.index(item[0][1]))):
+        G.add_edge(names[i], names[j], (weight, 0))
+    return G
+
+
+def relabeled_pair(nodes, seed):
+    """
+    Returns a graph and a copy with other vertex names and another vertex order.
+    """
+    graph = random_graph(nodes, seed)
+    rng = random.Random(seed)
+    order = list(range(nodes))
+    rng.shuffle(order)
+    letters = [f'v{chr(97 + i)}' for i in range(nodes)]
+    rng.shuffle(letters)
+    return build(graph, [f'Node{i}' for i in range(nodes)], list(range(nodes))), build(graph, letters, order)
+
+
+def canonical(sequences):
+    return sorted(tuple(tuple(sorted(step)) for step in sequence) for sequence in sequences)
+
+
+def as_set(mappings):
+    return {frozenset(mapping.items()) for mapping in mappings}
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('tnorm', ['min', 'prod'])
+def test_relabeled_twin_width_sequences(tnorm, seed):
+    G, H = relabeled_pair(5, seed)
+    assert graph_certificate(G) == graph_certificate(H)
+    cache = ResultCache()
+    cached_twin_width(cache, G, tnorm, memo=True)
+    tw_value, sequences = cached_twin_width(cache, H, tnorm, memo=True)
+    assert cache.info()['hits'] == 1
+
+    width, expected = twin_width_search(H, tnorm, memo=True).result()
+    assert tw_value == width
+    assert canonical(sequences) == canonical(expected)
+    assert all(name in H.vertices or '+' in name for sequence in sequences for step in sequence for name in step)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_relabeled_isomorphisms(seed):
+    G1, H1 = relabeled_pair(5, seed)
+    G2, H2 = relabeled_pair(5, seed)
+    cache = ResultCache()
+    cached_isomorphisms(cache, G1, G2)
+    isomorphic, mappings = cached_isomorphisms(cache, H1, H2)
+    assert cache.info()['hits'] == 1
+    assert isomorphic
+    assert as_set(mappings) == as_set(find_isomorphisms(H1, H2)[1])
+
+    # Each requested graph is matched to the representative in its position
+    isomorphic, mappings = cached_isomorphisms(cache, G1, H2)
+    assert cache.info()['hits'] == 2
+    assert as_set(mappings) == as_set(find_isomorphisms(G1, H2)[1])
+
+
+def test_other_graph_misses():
+    G, _ = relabeled_pair(5, 1)
+    other, _ = relabeled_pair(5, 2)
+    cache = ResultCache()
+    cached_isomorphisms(cache, G, G)
+    assert cached_isomorphisms(cache, G, other) == find_isomorphisms(G, other)
+    assert cache.info()['hits'] == 0
+
+
+@pytest.mark.parametrize('tnorm', ['min', 'prod', 'luk', 'drast'])
+def test_relabeled_similarity(tnorm):
+    G1, H1 = relabeled_pair(5, 3)
+    G2, H2 = relabeled_pair(5, 3)
+    cache = ResultCache()
+    assert cached_similarity(cache, G1, G2, tnorm) == compute_similarity(G1, G2, tnorm)
+    assert cached_similarity(cache, H1, H2, tnorm) == compute_similarity(H1, H2, tnorm)
+    # 'luk' depends on the vertex order, so only the same labeled graphs are served from the cache
+    assert cache.info()['hits'] == (0 if tnorm == 'luk' else 1)
+    assert cached_similarity(cache, H1, H2, tnorm) == compute_similarity(H1, H2, tnorm)
+    assert cache.info()['hits'] == (1 if tnorm == 'luk' else 2)
+
+
+def test_weights_are_part_of_the_key():
+    memberships, edges = random_graph(5, 1)
+    names, order = [f'Node{i}' for i in range(5)], list(range(5))
+    G = build((memberships, edges), names, order)
+    heavier = dict(edges)
+    heavier[next(iter(edges))] = 0.75
+    H = build((memberships, heavier), names, order)
+
+    cache = ResultCache()
+    cached_twin_width(cache, G, 'min')
+    assert cached_twin_width(cache, H, 'min') == twin_width_search(H, 'min').result()
+    assert cache.info()['hits'] == 0
+
+
+def test_disk_level_is_shared(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    G, H = relabeled_pair(5, 2)
+    cached_twin_width(ResultCache(path=path), G, 'prod')
+
+    other = ResultCache(path=path)  # another process sharing the file
+    tw_value, sequences = cached_twin_width(other, H, 'prod')
+    assert other.info()['disk_hits'] == 1
+    width, expected = twin_width_search(H, 'prod').result()
+    assert tw_value == width and canonical(sequences) == canonical(expected)
+
+
+def test_size_bound_evicts():
+    graphs = [relabeled_pair(5, seed)[0] for seed in range(6)]
+    cache = ResultCache(max_size=60)
+    for G in graphs:
+        cached_twin_width(cache, G, 'min')
+    info = cache.info()
+    assert info['size'] <= 60 or info['entries'] == 1
+    assert info['evictions'] > 0
+    # An entry counts the vertices and edges of its representative graph besides the sequence steps
+    single = ResultCache()
+    _, sequences = cached_twin_width(single, graphs[0], 'min')
+    edges = sum(len(vertex.neighbors) for vertex in graphs[0].vertices.values()) // 2
+    assert single.info()['size'] == sum(len(sequence) + 1 for sequence in sequences) + len(graphs[0].vertices) + edges
@@ -0,0 +1,126 @@
+"""
+File:           test_graph_io.py
+
+Description:    Checks the binary request format: `dump_request` followed by `load_request`
+                must give back the same graphs (names, memberships, edge weights), lists of
+                graphs and scalar fields, invalid archives must raise GraphFormatError, and
+                the endpoints must answer a binary request like the equivalent JSON request.
+"""
+
+import io
+import random
+from itertools import combinations
+import numpy as np
+import pytest
+from backend.TWBackend import Graph, Vertex
+from backend.graph_io import GraphFormatError, dump_request, graph_to_arrays, load_request
+import app as application
+
+
+def random_graph(nodes, seed):
+    """
+    Returns a random fuzzy graph, the last vertex is isolated.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(nodes):
+        graph.add_vertex(Vertex(f'Node {i}', rng.random()))
+    for i, j in combinations(range(nodes - 1), 2):
+        if rng.random() < 0.5:
+            graph.add_edge(f'Node {i}', f'Node {j}', (rng.random(), 0))
+    return graph
+
+
+def description(graph):
+    """
+    Returns the vertex order, memberships and weighted edges of a graph for comparisons.
+    """
+    return (list(graph.vertices),
+            {name: vertex.membershipFunction for name, vertex in graph.vertices.items()},
+            {name: sorted((neighbor, tuple(weight)) for neighbor, weight in vertex.neighbors)
+             for name, vertex in graph.vertices.items()})
+
+
+def graph_json(graph):
+    return {
+        'nodes': [{'name': name, 'membershipFunction': vertex.membershipFunction}
+                  for name, vertex in graph.vertices.items()],
+        'edges': [{'source': name, 'target': neighbor, 'weight': weight[0]}
+                  for name, vertex in graph.vertices.items() for neighbor, weight in vertex.neighbors],
+    }
+
+
+def archive(arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_round_trip(seed):
+    G, H = random_graph(6, seed), random_graph(4, seed + 10)
+    empty = Graph()
+    fields = {'': G, 'graph1': H, 'graphs': [G, H, empty], 'tnorm': 'prod', 'max_items': 3,
+              'symmetry': True, 'time_limit': 0.5}
+    data = load_request(dump_request(fields))
+
+    assert description(data['graph']) == description(G)
+    assert description(data['graph1']) == description(H)
+    assert [description(graph) for graph in data['graphs']] == [description(graph) for graph in (G, H, empty)]
+    assert (data['tnorm'], data['max_items'], data['symmetry'], data['time_limit']) == ('prod', 3, True, 0.5)
+    assert isinstance(data['max_items'], int) and isinstance(data['symmetry'], bool)
+
+
+def test_round_trip_keeps_the_values_exactly():
+    graph = Graph()
+    graph.add_vertex(Vertex('a', 0.1))
+    graph.add_vertex(Vertex('b', 1 / 3))
+    graph.add_edge('a', 'b', (2 / 3, 0))
+    graph.add_edge('a', 'a', (0.7, 0))  # a loop is kept as well
+    loaded = load_request(dump_request({'': graph}))['graph']
+    assert description(loaded) == description(graph)
+
+
+def test_invalid_archives():
+    arrays = graph_to_arrays(random_graph(4, 1))
+
+    with pytest.raises(GraphFormatError):
+        load_request(b'not an archive')
+    with pytest.raises(GraphFormatError, match='misses'):
+        load_request(archive({key: value for key, value in arrays.items() if key != 'weights'}))
+    with pytest.raises(GraphFormatError, match='out of range'):
+        load_request(archive(dict(arrays, targets=np.full_like(arrays['targets'], 9))))
+    with pytest.raises(GraphFormatError, match='lengths'):
+        load_request(archive(dict(arrays, membership=arrays['membership'][:2])))
+    with pytest.raises(GraphFormatError, match='integer'):
+        load_request(archive(dict(arrays, sources=arrays['sources'].astype(float))))
+    with pytest.raises(GraphFormatError, match='numbered'):
+        load_request(archive({f'graphs.{i}.{key}': value for i in (0, 2) for key, value in arrays.items()}))
+    with pytest.raises(GraphFormatError, match='path'):
+        load_request(archive({f'a.b.c.{key}': value for key, value in arrays.items()}))
+    # Pickled objects are never loaded
+    with pytest.raises(GraphFormatError):
+        load_request(archive({'tnorm': np.array([{'x': 1}], dtype=object)}))
+
+
+def test_binary_requests_match_json():
+    client = application.app.test_client()
+    G, H = random_graph(5, 3), random_graph(5, 3)
+    headers = {'Content-Type': application.NPZ_MIMETYPE}
+
+    binary = client.post('/get-tw', data=dump_request({'': G, 'tnorm': 'min'}), headers=headers)
+    assert binary.status_code == 200
+    assert binary.get_json() == client.post('/get-tw', json=dict(graph_json(G), tnorm='min')).get_json()
+
+    binary = client.post('/get-similarity', data=dump_request({'graph1': G, 'graph2': H, 'tnorm': 'prod'}),
+                         headers=headers)
+    expected = client.post('/get-similarity', json={'graph1': graph_json(G), 'graph2': graph_json(H), 'tnorm': 'prod'})
+    assert expected.status_code == 200 and binary.get_json() == expected.get_json()
+
+    binary = client.post('/batch-similarity', data=dump_request({'graphs': [G, H], 'mode': 'matrix', 'tnorm': 'min'}),
+                         headers=headers)
+    expected = client.post('/batch-similarity', json={'graphs': [graph_json(G), graph_json(H)],
+                                                      'mode': 'matrix', 'tnorm': 'min'})
+    assert expected.status_code == 200 and binary.get_json() == expected.get_json()
+
+    assert client.post('/get-tw', data=b'not an archive', headers=headers).status_code == 400
@@ -0,0 +1,163 @@
+"""
+File:           test_jobs.py
+
+Description:    Checks the job subsystem: the search budget of a job (node limit, time spent
+                in the queue, cancellation of queued and running jobs) and the backpressure of
+                the bounded queue, directly on a JobManager and through the /jobs routes.
+"""
+
+import random
+import threading
+import time
+import pytest
+from backend.TWBackend import Graph, Vertex
+from backend.jobs import JobManager, JobQueueFull, twin_width_job
+from backend.tw_search import SearchBudget
+import app as application
+
+
+def random_graph(nodes, seed=1):
+    """
+    Returns a random fuzzy graph, with 7 vertices its search expands several hundred states.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(nodes):
+        graph.add_vertex(Vertex(f'Node{i}', 0.5))
+    for i in range(nodes):
+        for j in range(i + 1, nodes):
+            if rng.random() < 0.5:
+                graph.add_edge(f'Node{i}', f'Node{j}', (rng.choice([0.25, 0.5, 0.75, 1]), 0))
+    return graph
+
+
+def graph_json(graph):
+    return {
+        'nodes': [{'name': name, 'membershipFunction': vertex.membershipFunction}
+                  for name, vertex in graph.vertices.items()],
+        'edges': [{'source': name, 'target': neighbor, 'weight': weight[0]}
+                  for name, vertex in graph.vertices.items() for neighbor, weight in vertex.neighbors],
+    }
+
+
+def wait_for(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job.finished is None:
+        assert time.monotonic() < deadline, "the job did not finish"
+        time.sleep(0.01)
+    return job
+
+
+def blocking_job(release, started=None):
+    """
+    Returns a job function which runs until `release` is set or the job is cancelled.
+    """
+    def run(budget):
+        if started is not None:
+            started.set()
+        while not release.is_set() and not budget.cancelled.is_set():
+            time.sleep(0.005)
+        return 'released'
+    return run
+
+
+def test_unlimited_job_is_exact():
+    manager = JobManager(workers=1)
+    job = wait_for(manager.submit('tw', twin_width_job(random_graph(4), 'min')))
+    assert job.status == 'done'
+    assert job.result['exact'] is True
+    assert job.result['tw'] != "X" and job.result['sequence']
+
+
+def test_node_limit_stops_the_search():
+    manager = JobManager(workers=1)
+    budget = SearchBudget(max_nodes=20)
+    job = wait_for(manager.submit('tw', twin_width_job(random_graph(7), 'min'), budget))
+    assert job.status == 'done'
+    assert job.result['exact'] is False
+    assert job.result['nodes'] <= 21
+
+
+def test_queue_time_does_not_count():
+    manager = JobManager(workers=1, queue_size=1)
+    release = threading.Event()
+    first = manager.submit('block', blocking_job(release))
+    budget = SearchBudget(seconds=1)
+    queued = manager.submit('tw', twin_width_job(random_graph(7), 'min'), budget)
+    time.sleep(1.2)  # longer than the time limit of the queued job
+    assert queued.status == 'queued'
+    release.set()
+    wait_for(first)
+    assert wait_for(queued).result['exact'] is True
+
+
+def test_full_queue_is_rejected():
+    manager = JobManager(workers=1, queue_size=1)
+    release, started = threading.Event(), threading.Event()
+    running = manager.submit('block', blocking_job(release, started))
+    started.wait(5)
+    queued = manager.submit('block', blocking_job(release))
+    with pytest.raises(JobQueueFull):
+        manager.submit('block', blocking_job(release))
+
+    release.set()
+    wait_for(running)
+    wait_for(queued)
+    assert running.status == queued.status == 'done'
+    # The slots of the finished jobs are free again
+    wait_for(manager.submit('block', blocking_job(release)))
+
+
+def test_cancel_releases_the_slots():
+    manager = JobManager(workers=1, queue_size=1)
+    release, started = threading.Event(), threading.Event()
+    running = manager.submit('block', blocking_job(release, started))
+    started.wait(5)
+    queued = manager.submit('block', blocking_job(release))
+
+    assert manager.cancel(queued.id).status == 'cancelled'
+    assert manager.cancel(running.id) is running
+    assert wait_for(running).status == 'cancelled'
+    assert running.result == 'released'  # a cancelled job keeps its result
+    assert manager.cancel('unknown') is None
+
+    both = [manager.submit('block', blocking_job(release)) for _ in range(2)]
+    release.set()
+    for job in both:
+        assert wait_for(job).status == 'done'
+
+
+def test_finished_jobs_are_forgotten():
+    manager = JobManager(workers=1, max_finished=2)
+    done = [wait_for(manager.submit('tw', twin_width_job(random_graph(3), 'min'))) for _ in range(4)]
+    manager.submit('tw', twin_width_job(random_graph(3), 'min'))
+    assert [manager.get(job.id) for job in done[:2]] == [None, None]
+    assert all(manager.get(job.id) is job for job in done[2:])
+
+
+@pytest.mark.parametrize('budget', [{'time_limit': 0}, {'time_limit': -1}, {'time_limit': 'nan'},
+                                    {'time_limit': 'inf'}, {'time_limit': 'soon'}, {'node_limit': -1}])
+def test_route_rejects_invalid_budgets(budget):
+    client = application.app.test_client()
+    response = client.post('/jobs/tw', json=dict(graph_json(random_graph(3)), tnorm='min', **budget))
+    assert response.status_code == 400
+
+
+def test_route_answers_503_when_the_queue_is_full(monkeypatch):
+    manager = JobManager(workers=1, queue_size=0)
+    monkeypatch.setattr(application, 'jobs', manager)
+    release, started = threading.Event(), threading.Event()
+    running = manager.submit('block', blocking_job(release, started))
+    started.wait(5)
+
+    client = application.app.test_client()
+    data = dict(graph_json(random_graph(3)), tnorm='min')
+    assert client.post('/jobs/tw', json=data).status_code == 503
+    release.set()
+    wait_for(running)
+
+    response = client.post('/jobs/tw', json=data)
+    assert response.status_code == 202
+    job = wait_for(manager.get(response.get_json()['job_id']))
+    polled = client.get(f"/jobs/{job.id}").get_json()
+    assert polled['status'] == 'done' and polled['result']['exact'] is True
@@ -0,0 +1,267 @@
+"""
+File:           test_sessions.py
+
+Description:    Checks the graph sessions: random delta operations must leave the session in
+                the state of a graph built from scratch (vertices, weights, scorer, twin-width
+                and similarity, 'luk' included), an invalid operation must roll back the whole
+                list, results must be reused only where an edit cannot affect them, and the
+                routes must answer the error paths with 400 and 404.
+"""
+
+import random
+import numpy as np
+import pytest
+from backend.TWBackend import Graph, Vertex, twin_width_search
+from backend.similarity import MappingScorer, compute_similarity
+from backend.sessions import GraphSession, SessionError, SessionStore
+import app as application
+
+WEIGHTS = (0.25, 0.5, 0.75, 1)
+
+
+def build(memberships, edges):
+    """
+    Builds a graph from {name: membership} and {(source, target): weight}, in the order of the dictionaries.
+    """
+    graph = Graph()
+    for name, membership in memberships.items():
+        graph.add_vertex(Vertex(name, membership))
+    for (source, target), weight in edges.items():
+        graph.add_edge(source, target, (weight, 0))
+    return graph
+
+
+def start_graph():
+    memberships = {'a': 0.5, 'b': 0.25, 'c': 0.75, 'd': 0.5}
+    edges = {('a', 'b'): 0.5, ('b', 'c'): 0.25, ('c', 'd'): 1, ('d', 'a'): 0.75}
+    return memberships, edges
+
+
+def random_operation(rng, memberships, edges, counter):
+    """
+    Returns a random valid operation and applies it to the reference model.
+    """
+    names = list(memberships)
+    pairs = [(u, v) for i, u in enumerate(names) for v in names[i + 1:]]
+    free = [pair for pair in pairs if pair not in edges and pair[::-1] not in edges]
+    choices = ['add_vertex', 'set_membership'] + (['remove_vertex'] if len(names) > 2 else [])
+    choices += (['add_edge'] if free else []) + (['remove_edge', 'set_weight'] if edges else [])
+    op = rng.choice(choices)
+
+    if op == 'add_vertex':
+        name = f'n{next(counter)}'
+        memberships[name] = rng.choice(WEIGHTS)
+        return {'op': op, 'name': name, 'membershipFunction': memberships[name]}
+    if op == 'set_membership':
+        name = rng.choice(names)
+        memberships[name] = rng.choice(WEIGHTS)
+        return {'op': op, 'name': name, 'membershipFunction': memberships[name]}
+    if op == 'remove_vertex':
+        name = rng.choice(names)
+        del memberships[name]
+        for pair in [pair for pair in edges if name in pair]:
+            del edges[pair]
+        return {'op': op, 'name': name}
+    if op == 'add_edge':
+        pair = rng.choice(free)
+        edges[pair] = rng.choice(WEIGHTS)
+        return {'op': op, 'source': pair[0], 'target': pair[1], 'weight': edges[pair]}
+    pair = rng.choice(list(edges))
+    source, target = pair if rng.random() < 0.5 else pair[::-1]  # either direction names the edge
+    if op == 'remove_edge':
+        del edges[pair]
+        return {'op': op, 'source': source, 'target': target}
+    edges[pair] = rng.choice(WEIGHTS)
+    return {'op': op, 'source': source, 'target': target, 'weight': edges[pair]}
+
+
+def description(graph):
+    return ({name: vertex.membershipFunction for name, vertex in graph.vertices.items()},
+            {name: sorted((neighbor, tuple(weight)) for neighbor, weight in vertex.neighbors)
+             for name, vertex in graph.vertices.items()})
+
+
+def snapshot(session):
+    slots = [session.slots[name] for name in session.graph.vertices]
+    return (list(session.graph.vertices), description(session.graph), session.version, session.structure_version,
+            session.weights[np.ix_(slots, slots)].tolist(), session.adjacency[np.ix_(slots, slots)].tolist())
+
+
+def counter():
+    i = 0
+    while True:
+        yield i
+        i += 1
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_random_edits_match_a_fresh_graph(seed):
+    rng = random.Random(seed)
+    memberships, edges = start_graph()
+    session = GraphSession(build(memberships, edges))
+    names = counter()
+
+    for _ in range(8):
+        session.apply([random_operation(rng, memberships, edges, names) for _ in range(rng.randint(1, 3))])
+        fresh = build(memberships, edges)
+        assert description(session.graph) == description(fresh)
+
+        tw_value, sequences, _ = session.twin_width('prod')
+        expected_width, expected_sequences = twin_width_search(fresh, 'prod').result()
+        assert tw_value == expected_width
+        assert sorted(map(str, sequences)) == sorted(map(str, expected_sequences))
+
+        # Every mapping between the edited graph and a copy of it is scored like a fresh scorer does
+        copy = build(memberships, edges)
+        twin = GraphSession(copy)
+        scorer, expected = session.scorer(twin), MappingScorer(session.graph, copy)
+        mappings, _ = SessionStore().isomorphisms(session, twin)
+        for mapping in mappings[:20]:
+            assert scorer(mapping) == pytest.approx(expected(mapping))
+
+
+@pytest.mark.parametrize('tnorm', ['min', 'prod', 'luk', 'drast'])
+def test_similarity_matches_a_fresh_graph(tnorm):
+    rng = random.Random(7)
+    memberships, edges = start_graph()
+    store = SessionStore()
+    first, second = store.create(build(memberships, edges)), store.create(build(memberships, edges))
+    names = counter()
+    for _ in range(6):
+        operations = [random_operation(rng, memberships, edges, names) for _ in range(2)]
+        first.apply(operations)
+        second.apply(operations)
+        similarity, _ = store.similarity(first, second, tnorm)
+        assert similarity == compute_similarity(build(memberships, edges), build(memberships, edges), tnorm)
+
+
+def test_invalid_operation_rolls_back():
+    memberships, edges = start_graph()
+    session = GraphSession(build(memberships, edges))
+    before = snapshot(session)
+    operations = [
+        {'op': 'add_vertex', 'name': 'e', 'membershipFunction': 0.5},
+        {'op': 'add_edge', 'source': 'e', 'target': 'a', 'weight': 0.25},
+        {'op': 'remove_vertex', 'name': 'b'},
+        {'op': 'set_weight', 'source': 'c', 'target': 'd', 'weight': 0.5},
+        {'op': 'remove_edge', 'source': 'a', 'target': 'd'},
+        {'op': 'set_membership', 'name': 'c', 'membershipFunction': 1},
+        {'op': 'add_edge', 'source': 'a', 'target': 'c', 'weight': 'heavy'},
+    ]
+    with pytest.raises(SessionError) as error:
+        session.apply(operations)
+    assert error.value.index == 6
+    assert snapshot(session) == before
+
+    # The slots are usable after the rollback
+    session.apply(operations[:6])
+    memberships['e'], memberships['c'] = 0.5, 1
+    del memberships['b']
+    expected = build(memberships, {('e', 'a'): 0.25, ('c', 'd'): 0.5})
+    assert description(session.graph) == description(expected)
+
+
+@pytest.mark.parametrize('operation', [
+    'add_vertex',
+    {'op': 'rename'},
+    {'op': 'add_vertex', 'name': 'e'},
+    {'op': 'add_vertex', 'name': 'a', 'membershipFunction': 0.5},
+    {'op': 'add_vertex', 'name': 'e', 'membershipFunction': [0.5]},
+    {'op': 'remove_vertex', 'name': 'z'},
+    {'op': 'add_edge', 'source': 'a', 'target': 'b', 'weight': 0.5},
+    {'op': 'add_edge', 'source': 'a', 'target': 'z', 'weight': 0.5},
+    {'op': 'remove_edge', 'source': 'a', 'target': 'c'},
+    {'op': 'set_weight', 'source': 'a', 'target': 'c', 'weight': 0.5},
+    {'op': 'set_weight', 'source': 'a', 'target': 'b'},
+    {'op': 'set_membership', 'name': 'z', 'membershipFunction': 0.5},
+])
+def test_invalid_operations(operation):
+    session = GraphSession(build(*start_graph()))
+    before = snapshot(session)
+    with pytest.raises(SessionError) as error:
+        session.apply([{'op': 'set_weight', 'source': 'a', 'target': 'b', 'weight': 1}, operation])
+    assert error.value.index == 1
+    assert snapshot(session) == before
+
+
+def test_results_are_reused_where_edits_cannot_affect_them():
+    store = SessionStore()
+    first, second = store.create(build(*start_graph())), store.create(build(*start_graph()))
+
+    assert first.twin_width('min')[2] is None
+    assert first.twin_width('min')[2] == 'result'
+    first.apply([{'op': 'set_weight', 'source': 'a', 'target': 'b', 'weight': 1}])
+    assert first.twin_width('min')[2] == 'bound'
+    first.apply([{'op': 'add_vertex', 'name': 'e', 'membershipFunction': 0.5}])
+    assert first.twin_width('min')[2] is None  # the last sequence does not contract the new vertex
+
+    second.apply([{'op': 'add_vertex', 'name': 'e', 'membershipFunction': 0.5}])
+    assert store.isomorphisms(first, second)[1] is False
+    assert store.isomorphisms(first, second)[1] is True
+    first.apply([{'op': 'set_weight', 'source': 'c', 'target': 'd', 'weight': 0.25}])
+    assert store.isomorphisms(first, second)[1] is True  # weights do not change the isomorphisms
+    first.apply([{'op': 'remove_edge', 'source': 'c', 'target': 'd'}])
+    assert store.isomorphisms(first, second) == ([], False)
+
+
+def test_store_evicts_sessions():
+    store = SessionStore(max_sessions=2)
+    sessions = [store.create(build(*start_graph())) for _ in range(3)]
+    assert store.get(sessions[0].id) is None
+    assert store.get(sessions[1].id) is sessions[1]
+
+    store.isomorphisms(sessions[1], sessions[2])
+    assert store.delete(sessions[1].id) and not store.delete(sessions[1].id)
+    assert store.info() == {'sessions': 1, 'pairs': 0}
+
+    expiring = SessionStore(ttl=0)
+    session = expiring.create(build(*start_graph()))
+    session.last_used -= 1
+    assert expiring.get(session.id) is None
+
+
+def graph_json(memberships, edges):
+    return {
+        'nodes': [{'name': name, 'membershipFunction': membership} for name, membership in memberships.items()],
+        'edges': [{'source': source, 'target': target, 'weight': weight} for (source, target), weight in edges.items()],
+    }
+
+
+def edge_set(data):
+    return {(frozenset((edge['source'], edge['target'])), edge['weight']) for edge in data['edges']}
+
+
+def test_routes():
+    client = application.app.test_client()
+    created = client.post('/sessions', json=graph_json(*start_graph()))
+    assert created.status_code == 201
+    session_id = created.get_json()['session_id']
+    other_id = client.post('/sessions', json=graph_json(*start_graph())).get_json()['session_id']
+
+    edited = client.patch(f'/sessions/{session_id}', json={'ops': [
+        {'op': 'set_weight', 'source': 'a', 'target': 'b', 'weight': 0.25},
+        {'op': 'remove_vertex', 'name': 'z'},
+    ]})
+    assert edited.status_code == 400 and edited.get_json()['index'] == 1
+    state = client.get(f'/sessions/{session_id}').get_json()
+    assert state['version'] == 0 and edge_set(state['graph']) == edge_set(graph_json(*start_graph()))
+
+    edited = client.patch(f'/sessions/{session_id}', json={'ops': [
+        {'op': 'set_weight', 'source': 'a', 'target': 'b', 'weight': 0.25}]})
+    assert edited.get_json() == {'session_id': session_id, 'version': 1, 'structure_version': 0}
+
+    assert client.post(f'/sessions/{session_id}/tw', json={'tnorm': 'min'}).status_code == 200
+    assert client.post(f'/sessions/{session_id}/tw', json={'tnorm': ['min']}).status_code == 400
+    assert client.post(f'/sessions/{session_id}/tw', json={}).status_code == 400
+    similarity = client.post(f'/sessions/{session_id}/similarity', json={'tnorm': 'prod', 'other': other_id})
+    assert similarity.status_code == 200
+    assert client.post(f'/sessions/{session_id}/similarity', json={'tnorm': 'x', 'other': other_id}).status_code == 400
+    assert client.post(f'/sessions/{session_id}/similarity', json={'tnorm': 'min', 'other': 'z'}).status_code == 404
+    assert client.patch(f'/sessions/{session_id}', json={'ops': 'none'}).status_code == 400
+    assert client.post('/sessions', json={'nodes': []}).status_code == 400
+
+    assert client.delete(f'/sessions/{session_id}').status_code == 200
+    for response in (client.get(f'/sessions/{session_id}'), client.delete(f'/sessions/{session_id}'),
+                     client.patch(f'/sessions/{session_id}', json={'ops': []}),
+                     client.post(f'/sessions/{session_id}/tw', json={'tnorm': 'min'})):
+        assert response.status_code == 404
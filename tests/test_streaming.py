@@ -0,0 +1,101 @@
+"""
+File:           test_streaming.py
+
+Description:    Checks the newline-delimited JSON responses of /get-tw and /check-isomorphism
+                through the Flask test client: a header record, one record per item and a
+                trailer record, the same items as the non-streamed response, the "max_items"
+                cap with its "truncated" flag, and the rejection of an invalid cap.
+"""
+
+import json
+import pytest
+import app as application
+
+
+def graph_json(nodes, edges):
+    return {
+        'nodes': [{'name': name, 'membershipFunction': 0.5} for name in nodes],
+        'edges': [{'source': u, 'target': v, 'weight': weight} for u, v, weight in edges],
+    }
+
+
+# A 4-cycle with equal weights has several optimal sequences and 8 automorphisms
+CYCLE = graph_json(['a', 'b', 'c', 'd'], [('a', 'b', 0.5), ('b', 'c', 0.5), ('c', 'd', 0.5), ('d', 'a', 0.5)])
+RELABELED = graph_json(['w', 'x', 'y', 'z'], [('w', 'y', 0.5), ('y', 'x', 0.5), ('x', 'z', 0.5), ('z', 'w', 0.5)])
+PATH = graph_json(['a', 'b', 'c', 'd'], [('a', 'b', 0.5), ('b', 'c', 0.5), ('c', 'd', 0.5)])
+
+
+@pytest.fixture
+def client():
+    return application.app.test_client()
+
+
+def records(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    parsed = [json.loads(line) for line in lines]
+    assert parsed[0]['type'] == 'header' and parsed[-1]['type'] == 'trailer'
+    return parsed[0], parsed[1:-1], parsed[-1]
+
+
+def as_set(mappings):
+    return {frozenset(mapping.items()) for mapping in mappings}
+
+
+@pytest.mark.parametrize('tnorm', ['min', 'prod', 'luk', 'drast'])
+def test_tw_stream_matches_response(client, tnorm):
+    expected = client.post('/get-tw', json=dict(CYCLE, tnorm=tnorm)).get_json()
+    header, items, trailer = records(client.post('/get-tw', json=dict(CYCLE, tnorm=tnorm, stream=True)))
+
+    assert header['tw'] == expected['tw']
+    assert all(item['type'] == 'sequence' for item in items)
+    sequences = [item['sequence'] for item in items]
+    assert sorted(map(json.dumps, sequences)) == sorted(map(json.dumps, expected['sequence']))
+    assert trailer == {'type': 'trailer', 'count': len(sequences), 'truncated': False}
+
+
+def test_tw_stream_cap(client):
+    _, items, _ = records(client.post('/get-tw', json=dict(CYCLE, tnorm='min', stream=True)))
+    assert len(items) > 1
+
+    _, capped, trailer = records(client.post('/get-tw', json=dict(CYCLE, tnorm='min', stream=True, max_items=1)))
+    assert capped == items[:1]
+    assert trailer == {'type': 'trailer', 'count': 1, 'truncated': True}
+
+    # A cap equal to the number of sequences does not truncate
+    _, _, trailer = records(client.post('/get-tw', json=dict(CYCLE, tnorm='min', stream=True, max_items=len(items))))
+    assert trailer['truncated'] is False
+
+
+def test_isomorphism_stream_matches_response(client):
+    expected = client.post('/check-isomorphism', json={'graph1': CYCLE, 'graph2': RELABELED}).get_json()
+    header, items, trailer = records(client.post('/check-isomorphism',
+                                                 json={'graph1': CYCLE, 'graph2': RELABELED, 'stream': True}))
+
+    assert header == {'type': 'header', 'isomorphic': True, 'count': 8}
+    mappings = [item['mapping'] for item in items]
+    assert len(mappings) == 8 and as_set(mappings) == as_set(expected['mappings'])
+    assert trailer == {'type': 'trailer', 'count': 8, 'truncated': False}
+
+    _, capped, trailer = records(client.post('/check-isomorphism',
+                                             json={'graph1': CYCLE, 'graph2': RELABELED, 'stream': True, 'max_items': 3}))
+    assert capped == items[:3]
+    assert trailer == {'type': 'trailer', 'count': 3, 'truncated': True}
+
+
+def test_non_isomorphic_stream(client):
+    header, items, trailer = records(client.post('/check-isomorphism',
+                                                 json={'graph1': CYCLE, 'graph2': PATH, 'stream': True, 'max_items': 1}))
+    assert header == {'type': 'header', 'isomorphic': False, 'count': 0}
+    assert items == []
+    assert trailer == {'type': 'trailer', 'count': 0, 'truncated': False}
+
+
+@pytest.mark.parametrize('max_items', [-1, 'many', [1]])
+def test_invalid_cap_is_rejected(client, max_items):
+    response = client.post('/get-tw', json=dict(CYCLE, tnorm='min', stream=True, max_items=max_items))
+    assert response.status_code == 400
+    response = client.post('/check-isomorphism',
+                           json={'graph1': CYCLE, 'graph2': RELABELED, 'stream': True, 'max_items': max_items})
+    assert response.status_code == 400
@@ -0,0 +1,157 @@
+"""
+File:           test_tnorms.py
+
+Description:    Checks the scalar and batched operators of the t-norm registry against the
+                formulas of the original implementation, `merge_operation` of TWBackend.py
+                and `t_norm` of similarity.py, which are kept here as the reference. The
+                grid of edge values (0, 1 and sums over 1 for 'luk') is exact and compared
+                exactly, random weights are compared up to rounding, as the Łukasiewicz red
+                merge groups its sum differently than the original formula.
+"""
+
+from itertools import product
+import numpy as np
+import pytest
+from backend.tnorms import OPERATORS, get_operators
+from backend.TWBackend import merge_operation
+from backend.similarity import t_norm
+
+TNORMS = ('min', 'prod', 'luk', 'drast')
+
+
+# Reference, the formulas of the original implementation
+
+def drastic_tnorm(u, v):
+    if u == 1:
+        return v
+    elif v == 1:
+        return u
+    else:
+        return 0
+
+def drastic_tconorm(u, v):
+    if u == 0:
+        return v
+    elif v == 0:
+        return u
+    else:
+        return 1
+
+def reference_merge_operation(u_black, u_red, v_black, v_red, operation, tnorm):
+    if operation == 'node_merge' or operation == 'black_edge_merge':
+        if tnorm == 'min':
+            return max(u_black, v_black)
+        elif tnorm == 'prod':
+            return u_black + v_black - u_black * v_black
+        elif tnorm == 'luk':
+            return min(u_black + v_black, 1)
+        elif tnorm == 'drast':
+            return drastic_tconorm(u_black, v_black)
+
+    else:
+        if tnorm == 'min':
+            return max(u_black, v_black) - min(u_black - u_red, v_black - v_red)
+        elif tnorm == 'prod':
+            return (u_black + v_black - u_black * v_black) - ((u_black - u_red) * (v_black - v_red))
+        elif tnorm == 'luk':
+            return min(u_black + v_black, 1) - max(0, u_black - u_red + v_black - v_red - 1)
+        elif tnorm == 'drast':
+            return drastic_tconorm(u_black, v_black) - drastic_tnorm(u_black - u_red, v_black - v_red)
+
+def reference_t_norm(u, v, tnorm):
+    match tnorm:
+        case "min": # Minimum t-norm
+            return min(u, v)
+        case "prod": # Product t-norm
+            return u*v
+        case "luk": # Łukasiewicz t-norm
+            return max(u + v - 1, 0)
+        case "drast": # Drastic t-norm
+            if u == 1:
+                return v
+            elif v == 1:
+                return u
+            else:
+                return 0
+
+
+# Edges (black, red) with red <= black on a grid of exact values, including 0, 1 and
+# pairs whose sum exceeds 1
+GRID = [0, 0.25, 0.5, 0.75, 1]
+GRID_EDGES = [(black, red) for black in GRID for red in GRID if red <= black]
+
+
+def random_edges(samples=500, seed=0):
+    rng = np.random.default_rng(seed)
+    black = rng.random(samples)
+    red = black * rng.random(samples)
+    return list(zip(black.tolist(), red.tolist()))
+
+
+def expected_and_actual(operators, tnorm, edges_u, edges_v):
+    """
+    Returns the reference values and the values of every scalar and batched kernel for all
+    pairs of the given edges, as dictionaries of kernel name -> list of values.
+    """
+    pairs = list(product(edges_u, edges_v))
+    u_black = np.array([u[0] for u, _ in pairs], dtype=float)
+    u_red = np.array([u[1] for u, _ in pairs], dtype=float)
+    v_black = np.array([v[0] for _, v in pairs], dtype=float)
+    v_red = np.array([v[1] for _, v in pairs], dtype=float)
+
+    expected = {
+        'tnorm': [reference_t_norm(u[0], v[0], tnorm) for u, v in pairs],
+        'tconorm': [reference_merge_operation(u[0], 0, v[0], 0, 'black_edge_merge', tnorm) for u, v in pairs],
+        'red_merge': [reference_merge_operation(*u, *v, 'red_edge_merge', tnorm) for u, v in pairs],
+    }
+    merged_black, merged_red = operators.merge_rows(u_black, u_red, v_black, v_red)
+    actual = {
+        'tnorm': [operators.tnorm(u[0], v[0]) for u, v in pairs],
+        'batch_tnorm': operators.batch_tnorm(u_black, v_black).tolist(),
+        'similarity_t_norm': [t_norm(u[0], v[0], tnorm) for u, v in pairs],
+        'tconorm': [operators.tconorm(u[0], v[0]) for u, v in pairs],
+        'batch_tconorm': operators.batch_tconorm(u_black, v_black).tolist(),
+        'merge_rows_black': merged_black.tolist(),
+        'node_merge': [merge_operation(u[0], 0, v[0], 0, 'node_merge', tnorm) for u, v in pairs],
+        'red_merge': [operators.red_merge(*u, *v) for u, v in pairs],
+        'merge_rows_red': merged_red.tolist(),
+        'merge_operation': [merge_operation(*u, *v, 'red_edge_merge', tnorm) for u, v in pairs],
+    }
+    reference = {
+        'tnorm': 'tnorm', 'batch_tnorm': 'tnorm', 'similarity_t_norm': 'tnorm',
+        'tconorm': 'tconorm', 'batch_tconorm': 'tconorm', 'merge_rows_black': 'tconorm', 'node_merge': 'tconorm',
+        'red_merge': 'red_merge', 'merge_rows_red': 'red_merge', 'merge_operation': 'red_merge',
+    }
+    return {kernel: expected[reference[kernel]] for kernel in actual}, actual
+
+
+@pytest.mark.parametrize('tnorm', TNORMS)
+def test_kernels_match_reference_on_edge_values(tnorm):
+    expected, actual = expected_and_actual(get_operators(tnorm), tnorm, GRID_EDGES, GRID_EDGES)
+    for kernel, values in actual.items():
+        assert values == expected[kernel], kernel
+
+
+@pytest.mark.parametrize('tnorm', TNORMS)
+def test_kernels_match_reference_on_random_weights(tnorm):
+    edges = random_edges()
+    # Every random edge against the exact grid (drast only differs from 0 at 1) and against random edges
+    for edges_v in (GRID_EDGES, random_edges(40, seed=1)):
+        expected, actual = expected_and_actual(get_operators(tnorm), tnorm, edges, edges_v)
+        for kernel, values in actual.items():
+            assert values == pytest.approx(expected[kernel], abs=1e-12), kernel
+
+
+def test_luk_sums_over_one():
+    operators = get_operators('luk')
+    assert operators.tconorm(0.75, 0.5) == 1
+    assert operators.tnorm(0.75, 0.5) == 0.25
+    assert operators.batch_tconorm(np.array([0.75, 1.0]), np.array([0.5, 1.0])).tolist() == [1, 1]
+    assert operators.batch_tnorm(np.array([0.25, 1.0]), np.array([0.5, 1.0])).tolist() == [0, 1]
+
+
+def test_registry():
+    assert set(OPERATORS) == set(TNORMS)
+    for name in ('foo', 'Min', None, ['min']):
+        with pytest.raises(ValueError):
+            get_operators(name)
@@ -0,0 +1,148 @@
+"""
+File:           test_tw_search.py
+
+Description:    Compares the twin-width search over the array-backed trigraph with a
+                brute-force reference: the original object-based recursion over every
+                contraction sequence, with the original merge formulas, on small random
+                graphs and for every t-norm. The edge weights are multiples of 1/4, so
+                both computations are exact and the optimal sequences must agree as sets.
+"""
+
+import random
+from itertools import combinations
+import pytest
+from backend.TWBackend import Graph, Vertex
+from backend.trigraph import Trigraph
+from backend.tw_search import TwinWidthSearch
+
+TNORMS = ('min', 'prod', 'luk', 'drast')
+METHODS = ('exhaustive', 'memo', 'prune', 'symmetric')
+infinity = float('inf')
+
+
+# Reference, the formulas and the recursion of the original implementation
+
+def drastic_tnorm(u, v):
+    if u == 1:
+        return v
+    elif v == 1:
+        return u
+    else:
+        return 0
+
+def drastic_tconorm(u, v):
+    if u == 0:
+        return v
+    elif v == 0:
+        return u
+    else:
+        return 1
+
+def merge_operation(u_black, u_red, v_black, v_red, operation, tnorm):
+    if operation == 'node_merge' or operation == 'black_edge_merge':
+        if tnorm == 'min':
+            return max(u_black, v_black)
+        elif tnorm == 'prod':
+            return u_black + v_black - u_black * v_black
+        elif tnorm == 'luk':
+            return min(u_black + v_black, 1)
+        elif tnorm == 'drast':
+            return drastic_tconorm(u_black, v_black)
+
+    else:
+        if tnorm == 'min':
+            return max(u_black, v_black) - min(u_black - u_red, v_black - v_red)
+        elif tnorm == 'prod':
+            return (u_black + v_black - u_black * v_black) - ((u_black - u_red) * (v_black - v_red))
+        elif tnorm == 'luk':
+            return min(u_black + v_black, 1) - max(0, u_black - u_red + v_black - v_red - 1)
+        elif tnorm == 'drast':
+            return drastic_tconorm(u_black, v_black) - drastic_tnorm(u_black - u_red, v_black - v_red)
+
+
+def reference_merge(neighbors, i, j, tnorm):
+    """
+    Merges the vertex j into the vertex i of a {id: {neighbor id: (black, red)}} adjacency.
+    """
+    merged = {}
+    for k in (set(neighbors[i]) | set(neighbors[j])) - {i, j}:
+        u_black, u_red = neighbors[i].get(k, (0, 0))
+        v_black, v_red = neighbors[j].get(k, (0, 0))
+        merged[k] = (merge_operation(u_black, 0, v_black, 0, 'black_edge_merge', tnorm),
+                     merge_operation(u_black, u_red, v_black, v_red, 'red_edge_merge', tnorm))
+
+    result = {}
+    for k, row in neighbors.items():
+        if k in (i, j):
+            continue
+        row = {m: weight for m, weight in row.items() if m not in (i, j)}
+        if k in merged:
+            row[i] = merged[k]
+        result[k] = row
+    result[i] = merged
+    return result
+
+
+def reference_twin_width(neighbors, tnorm):
+    """
+    Returns the twin-width and the set of optimal sequences of (i, j) id pairs, where the
+    merged vertex keeps the lower id i.
+    """
+    best = [infinity, set()]
+
+    def merge_all_sequences(neighbors, max_degree, sequence):
+        if len(neighbors) == 1:
+            if max_degree < best[0]:
+                best[0], best[1] = max_degree, {sequence}
+            elif max_degree == best[0]:
+                best[1].add(sequence)
+            return
+        for i, j in combinations(sorted(neighbors), 2):
+            merged = reference_merge(neighbors, i, j, tnorm)
+            degree = max(sum(red for _, red in row.values()) for row in merged.values())
+            merge_all_sequences(merged, max(max_degree, degree), sequence + ((i, j),))
+
+    merge_all_sequences(neighbors, 0, ())
+    return best[0], best[1]
+
+
+def random_graph(nodes, seed):
+    """
+    Returns a random fuzzy graph with weights in {0.25, 0.5, 0.75, 1} and its reference adjacency.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    neighbors = {i: {} for i in range(nodes)}
+    for i in range(nodes):
+        graph.add_vertex(Vertex(f'Node{i}', rng.choice([0.25, 0.5, 0.75, 1])))
+    for i, j in combinations(range(nodes), 2):
+        if rng.random() < 0.6:
+            weight = rng.choice([0.25, 0.5, 0.75, 1])
+            graph.add_edge(f'Node{i}', f'Node{j}', (weight, 0))
+            neighbors[i][j] = neighbors[j][i] = (weight, 0)
+    return graph, neighbors
+
+
+CASES = [(nodes, seed) for nodes in (2, 3, 4, 5) for seed in range(4)]
+
+
+@pytest.mark.parametrize('tnorm', TNORMS)
+@pytest.mark.parametrize('nodes,seed', CASES)
+def test_search_matches_reference(tnorm, nodes, seed):
+    graph, neighbors = random_graph(nodes, seed)
+    width, sequences = reference_twin_width(neighbors, tnorm)
+    for method in METHODS:
+        search = TwinWidthSearch(Trigraph.from_graph(graph, tnorm)).run(method)
+        assert search.width == width, method
+        assert {tuple(sequence) for sequence in search.sequences} == sequences, method
+        assert search.sequences.count == len(sequences), method
+
+
+@pytest.mark.parametrize('tnorm', TNORMS)
+def test_single_sequence_is_optimal(tnorm):
+    graph, neighbors = random_graph(5, 7)
+    width, sequences = reference_twin_width(neighbors, tnorm)
+    for method in METHODS:
+        search = TwinWidthSearch(Trigraph.from_graph(graph, tnorm), all_sequences=False).run(method)
+        assert search.width == width, method
+        assert [tuple(sequence) for sequence in search.sequences] in ([sequence] for sequence in sequences), method